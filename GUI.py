@@ -8,9 +8,18 @@ import importlib.util
 import re
 import sys
 import shutil
-import subprocess
+import threading
+import queue
+import time
+
+from discovery import discover
+import pyenvs
+from pyenvs import discover_interpreters, probe_interpreters, copy_lumapi
 
 class LumericalGUI:
+    # 传给 discover 的额外参数（候选目录、缓存路径、探测函数等），测试时可替换为伪目录树
+    DISCOVER_OPTIONS = {}
+
     def __init__(self, root):
         self.root = root
         self.root.title("Lumerical 接口配置工具")
@@ -38,9 +47,55 @@ class LumericalGUI:
                     f.write("from lumapi.lumapi import *\n")
             except: pass
 
+        # 耗时的文件系统操作都在后台线程执行，结果经队列由 root.after 轮询交回主线程
+        self.t_start = time.perf_counter()
+        self.metrics = {'first_paint': None, 'keystroke': []}  # 启动到首次绘制、按键处理耗时(秒)
+        self.results = queue.Queue()
+        self.generations = {}        # 每类后台任务的最新编号，旧任务的结果直接丢弃
+        self.validate_after_id = None
+        self.validated = (None, None) # 最近一次验证通过的 (路径, 版本)
+        self.installs = None          # 后台重新验证得到的最新安装列表
+
         self.create_widgets()
-        self.check_config()      # 检查 Lumerical 配置
-        self.check_python_envs() # 检查 Python 环境
+        self.root.bind('<Map>', self.on_first_paint, add='+')
+        self.root.after(20, self.poll_results)
+        self.check_config()      # 检查 Lumerical 配置（后台）
+        self.check_python_envs() # 检查 Python 环境（后台）
+
+    # ================= 后台任务 =================
+    def next_generation(self, kind):
+        """在主线程中为 kind 类任务取新编号，之前编号的结果都将被丢弃"""
+        gen = self.generations.get(kind, 0) + 1
+        self.generations[kind] = gen
+        return gen
+
+    def run_in_background(self, kind, func, callback, *args):
+        '''
+        在后台线程执行 func(*args)，完成后在主线程调用 callback(result)
+        同一 kind 的新任务会使尚未完成的旧任务作废
+        '''
+        gen = self.next_generation(kind)
+        def worker():
+            try:
+                result = func(*args)
+            except Exception as e:
+                result = e
+            self.results.put((kind, gen, callback, result))
+        threading.Thread(target=worker, daemon=True).start()
+
+    def poll_results(self):
+        try:
+            while True:
+                kind, gen, callback, result = self.results.get_nowait()
+                if gen == self.generations.get(kind):
+                    callback(result)
+        except queue.Empty:
+            pass
+        self.root.after(20, self.poll_results)
+
+    def on_first_paint(self, event):
+        if event.widget is self.root and self.metrics['first_paint'] is None:
+            self.metrics['first_paint'] = time.perf_counter() - self.t_start
 
     def create_widgets(self):
         # 配置列权重
@@ -55,7 +110,7 @@ class LumericalGUI:
         self.path_var = tk.StringVar()
         self.path_combo = ttk.Combobox(self.root, textvariable=self.path_var, width=50)
         self.path_combo.grid(row=0, column=1, padx=5, pady=(15, 2), sticky="ew")
-        self.path_combo.bind('<KeyRelease>', lambda e: self.validate_path(self.path_var.get()))
+        self.path_combo.bind('<KeyRelease>', self.on_path_key)
         self.path_combo.bind("<<ComboboxSelected>>", self.on_path_selected)
         
         tk.Button(self.root, text="浏览...", command=self.browse_path).grid(row=0, column=2, padx=10, pady=(15, 2))
@@ -102,39 +157,22 @@ class LumericalGUI:
 
 
     # ================= Lumerical 路径逻辑 =================
-    def detect_common_paths(self):
-        common_paths = []
-        if platform.system() == "Windows":
-            import string
-            from ctypes import windll
-            drives = []
-            bitmask = windll.kernel32.GetLogicalDrives()
-            for letter in string.ascii_uppercase:
-                if bitmask & 1: drives.append(letter + ":\\")
-                bitmask >>= 1
-            for drive in drives:
-                potential_paths = [
-                    os.path.join(drive, "Program Files", "Lumerical"),
-                    os.path.join(drive, "Program Files (x86)", "Lumerical"),
-                    os.path.join(drive, "Lumerical"),
-                    os.path.join(drive, "Program Files", "Ansys Inc"),
-                    os.path.join(drive, "Program Files (x86)", "Ansys Inc")
-                ]
-                for path in potential_paths:
-                    if os.path.exists(path):
-                        version = self.detect_version(path)
-                        if version: common_paths.append((path, version))
-        elif platform.system() == "Linux":
-            potential_paths = [
-                "/opt/lumerical", "/usr/local/lumerical",
-                "/usr/ansys_inc", "/opt/ansys_inc",
-                os.path.expanduser("~/Ansys/ansys_inc"), os.path.expanduser("~/ansys_inc")
-            ]
-            for path in potential_paths:
-                if os.path.exists(path):
-                    version = self.detect_version(path)
-                    if version: common_paths.append((path, version))
-        return common_paths
+    def detect_common_paths(self, gen):
+        '''
+        后台线程：查找安装路径，缓存命中时立即返回
+        gen: 主线程在开始扫描时取得的 'installs' 编号，后台重新验证发现变化时以此编号刷新下拉列表
+        '''
+        def on_update(found):
+            self.results.put(('installs', gen, self.update_install_list, found))
+        return discover(on_update=on_update, **self.DISCOVER_OPTIONS)
+
+    def update_install_list(self, found):
+        self.installs = found
+        values = [f"{p} ({v})" for p, v in found]
+        for v in self.path_combo['values']:
+            if v.endswith(" (Config)") and v not in values:
+                values.insert(0, v)
+        self.path_combo['values'] = values
 
     def detect_version(self, root):
         try:
@@ -156,8 +194,14 @@ class LumericalGUI:
         return False
 
     def check_config(self):
-        common = self.detect_common_paths()
-        valid_config = False
+        self.status_label.config(text="正在扫描 Lumerical 路径...", fg="gray")
+        self.installs = None
+        self.run_in_background('config', self.load_config_state, self.apply_config_state,
+                               self.next_generation('installs'))
+
+    def load_config_state(self, installs_gen):
+        """后台线程：扫描安装路径并读取已保存的配置"""
+        common = self.detect_common_paths(installs_gen)
         config_path_val = None
         
         if os.path.exists(self.config_path):
@@ -169,8 +213,17 @@ class LumericalGUI:
                 if lumerical_path and version:
                     if self.get_lumapi_path_check(lumerical_path, version):
                         config_path_val = lumerical_path
-                        valid_config = True
             except: pass
+        return common, config_path_val
+
+    def apply_config_state(self, result):
+        if isinstance(result, Exception):
+            result = ([], None)
+        common, config_path_val = result
+        # 后台重新验证可能先于本结果送达，以较新的安装列表为准
+        if self.installs is not None:
+            common = self.installs
+        valid_config = config_path_val is not None
         
         values = [f"{p} ({v})" for p, v in common]
         if config_path_val and not any(config_path_val in v for v in values):
@@ -186,8 +239,12 @@ class LumericalGUI:
             self.validate_path(config_path_val)
             self.export_local_btn.config(state=tk.NORMAL)
         else:
+            if not values:
+                self.status_label.config(text="等待配置...", fg="gray")
             self.export_local_btn.config(state=tk.DISABLED)
             self.install_btn.config(state=tk.DISABLED)
+        # Python 环境可能先于配置扫描完成，这里按配置状态刷新一次
+        self.check_python_status()
 
     def on_path_selected(self, event):
         val = self.path_combo.get()
@@ -201,15 +258,31 @@ class LumericalGUI:
             self.path_var.set(path)
             self.validate_path(path)
 
+    def on_path_key(self, event):
+        """输入时去抖：停止输入 300ms 后才开始验证"""
+        t0 = time.perf_counter()
+        if self.validate_after_id:
+            self.root.after_cancel(self.validate_after_id)
+        self.validate_after_id = self.root.after(300, lambda: self.validate_path(self.path_var.get()))
+        self.metrics['keystroke'].append(time.perf_counter() - t0)
+
     def validate_path(self, path):
+        self.validate_after_id = None
         if not path:
+            self.next_generation('validate')
             self.status_label.config(text="请输入路径", fg="red")
             self.verify_btn.config(state=tk.DISABLED)
             self.export_local_btn.config(state=tk.DISABLED)
             self.install_btn.config(state=tk.DISABLED)
             return
-        ver = self.detect_version(path)
+        self.status_label.config(text="状态: 验证中...", fg="gray")
+        self.verify_btn.config(state=tk.DISABLED)
+        self.run_in_background('validate', lambda: (path, self.detect_version(path)), self.apply_validation)
+
+    def apply_validation(self, result):
+        path, ver = result if not isinstance(result, Exception) else (None, None)
         if ver:
+            self.validated = (path, ver)
             self.status_label.config(text=f"状态: 有效 ({ver})", fg="green")
             self.verify_btn.config(state=tk.NORMAL)
             # 注意：保存按钮启用不代表可以导出，必须先保存（check_config会处理已保存的状态）
@@ -221,7 +294,10 @@ class LumericalGUI:
 
     def confirm_path(self):
         path = self.path_var.get()
-        version = self.detect_version(path)
+        if self.validated[0] == path:
+            version = self.validated[1]
+        else:
+            version = self.detect_version(path)
         try:
             if not getattr(sys, 'frozen', False):
                  os.makedirs(self.lumapi_dir, exist_ok=True)
@@ -253,37 +329,18 @@ class LumericalGUI:
 
     # ================= Python 环境逻辑 =================
     def check_python_envs(self):
-        """自动检测 Python 环境"""
-        interpreters = set()
-        
-        # 1. 扫描 PATH
-        paths = os.environ.get("PATH", "").split(os.pathsep)
-        for p in paths:
-            exe = "python.exe" if platform.system() == "Windows" else "python3"
-            full_path = os.path.join(p, exe)
-            if os.path.exists(full_path) and os.access(full_path, os.X_OK):
-                interpreters.add(full_path)
-
-        # 2. 常见目录扫描
-        if platform.system() == "Windows":
-            user_profile = os.environ.get("USERPROFILE", "")
-            common_roots = [
-                os.path.join(user_profile, "anaconda3"),
-                os.path.join(user_profile, "miniconda3"),
-                "C:\\ProgramData\\Anaconda3",
-                "C:\\Python39", "C:\\Python310", "C:\\Python311", "C:\\Python312"
-            ]
-            for root in common_roots:
-                if os.path.exists(os.path.join(root, "python.exe")):
-                    interpreters.add(os.path.join(root, "python.exe"))
-        else:
-            if os.path.exists("/usr/bin/python3"): interpreters.add("/usr/bin/python3")
-            if os.path.exists("/usr/local/bin/python3"): interpreters.add("/usr/local/bin/python3")
-
-        # 当前运行的 Python
-        interpreters.add(sys.executable)
-        
-        sorted_interpreters = sorted(list(interpreters))
+        """自动检测 Python 环境（后台）"""
+        self.run_in_background('python_envs', self.scan_python_envs, self.apply_python_envs)
+
+    def scan_python_envs(self):
+        interpreters = discover_interpreters()
+        # 预先并发查询并缓存各环境的库路径，安装时无需再等待子进程
+        probe_interpreters(interpreters)
+        return interpreters
+
+    def apply_python_envs(self, sorted_interpreters):
+        if isinstance(sorted_interpreters, Exception):
+            sorted_interpreters = [sys.executable]
         self.py_combo['values'] = sorted_interpreters
         if sorted_interpreters:
             self.py_combo.current(0)
@@ -317,18 +374,7 @@ class LumericalGUI:
         self.install_btn.config(state=tk.NORMAL, text="导出库文件到该 Python 环境")
 
     def get_site_packages(self, python_exe):
-        try:
-            cmd = [python_exe, "-c", "import sysconfig; print(sysconfig.get_paths()['purelib'])"]
-            if platform.system() == "Windows":
-                startupinfo = subprocess.STARTUPINFO()
-                startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
-                result = subprocess.check_output(cmd, startupinfo=startupinfo, encoding='utf-8')
-            else:
-                result = subprocess.check_output(cmd, encoding='utf-8')
-            return result.strip()
-        except Exception as e:
-            print(e)
-            return None
+        return pyenvs.get_site_packages(python_exe)
 
     def install_to_python(self):
         python_exe = self.py_path_var.get()
@@ -350,17 +396,7 @@ class LumericalGUI:
 
         # 复制文件
         try:
-            files_to_copy = ["__init__.py", "lumapi.py", "config.json"]
-            for f_name in files_to_copy:
-                src = os.path.join(self.lumapi_dir, f_name)
-                dst = os.path.join(target_lumapi_dir, f_name)
-                if os.path.exists(src):
-                    shutil.copy2(src, dst)
-                else:
-                    if f_name == "config.json":
-                        raise FileNotFoundError("config.json 未找到，请先生成配置")
-                    if f_name == "__init__.py":
-                        with open(dst, 'w') as f: f.write("from lumapi.lumapi import *\n")
+            copy_lumapi(self.lumapi_dir, target_lumapi_dir)
 
             messagebox.showinfo("安装成功", f"lumapi 库已成功安装到:\n{target_lumapi_dir}\n\n在该 Python 环境中可直接使用: import lumapi")
         except Exception as e:
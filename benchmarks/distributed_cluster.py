@@ -0,0 +1,149 @@
+"""
+多机分块计算的本机测试：LocalCluster 启动若干 lumapi-worker 子进程，检查结果、分块重试和各 worker 的吞吐量统计
+
+所有 worker 与调度都在 127.0.0.1 上运行，近场和远场由固定随机种子生成，结果可复现。
+检查项目:
+    exact      : Kirchhoff 的分块结果与本机直接计算一致（同一计算模式）
+    vector     : RorySommerfeld_Vector 的三个分量与本机直接计算一致
+    killed     : 计算中途强制结束一个 worker，丢失的分块由其他 worker 重算，结果仍一致
+    unreachable: worker 列表中有无法连接的地址时，其余 worker 完成全部分块
+    all-dead   : 所有 worker 都不可用时抛出 RuntimeError，而不是挂起
+
+用法:
+    python benchmarks/distributed_cluster.py
+    python benchmarks/distributed_cluster.py --workers 4 --near 80 --far 64 --mode numba --json result.json
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import socket
+import sys
+import threading
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from lumapi.lumapi import Kirchhoff, RorySommerfeld_Vector
+from lumapi.distributed import DistributedPropagator, LocalCluster
+
+LAMB = 1.0
+
+def problem(near, far, planes, seed=0):
+    rng = np.random.default_rng(seed)
+    x_near = np.linspace(-10, 10, near)
+    y_near = np.linspace(-8, 8, near - 3)
+    shape = (len(y_near), len(x_near))
+    fields = [rng.standard_normal(shape) + 1j*rng.standard_normal(shape) for _ in range(2)]
+    x_far = np.linspace(-15, 15, far)
+    y_far = np.linspace(-12, 12, far - 5)
+    z_far = np.linspace(20, 40, planes)
+    return x_near, y_near, fields, x_far, y_far, z_far
+
+def relative_error(a, b):
+    return float(np.abs(a - b).max() / np.abs(b).max())
+
+def free_port():
+    '''一个当前没有监听的本机端口（用作无法连接的 worker 地址）'''
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def run_killing(propagator, cluster, index, args, *inputs):
+    '''在第 index 个 worker 完成第一个分块后（此时它正在计算下一块）将其强制结束，return: Kirchhoff 结果'''
+    result = {}
+    def target():
+        try:
+            result['E_far'] = propagator.Kirchhoff(*inputs, mode=args.mode)
+        except Exception as e:
+            result['error'] = e
+    previous = propagator.stats  # 上一次调用的统计，run() 开始时会被替换
+    thread = threading.Thread(target=target)
+    thread.start()
+    name = '{}:{}'.format(*cluster.addresses[index])
+    deadline = time.perf_counter() + 60
+    while time.perf_counter() < deadline and thread.is_alive():
+        if propagator.stats is not previous and propagator.stats[name]['tiles'] >= 1:
+            cluster.kill(index)
+            break
+        time.sleep(0.005)
+    thread.join()
+    if 'error' in result:
+        raise result['error']
+    return result['E_far']
+
+def main():
+    parser = argparse.ArgumentParser(description="多机分块计算：本机多 worker 的结果一致性、分块重试与吞吐量")
+    parser.add_argument('--workers', type=int, default=3, help="worker 进程数")
+    parser.add_argument('--near', type=int, default=50, help="近场每边点数")
+    parser.add_argument('--far', type=int, default=48, help="远场每边点数")
+    parser.add_argument('--planes', type=int, default=3, help="远场 z 平面数")
+    parser.add_argument('--tile-points', type=int, default=192, help="每个分块的远场点数")
+    parser.add_argument('--mode', default='vectorized', help="worker 与本机参考使用的计算模式")
+    parser.add_argument('--tolerance', type=float, default=1e-12, help="与本机结果的最大相对误差")
+    parser.add_argument('--json', help="将结果保存为 JSON")
+    args = parser.parse_args()
+
+    lamb = LAMB
+    x_near, y_near, (Ex, Ey), x_far, y_far, z_far = problem(args.near, args.far, args.planes)
+    with contextlib.redirect_stdout(io.StringIO()):
+        reference = Kirchhoff(lamb, x_near, y_near, Ex, x_far, y_far, z_far, mode=args.mode)
+        reference_vector = RorySommerfeld_Vector(lamb, x_near, y_near, Ex, Ey, x_far, y_far, z_far, mode=args.mode)
+
+    results, errors, runs = {}, {}, {}
+    t0 = time.perf_counter()
+    with LocalCluster(args.workers) as cluster:
+        startup = time.perf_counter() - t0
+        propagator = DistributedPropagator(cluster.addresses, tile_points=args.tile_points, timeout=60.0)
+
+        E_far = propagator.Kirchhoff(lamb, x_near, y_near, Ex, x_far, y_far, z_far, mode=args.mode)
+        errors['exact'] = relative_error(E_far, reference)
+        results['exact'] = errors['exact'] <= args.tolerance
+        runs['exact'] = dict(propagator.last_run)
+        print(f"{args.workers} 个 worker（启动 {startup:.2f} s），{runs['exact']['tiles']} 个分块，"
+              f"{runs['exact']['far_points']} 个远场点 × {runs['exact']['near_points']} 个近场点:")
+        propagator.print_stats()
+
+        vector = propagator.RorySommerfeld_Vector(lamb, x_near, y_near, Ex, Ey, x_far, y_far, z_far, mode=args.mode)
+        errors['vector'] = max(relative_error(a, b) for a, b in zip(vector, reference_vector))
+        results['vector'] = errors['vector'] <= args.tolerance
+
+        E_far = run_killing(propagator, cluster, 0, args, lamb, x_near, y_near, Ex, x_far, y_far, z_far)
+        errors['killed'] = relative_error(E_far, reference)
+        runs['killed'] = dict(propagator.last_run)
+        killed = propagator.stats[f'{cluster.addresses[0][0]}:{cluster.addresses[0][1]}']
+        results['killed'] = errors['killed'] <= args.tolerance and runs['killed']['retried'] >= 1 \
+            and killed['failures'] >= 1
+        print(f"\n结束 worker 0 后：重试 {runs['killed']['retried']} 个分块")
+        propagator.print_stats()
+
+        alive = cluster.addresses[1:]
+        partial = DistributedPropagator(alive + [('127.0.0.1', free_port())], tile_points=args.tile_points,
+                                        retries=1, timeout=60.0, connect_timeout=1.0)
+        E_far = partial.Kirchhoff(lamb, x_near, y_near, Ex, x_far, y_far, z_far, mode=args.mode)
+        errors['unreachable'] = relative_error(E_far, reference)
+        results['unreachable'] = errors['unreachable'] <= args.tolerance
+
+    dead = DistributedPropagator(cluster.addresses, retries=1, connect_timeout=1.0)
+    t0 = time.perf_counter()
+    try:
+        dead.Kirchhoff(lamb, x_near, y_near, Ex, x_far, y_far, z_far, mode=args.mode)
+        results['all-dead'] = False
+    except RuntimeError:
+        results['all-dead'] = time.perf_counter() - t0 < 30
+
+    print()
+    for name, ok in results.items():
+        error = f"  相对误差 {errors[name]:.2e}" if name in errors else ''
+        print(f"  {name:<12}{'通过' if ok else '失败'}{error}")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'checks': results, 'errors': errors, 'runs': runs}, f, indent=4, ensure_ascii=False)
+        print(f"结果已保存到 {args.json}")
+    if not all(results.values()):
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
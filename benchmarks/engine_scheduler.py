@@ -0,0 +1,222 @@
+"""
+求解作业调度器测试：用伪求解引擎检查排队、核数分配、并发上限、失败处理和输出收集（不需要 Lumerical）
+
+伪引擎安装在临时目录的 v999/bin/fdtd-engine（Windows 为 .bat 包装），并写入 config.json，
+调度器与真实环境一样从配置中查找引擎。伪 .fsp 文件是 JSON，指定伪引擎的运行时间和返回码；
+伪引擎把每个作业的开始/结束时间和分到的线程数追加到事件文件，运行结束时写出 <名称>_p0.log 并更新 fsp。
+检查项目:
+    queue    : 全部作业完成，状态为 done，收集到 fsp、_p0.log、_engine.log，并复制到 output_dir
+    cores    : 任一时刻运行中作业的核数之和不超过 total_cores，且确有作业并发（机器被充分利用）
+    fixed    : 指定核数的作业按指定核数运行，放不下时由后面的作业先用空闲核
+    mpi      : use_mpi=True 时经伪 mpiexec 启动，进程数等于分到的核数
+    failure  : 返回码非零 -> failed；引擎无法启动 -> failed 且日志中有原因；不存在的 fsp -> FileNotFoundError
+    timeout  : 超时后终止运行中的作业，排队作业标记为 failed
+
+用法:
+    python benchmarks/engine_scheduler.py
+    python benchmarks/engine_scheduler.py --jobs 12 --cores 8 --duration 0.5 --json result.json
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import stat
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from lumapi.scheduler import EngineScheduler, DONE, FAILED
+
+VERSION = 'v999'
+
+FAKE_ENGINE = '''
+"""伪求解引擎：fdtd-engine [-t 线程数] file.fsp，fsp 为 JSON {{"duration": 秒, "returncode": 整数}}"""
+import json, os, sys, time
+
+EVENTS = {events!r}
+
+args = sys.argv[1:]
+threads = int(args[args.index('-t') + 1]) if '-t' in args else 1
+fsp = args[-1]
+with open(fsp) as f:
+    job = json.load(f)
+processes = int(os.environ.get('FAKE_MPI_PROCESSES', '1'))
+start = time.time()
+time.sleep(job.get('duration', 0.1))
+with open(EVENTS, 'a') as f:
+    f.write(json.dumps({{'fsp': os.path.basename(fsp), 'start': start, 'end': time.time(),
+                        'threads': threads, 'processes': processes}}) + '\\n')
+stem = os.path.splitext(fsp)[0]
+with open(stem + '_p0.log', 'w') as f:
+    f.write('simulation finished\\n')
+os.utime(fsp)
+print('伪引擎完成', fsp)
+sys.exit(job.get('returncode', 0))
+'''
+
+FAKE_MPIEXEC = '''
+"""伪 mpiexec：mpiexec -n N engine ...，以单个进程运行引擎并通过环境变量告知进程数"""
+import os, subprocess, sys
+
+args = sys.argv[1:]
+n = args[args.index('-n') + 1]
+command = args[args.index('-n') + 2:]
+sys.exit(subprocess.call(command, env=dict(os.environ, FAKE_MPI_PROCESSES=n)))
+'''
+
+def install_script(path, source):
+    '''写出可直接执行的 Python 脚本（Linux 用 shebang，Windows 用同名 .bat 包装），return: 可执行文件路径'''
+    with open(path + '.py', 'w') as f:
+        f.write(source)
+    if os.name == 'nt':
+        with open(path + '.bat', 'w') as f:
+            f.write(f'@"{sys.executable}" "{path}.py" %*\n')
+        return path + '.bat'
+    with open(path, 'w') as f:
+        f.write(f'#!{sys.executable}\n' + source)
+    os.chmod(path, os.stat(path).st_mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+    return path
+
+def install_fake_engine(root):
+    '''在 root 下建立 v999/bin/fdtd-engine、mpiexec 与 config.json，return: (config.json 路径, 事件文件路径)'''
+    bin_dir = os.path.join(root, VERSION, 'bin')
+    os.makedirs(bin_dir)
+    events = os.path.join(root, 'events.jsonl')
+    install_script(os.path.join(bin_dir, 'fdtd-engine'), FAKE_ENGINE.format(events=events))
+    install_script(os.path.join(bin_dir, 'mpiexec'), FAKE_MPIEXEC)
+    config_path = os.path.join(root, 'config.json')
+    with open(config_path, 'w') as f:
+        json.dump({'lumerical_path': root, 'version': VERSION}, f)
+    return config_path, events
+
+def make_fsp(folder, name, duration, returncode=0):
+    os.makedirs(folder, exist_ok=True)
+    path = os.path.join(folder, name + '.fsp')
+    with open(path, 'w') as f:
+        json.dump({'duration': duration, 'returncode': returncode}, f)
+    return path
+
+def read_events(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return {e['fsp']: e for e in map(json.loads, f)}
+
+def peak_usage(events, key='threads'):
+    '''按事件时间线统计同时运行的作业数和核数的最大值'''
+    points = sorted([(e['start'], 1, e[key]) for e in events] + [(e['end'], -1, -e[key]) for e in events])
+    jobs = cores = max_jobs = max_cores = 0
+    for _, dj, dc in points:
+        jobs, cores = jobs + dj, cores + dc
+        max_jobs, max_cores = max(max_jobs, jobs), max(max_cores, cores)
+    return max_jobs, max_cores
+
+def run_quiet(scheduler, **kwargs):
+    with contextlib.redirect_stdout(io.StringIO()):
+        t0 = time.perf_counter()
+        scheduler.run(**kwargs)
+    return time.perf_counter() - t0
+
+def check_queue(root, config_path, events, args):
+    folder = os.path.join(root, 'queue')
+    scheduler = EngineScheduler(config_path=config_path, total_cores=args.cores, min_cores=args.min_cores,
+                                output_dir=os.path.join(root, 'out'), poll_interval=0.02)
+    jobs = scheduler.submit_many([make_fsp(folder, f'job{i:02d}', args.duration) for i in range(args.jobs)])
+    elapsed = run_quiet(scheduler)
+    log = read_events(events)
+    used = [log[os.path.basename(j.fsp)] for j in jobs if os.path.basename(j.fsp) in log]
+    max_jobs, max_cores = peak_usage(used)
+    outputs_ok = all(sorted(os.path.basename(p)[len(f'job{j.id:02d}'):] for p in j.outputs)
+                     == ['.fsp', '_engine.log', '_p0.log'] and all(p.startswith(os.path.join(root, 'out')) for p in j.outputs)
+                     for j in jobs)
+    threads_ok = all(log[os.path.basename(j.fsp)]['threads'] == j.cores for j in jobs)
+    return {
+        'queue': all(j.state == DONE for j in jobs) and len(used) == len(jobs) and outputs_ok,
+        'cores': max_cores <= args.cores and max_jobs > 1 and threads_ok,
+    }, {'elapsed': elapsed, 'serial': args.jobs * args.duration, 'max_jobs': max_jobs, 'max_cores': max_cores}
+
+def check_fixed(root, config_path, events, args):
+    '''4 核机器：先提交要 3 核的作业，再提交要 2 核和 1 核的作业，1 核作业应与 3 核作业同时运行'''
+    folder = os.path.join(root, 'fixed')
+    scheduler = EngineScheduler(config_path=config_path, total_cores=4, poll_interval=0.02)
+    big = scheduler.submit(make_fsp(folder, 'big', args.duration), cores=3)
+    mid = scheduler.submit(make_fsp(folder, 'mid', args.duration), cores=2)
+    small = scheduler.submit(make_fsp(folder, 'small', args.duration), cores=1)
+    run_quiet(scheduler)
+    log = read_events(events)
+    b, m, s = (log[os.path.basename(j.fsp)] for j in (big, mid, small))
+    return (all(j.state == DONE for j in (big, mid, small)) and (b['threads'], m['threads'], s['threads']) == (3, 2, 1)
+            and s['start'] < b['end'] and m['start'] >= b['end'] - 0.05 and peak_usage([b, m, s])[1] <= 4)
+
+def check_mpi(root, config_path, events, args):
+    folder = os.path.join(root, 'mpi')
+    scheduler = EngineScheduler(config_path=config_path, total_cores=4, min_cores=2, use_mpi=True, poll_interval=0.02)
+    jobs = scheduler.submit_many([make_fsp(folder, f'mpi{i}', args.duration) for i in range(3)])
+    run_quiet(scheduler)
+    log = read_events(events)
+    return all(j.state == DONE and log[os.path.basename(j.fsp)]['processes'] == j.cores
+               and log[os.path.basename(j.fsp)]['threads'] == 1 for j in jobs) \
+        and peak_usage([log[os.path.basename(j.fsp)] for j in jobs], 'processes')[1] <= 4
+
+def check_failure(root, config_path, events, args):
+    folder = os.path.join(root, 'failure')
+    scheduler = EngineScheduler(config_path=config_path, total_cores=2, poll_interval=0.02)
+    bad = scheduler.submit(make_fsp(folder, 'bad', 0.05, returncode=3))
+    good = scheduler.submit(make_fsp(folder, 'good', 0.05))
+    run_quiet(scheduler)
+    exit_ok = bad.state == FAILED and bad.returncode == 3 and good.state == DONE
+
+    missing = EngineScheduler(engine=os.path.join(root, 'no-such-engine'), total_cores=2, poll_interval=0.02)
+    job = missing.submit(make_fsp(folder, 'orphan', 0.05))
+    run_quiet(missing)
+    with open(job.log_path) as f:
+        launch_ok = job.state == FAILED and job.returncode == -1 and '启动失败' in f.read()
+
+    try:
+        scheduler.submit(os.path.join(folder, 'missing.fsp'))
+        submit_ok = False
+    except FileNotFoundError:
+        submit_ok = True
+    return exit_ok and launch_ok and submit_ok
+
+def check_timeout(root, config_path, events, args):
+    folder = os.path.join(root, 'timeout')
+    scheduler = EngineScheduler(config_path=config_path, total_cores=1, poll_interval=0.02)
+    slow = scheduler.submit(make_fsp(folder, 'slow', 30))
+    waiting = scheduler.submit(make_fsp(folder, 'waiting', 0.05))
+    elapsed = run_quiet(scheduler, timeout=0.5)
+    return slow.state == FAILED and slow.returncode not in (0, None) and waiting.state == FAILED \
+        and waiting.start_time is None and elapsed < 15
+
+def main():
+    parser = argparse.ArgumentParser(description="求解作业调度器：排队、核数分配、并发上限与失败处理（伪求解引擎）")
+    parser.add_argument('--jobs', type=int, default=8, help="排队测试的作业数")
+    parser.add_argument('--cores', type=int, default=4, help="排队测试的总核数")
+    parser.add_argument('--min-cores', type=int, default=1, help="排队测试中每个作业的最少核数")
+    parser.add_argument('--duration', type=float, default=0.3, help="每个伪作业的运行时间（秒）")
+    parser.add_argument('--json', help="将结果保存为 JSON")
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        config_path, events = install_fake_engine(tmp)
+        checks, stats = check_queue(tmp, config_path, events, args)
+        results.update(checks)
+        print(f"{args.jobs} 个作业 × {args.duration:g} s，{args.cores} 核: 耗时 {stats['elapsed']:.2f} s"
+              f"（串行 {stats['serial']:.2f} s），最多同时运行 {stats['max_jobs']} 个作业 / {stats['max_cores']} 核")
+        for name, check in (('fixed', check_fixed), ('mpi', check_mpi), ('failure', check_failure),
+                            ('timeout', check_timeout)):
+            results[name] = check(tmp, config_path, events, args)
+    for name, ok in results.items():
+        print(f"  {name:<10}{'通过' if ok else '失败'}")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'checks': results, 'stats': stats}, f, indent=4, ensure_ascii=False)
+        print(f"结果已保存到 {args.json}")
+    if not all(results.values()):
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
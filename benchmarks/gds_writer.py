@@ -0,0 +1,81 @@
+"""
+GDSII 写入器测试：写入吞吐量、文件大小，以及写入 -> 读取 -> 展开的往返一致性（不需要 Lumerical）
+
+版图（周期 500 nm 的方阵，圆柱）:
+    gradient: 半径沿 x 渐变（每列相同），可大量合并成 AREF
+    random  : 半径从 15 种取值中随机选取，几乎都是单个 SREF
+往返检查：展开后每根柱子的中心和半径与输入逐个比较（数据库单位整数）。
+
+用法:
+    python benchmarks/gds_writer.py
+    python benchmarks/gds_writer.py --sizes 100 1000 --json result.json
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from lumapi.gds import PillarLayout, read_gds, flatten_gds
+
+PITCH = 500e-9
+PRECISION = 1e-9
+
+def pillars(case, n, rng):
+    x, y = np.meshgrid(np.arange(n) * PITCH, np.arange(n) * PITCH)
+    if case == 'gradient':
+        radius = np.round((50 + 150 * x / max(x.max(), PITCH)) / 10) * 10e-9
+    else:
+        radius = rng.choice(np.arange(5, 20) * 10e-9, x.shape)
+    return x.ravel(), y.ravel(), radius.ravel()
+
+def round_trip(path, x, y, radius):
+    '''展开后与输入逐个比较，return: 是否一致'''
+    polys = np.concatenate(flatten_gds(read_gds(path), 'TOP')[(1, 0)])
+    center = np.rint(polys.mean(axis=1) / PRECISION).astype(np.int64)
+    r = np.rint(np.linalg.norm(polys[:, 0] / PRECISION - center, axis=1)).astype(np.int64)
+    got = np.unique(np.column_stack([center, r]), axis=0)
+    expected = np.unique(np.column_stack([np.rint(x / PRECISION), np.rint(y / PRECISION),
+                                          np.rint(radius / PRECISION)]).astype(np.int64), axis=0)
+    return len(polys) == len(x) and np.array_equal(got, expected)
+
+def main():
+    parser = argparse.ArgumentParser(description="GDSII 写入器吞吐量、文件大小与往返一致性")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 300, 1000], help="方阵边长（柱子数为其平方）")
+    parser.add_argument('--cases', nargs='+', default=['gradient', 'random'])
+    parser.add_argument('--vertices', type=int, default=32, help="圆柱多边形顶点数")
+    parser.add_argument('--check-limit', type=int, default=100000, help="柱子数超过该值时跳过往返检查（展开占用内存大）")
+    parser.add_argument('--json', help="将结果保存为 JSON")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    rows = []
+    print(f"{'版图':<10}{'柱子数':>10}{'AREF':>6}{'cell':>6}{'AREF数':>8}{'SREF数':>9}{'大小(MB)':>10}"
+          f"{'耗时(s)':>9}{'柱子/s':>12}{'往返':>6}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for case in args.cases:
+            for n in args.sizes:
+                x, y, radius = pillars(case, n, rng)
+                for use_arrays in (True, False):
+                    layout = PillarLayout(n_vertices=args.vertices)
+                    layout.add_pillars(x, y, radius=radius, layer=1)
+                    path = os.path.join(tmp, f'{case}_{n}_{int(use_arrays)}.gds')
+                    stats = layout.write(path, use_arrays=use_arrays)
+                    ok = round_trip(path, x, y, radius) if len(x) <= args.check_limit else None
+                    rows.append(dict(stats, case=case, size=n, use_arrays=use_arrays, round_trip=ok))
+                    print(f"{case:<10}{stats['pillars']:>10}{'是' if use_arrays else '否':>6}{stats['cells']:>6}"
+                          f"{stats['arefs']:>8}{stats['srefs']:>9}{stats['bytes']/2**20:>10.2f}"
+                          f"{stats['seconds']:>9.2f}{stats['throughput']:>12.3g}"
+                          f"{'-' if ok is None else ('通过' if ok else '失败'):>6}")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(rows, f, indent=4)
+        print(f"结果已保存到 {args.json}")
+    if any(r['round_trip'] is False for r in rows):
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
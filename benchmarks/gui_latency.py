@@ -0,0 +1,172 @@
+"""
+配置工具 GUI 的响应测试：启动到首次绘制、按键处理耗时与主线程卡顿（不需要 Lumerical，需要显示环境）
+
+没有显示器的机器上用 xvfb-run 运行。安装路径使用 install_discovery.py 的伪目录树，
+GUI 的扫描与验证换成带延迟的版本（模拟慢速文件系统）：每次版本检测延迟 --delay 秒，
+Python 环境扫描延迟 --scan 秒，失效挂载卡住直到超时。
+检查项目:
+    startup   : 构造窗口不等待任何扫描，首次绘制早于扫描完成
+    responsive: 扫描和验证进行期间，主线程每次处理事件的耗时都小于 --stall 秒
+    debounce  : 连续输入一个路径只触发一次验证（停止输入后），状态显示正确版本
+    supersede : 慢的旧验证晚于新验证完成时，其结果被丢弃
+    refresh   : 缓存命中启动后，后台重新验证发现的新安装出现在下拉列表中
+
+用法:
+    xvfb-run python benchmarks/gui_latency.py
+    python benchmarks/gui_latency.py --delay 0.5 --json result.json
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+import tkinter as tk
+
+import GUI
+from discovery import probe_root, tree_signature
+from install_discovery import build_trees, slow
+
+class SlowGUI(GUI.LumericalGUI):
+    '''版本检测与 Python 环境扫描带延迟的 GUI，并记录每个路径的检测次数'''
+    delay = 0.2
+    scan = 1.0
+    slow_paths = {}
+
+    def __init__(self, root):
+        self.detections = {}
+        super().__init__(root)
+
+    def detect_version(self, root):
+        self.detections[root] = self.detections.get(root, 0) + 1
+        time.sleep(self.slow_paths.get(root, self.delay))
+        return super().detect_version(root)
+
+    def scan_python_envs(self):
+        time.sleep(self.scan)
+        return [sys.executable]
+
+class Pump:
+    '''驱动 Tk 事件循环并记录每次 update() 的耗时（主线程卡顿）'''
+    def __init__(self, root):
+        self.root = root
+        self.max_stall = 0.0
+
+    def until(self, condition, timeout):
+        deadline = time.perf_counter() + timeout
+        while time.perf_counter() < deadline:
+            t0 = time.perf_counter()
+            self.root.update()
+            self.max_stall = max(self.max_stall, time.perf_counter() - t0)
+            if condition():
+                return True
+            time.sleep(0.002)
+        return False
+
+    def wait(self, seconds):
+        self.until(lambda: False, seconds)
+
+def launch():
+    '''return: (root, app, 构造耗时, 开始时间)'''
+    root = tk.Tk()
+    t0 = time.perf_counter()
+    app = SlowGUI(root)
+    return root, app, time.perf_counter() - t0, t0
+
+def combo_paths(app):
+    return [v.split(" (")[0] for v in app.path_combo['values']]
+
+def main():
+    parser = argparse.ArgumentParser(description="配置工具 GUI：首次绘制、按键耗时与主线程卡顿（模拟慢速文件系统）")
+    parser.add_argument('--delay', type=float, default=0.2, help="每次版本检测的模拟延迟（秒）")
+    parser.add_argument('--scan', type=float, default=1.0, help="Python 环境扫描的模拟延迟（秒）")
+    parser.add_argument('--timeout', type=float, default=0.5, help="安装探测超时（秒）")
+    parser.add_argument('--stall', type=float, default=0.05, help="主线程单次处理事件的耗时上限（秒）")
+    parser.add_argument('--json', help="将结果保存为 JSON")
+    args = parser.parse_args()
+
+    try:
+        tk.Tk().destroy()
+    except tk.TclError as e:
+        print(f"没有可用的显示环境（{e}），跳过。无显示器的机器上请用: xvfb-run python benchmarks/gui_latency.py")
+        return
+
+    results, metrics = {}, {}
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = build_trees(tmp)
+        candidates = [paths[name] for name in ('standalone', 'ansys', 'pending', 'dead')]
+        SlowGUI.delay, SlowGUI.scan = args.delay, args.scan
+        SlowGUI.DISCOVER_OPTIONS = dict(candidates=candidates, cache_path=os.path.join(tmp, 'install_index.json'),
+                                        timeout=args.timeout,
+                                        probe=slow(probe_root, paths['dead'], args.delay, 30.0),
+                                        signature=slow(tree_signature, paths['dead'], args.delay, 30.0))
+
+        # 冷启动：扫描在后台进行，窗口立即出现
+        root, app, construct, t0 = launch()
+        pump = Pump(root)
+        painted = pump.until(lambda: app.metrics['first_paint'] is not None, 5.0)
+        scanned = pump.until(lambda: paths['standalone'] in combo_paths(app) and len(app.py_combo['values']), 10.0)
+        metrics['construct'] = construct
+        metrics['first_paint'] = app.metrics['first_paint']
+        metrics['scan'] = time.perf_counter() - t0
+        results['startup'] = painted and scanned and construct < args.delay and \
+            app.metrics['first_paint'] < min(args.scan, args.timeout)
+        # 启动时对下拉列表第一项的验证完成后再开始计数
+        pump.until(lambda: "验证中" not in app.status_label.cget('text'), 2.0 + args.delay)
+
+        # 连续输入：每 30 ms 一个字符，停止输入后只验证一次
+        target = paths['standalone']
+        app.detections.clear()
+        app.path_combo.focus_force()
+        start = len(target) - 8
+        for i in range(start, len(target) + 1):
+            app.path_var.set(target[:i])
+            app.path_combo.event_generate('<KeyRelease>')
+            pump.wait(0.03)
+        pump.until(lambda: app.detections and "验证中" not in app.status_label.cget('text'), 2.0 + args.delay)
+        pump.wait(0.4)  # 超过去抖间隔，确认没有多余的验证
+        keystrokes = app.metrics['keystroke'][-(len(target) + 1 - start):]
+        metrics['keystroke_max'] = max(keystrokes)
+        metrics['keystroke_mean'] = sum(keystrokes) / len(keystrokes)
+        results['debounce'] = app.detections == {target: 1} and app.status_label.cget('text') == "状态: 有效 (v241)"
+
+        # 旧验证（ansys，慢）晚于新验证（standalone）完成
+        SlowGUI.slow_paths = {paths['ansys']: 4 * args.delay}
+        app.validate_path(paths['ansys'])
+        app.validate_path(paths['standalone'])
+        pump.wait(6 * args.delay)
+        results['supersede'] = app.status_label.cget('text') == "状态: 有效 (v241)" and app.validated[0] == target
+        SlowGUI.slow_paths = {}
+        root.destroy()
+
+        # 热启动：缓存中没有 pending，后台重新验证发现新装的 lumapi.py 后刷新下拉列表
+        with open(os.path.join(paths['pending'], 'v251', 'api', 'python', 'lumapi.py'), 'w') as f:
+            f.write('# fake lumapi\n')
+        root, app, construct, t0 = launch()
+        pump.root = root
+        refreshed = pump.until(lambda: paths['pending'] in combo_paths(app), 4 * args.timeout + 2.0)
+        metrics['refresh'] = time.perf_counter() - t0
+        results['refresh'] = refreshed and paths['standalone'] in combo_paths(app)
+        pump.wait(0.1)
+        root.destroy()
+        metrics['max_stall'] = pump.max_stall
+        results['responsive'] = pump.max_stall < args.stall
+
+    print(f"构造 {metrics['construct']*1e3:.1f} ms，首次绘制 {metrics['first_paint']*1e3:.1f} ms，"
+          f"扫描完成 {metrics['scan']:.2f} s，按键处理 平均 {metrics['keystroke_mean']*1e6:.0f} µs / "
+          f"最长 {metrics['keystroke_max']*1e6:.0f} µs，主线程最长卡顿 {metrics['max_stall']*1e3:.1f} ms，"
+          f"后台刷新 {metrics['refresh']:.2f} s")
+    for name, ok in results.items():
+        print(f"  {name:<11}{'通过' if ok else '失败'}")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'checks': results, 'metrics': metrics}, f, indent=4, ensure_ascii=False)
+        print(f"结果已保存到 {args.json}")
+    if not all(results.values()):
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
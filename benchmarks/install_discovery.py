@@ -0,0 +1,122 @@
+"""
+安装路径发现测试：用伪目录树和模拟的慢速文件系统检查并发探测、超时、缓存与后台重新验证（不需要 Lumerical）
+
+伪目录树（临时目录下）:
+    standalone : v241/api/python/lumapi.py（独立安装）
+    ansys      : v232/Lumerical/api/python/lumapi.py（Ansys 安装）
+    pending    : v251/api/python/ 已存在但还没有 lumapi.py（测试中途装入）
+    empty      : 存在但没有版本目录
+    missing    : 不存在
+    dead       : 模拟失效的网络挂载，stat 与探测都卡住 --hang 秒
+其余目录的每次 stat/探测都额外延迟 --delay 秒，模拟慢速的 NFS。
+检查项目:
+    cold      : 首次查找结果正确，且总耗时受超时限制而不被 dead 阻塞
+    warm      : 缓存覆盖全部候选目录时立即返回（不等待任何探测）
+    deep      : 已有版本目录深处新装 lumapi.py 后，后台验证通过 on_update 报告新安装，下次启动直接可见
+    removed   : 删除 lumapi.py 后，后台验证把该安装移除
+    no-cache  : cache_path=None 时直接并发探测，结果与缓存路径一致
+
+用法:
+    python benchmarks/install_discovery.py
+    python benchmarks/install_discovery.py --delay 0.2 --timeout 1 --json result.json
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from discovery import discover, probe_root, tree_signature
+
+def build_trees(root):
+    '''建立伪目录树，return: {名称: 路径}'''
+    paths = {name: os.path.join(root, name) for name in ('standalone', 'ansys', 'pending', 'empty', 'missing', 'dead')}
+    for name, sub in (('standalone', ('v241', 'api', 'python')), ('ansys', ('v232', 'Lumerical', 'api', 'python'))):
+        os.makedirs(os.path.join(paths[name], *sub))
+        with open(os.path.join(paths[name], *sub, 'lumapi.py'), 'w') as f:
+            f.write('# fake lumapi\n')
+    os.makedirs(os.path.join(paths['pending'], 'v251', 'api', 'python'))
+    os.makedirs(paths['empty'])
+    os.makedirs(paths['dead'])
+    return paths
+
+def slow(func, dead, delay, hang):
+    '''模拟慢速文件系统：dead 目录卡住 hang 秒，其余目录延迟 delay 秒'''
+    def wrapped(path):
+        time.sleep(hang if path == dead else delay)
+        return func(path)
+    return wrapped
+
+def timed_discover(update_event=None, **kwargs):
+    updates = []
+    def on_update(found):
+        updates.append(found)
+        if update_event:
+            update_event.set()
+    t0 = time.perf_counter()
+    found = discover(on_update=on_update, **kwargs)
+    return found, time.perf_counter() - t0, updates
+
+def main():
+    parser = argparse.ArgumentParser(description="安装路径发现：并发探测、超时、缓存与后台验证（伪目录树）")
+    parser.add_argument('--delay', type=float, default=0.1, help="每次 stat/探测的模拟延迟（秒）")
+    parser.add_argument('--hang', type=float, default=30.0, help="失效挂载卡住的时间（秒）")
+    parser.add_argument('--timeout', type=float, default=0.5, help="探测超时（秒）")
+    parser.add_argument('--json', help="将结果保存为 JSON")
+    args = parser.parse_args()
+
+    results, times = {}, {}
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = build_trees(tmp)
+        candidates = list(paths.values())
+        cache_path = os.path.join(tmp, 'index', 'install_index.json')
+        options = dict(candidates=candidates, cache_path=cache_path, timeout=args.timeout,
+                       probe=slow(probe_root, paths['dead'], args.delay, args.hang),
+                       signature=slow(tree_signature, paths['dead'], args.delay, args.hang))
+        expected = [(paths['standalone'], 'v241'), (paths['ansys'], 'v232')]
+
+        # 冷启动：先 stat 再探测，两轮各最多等待 timeout
+        found, times['cold'], _ = timed_discover(**options)
+        results['cold'] = found == expected and times['cold'] < 2 * args.timeout + 1.0 and os.path.exists(cache_path)
+
+        # 热启动：直接返回缓存，后台验证没有变化
+        found, times['warm'], updates = timed_discover(**options)
+        results['warm'] = found == expected and times['warm'] < min(args.delay, 0.05) and not updates
+
+        # 已有版本目录深处出现 lumapi.py：只有 v251/api/python 的修改时间变化
+        with open(os.path.join(paths['pending'], 'v251', 'api', 'python', 'lumapi.py'), 'w') as f:
+            f.write('# fake lumapi\n')
+        event = threading.Event()
+        found, times['deep'], updates = timed_discover(event, **options)
+        event.wait(2 * args.timeout + 2.0)
+        after, _, _ = timed_discover(**dict(options, use_cache=False))
+        expected_deep = expected + [(paths['pending'], 'v251')]
+        results['deep'] = found == expected and updates == [expected_deep] and after == expected_deep
+
+        # 删除安装
+        os.remove(os.path.join(paths['standalone'], 'v241', 'api', 'python', 'lumapi.py'))
+        event = threading.Event()
+        found, _, updates = timed_discover(event, **options)
+        event.wait(2 * args.timeout + 2.0)
+        results['removed'] = found == expected_deep and updates == [expected_deep[1:]]
+
+        found, times['no-cache'], _ = timed_discover(**dict(options, cache_path=None))
+        results['no-cache'] = found == expected_deep[1:] and times['no-cache'] < args.timeout + 1.0
+
+    print(f"冷启动 {times['cold']*1e3:.1f} ms，热启动 {times['warm']*1e3:.2f} ms，"
+          f"不用缓存 {times['no-cache']*1e3:.1f} ms（每次 stat/探测延迟 {args.delay*1e3:g} ms，"
+          f"失效挂载卡住 {args.hang:g} s，超时 {args.timeout:g} s）")
+    for name, ok in results.items():
+        print(f"  {name:<10}{'通过' if ok else '失败'}")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'checks': results, 'times': times}, f, indent=4, ensure_ascii=False)
+        print(f"结果已保存到 {args.json}")
+    if not all(results.values()):
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
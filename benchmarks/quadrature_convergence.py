@@ -0,0 +1,107 @@
+"""
+求积规则的收敛性测试：误差随近场网格步长的变化
+
+测试场景（波长为单位长度，近场区域 [-10, 10]²，边缘处场不为零，模拟监视器截断）:
+    lens    : 高斯切趾的聚焦透镜，目标为焦平面上的一条线和光轴上的一段
+    aperture: 余弦切趾的平面波，目标为大角度的离轴点
+    tilted  : 倾斜 30° 入射的平面波，目标为大角度的离轴点
+参考解: Simpson 规则在很细的网格 (λ/16) 上的结果。
+quadrature=None（直接求和）没有面元，比较前乘以 dx·dy。
+
+用法:
+    python benchmarks/quadrature_convergence.py
+    python benchmarks/quadrature_convergence.py --mode numba --cases lens --json result.json
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from lumapi.lumapi import RorySommerfeld_Scalar, QUADRATURES
+
+LAMB = 1.0
+HALF_WIDTH = 10.0
+
+def near_field(case, step):
+    coords = np.arange(-HALF_WIDTH, HALF_WIDTH + step/2, step)
+    X, Y = np.meshgrid(coords, coords)
+    k = 2*np.pi / LAMB
+    taper = np.cos(np.pi*X/24) * np.cos(np.pi*Y/24)
+    if case == 'lens':
+        E = np.exp(-(X**2 + Y**2)/100) * np.exp(-1j*k*(np.sqrt(X**2 + Y**2 + 400) - 20))
+    elif case == 'aperture':
+        E = taper + 0j
+    else:
+        E = taper * np.exp(1j*k*np.sin(np.pi/6)*X)
+    return coords, coords, E
+
+def targets(case):
+    """[(x_far, y_far, z_far), ...]，每组按网格组合"""
+    if case == 'lens':
+        return [(0.0, np.linspace(-4, 4, 17), 20.0), (0.0, 0.0, np.linspace(10, 30, 11))]
+    return [(np.linspace(-30, 30, 13), 0.0, np.array([5.0, 15.0])),
+            (np.linspace(-30, 30, 13), 3.0, np.array([5.0, 15.0]))]
+
+def propagate(case, step, quadrature, mode):
+    x_near, y_near, E_near = near_field(case, step)
+    parts = []
+    with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+        for x_far, y_far, z_far in targets(case):
+            parts.append(RorySommerfeld_Scalar(LAMB, x_near, y_near, E_near, x_far, y_far, z_far,
+                                               mode=mode, quadrature=quadrature).ravel())
+    E_far = np.concatenate(parts)
+    if quadrature is None:
+        E_far = E_far * step**2
+    return E_far, len(x_near)*len(y_near)
+
+def main():
+    parser = argparse.ArgumentParser(description="求积规则误差 vs 近场网格步长")
+    parser.add_argument('--mode', default='common', help="计算模式（与 RorySommerfeld_Scalar 的 mode 相同）")
+    parser.add_argument('--cases', nargs='+', default=['lens', 'aperture', 'tilted'])
+    parser.add_argument('--steps', type=float, nargs='+', default=[0.125, 0.25, 0.5, 1.0],
+                        help="近场网格步长（以波长为单位）")
+    parser.add_argument('--reference-step', type=float, default=1/16)
+    parser.add_argument('--target', type=float, default=1e-3, help="统计达到该相对误差所需的最少采样点数")
+    parser.add_argument('--json', help="将结果保存为 JSON")
+    args = parser.parse_args()
+
+    rows, summary = [], {}
+    for case in args.cases:
+        print(f"\n== {case} ==  参考解: simpson, 步长 {args.reference_step}λ")
+        reference, _ = propagate(case, args.reference_step, 'simpson', args.mode)
+        norm = np.linalg.norm(reference)
+        print(f"{'规则':<10}{'步长/λ':>8}{'采样点数':>10}{'相对误差':>12}{'耗时(s)':>10}")
+        for quadrature in QUADRATURES:
+            name = quadrature or 'none'
+            for step in args.steps:
+                t0 = time.perf_counter()
+                E_far, samples = propagate(case, step, quadrature, args.mode)
+                elapsed = time.perf_counter() - t0
+                error = float(np.linalg.norm(E_far - reference) / norm)
+                rows.append({'case': case, 'quadrature': name, 'step': step, 'samples': samples,
+                             'error': error, 'time': elapsed})
+                print(f"{name:<10}{step:>8.3f}{samples:>10d}{error:>12.2e}{elapsed:>10.2f}")
+
+        print(f"达到相对误差 {args.target:g} 所需的最少采样点数:")
+        summary[case] = {}
+        for quadrature in QUADRATURES:
+            name = quadrature or 'none'
+            ok = [r['samples'] for r in rows if r['case'] == case and r['quadrature'] == name
+                  and r['error'] <= args.target]
+            summary[case][name] = min(ok) if ok else None
+            print(f"  {name:<10}{min(ok) if ok else '未达到'}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'mode': args.mode, 'reference_step': args.reference_step, 'target': args.target,
+                       'results': rows, 'min_samples': summary}, f, indent=4)
+        print(f"结果已保存到 {args.json}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,314 @@
+"""
+包装层开销测试：用伪厂商 lumapi.py 测量本库自身增加的耗时（不需要 Lumerical）
+
+伪厂商模块安装在临时目录的 v999/api/python/lumapi.py 中，接口与 Lumerical 的 lumapi 相同，
+每次调用按设定的延迟忙等（模拟进程间通信），加载模块和创建会话也各有固定耗时。
+测试项目:
+    import        : 新解释器中 import lumapi / from lumapi import LumAPI / 访问 Kirchhoff（导入 numpy）
+    validate_path : 首次加载厂商模块 vs 缓存命中
+    LumAPI()      : 从 config.json 构造（配置缓存未命中 / 命中）
+    session       : LumAPI().FDTD() 等会话构造 vs 直接构造厂商会话
+    call          : 每次转发调用的额外耗时（首次经过 __getattr__、之后命中实例缓存、开启 CallTracer）
+    geometry      : N 根柱子逐个 addcircle vs 一次 eval 脚本 vs PillarLayout 写 GDS 后 gdsimport
+结果可保存为 JSON（--json），追加到历史文件（--history，每次一行），或与基准结果比较（--baseline）。
+
+用法:
+    python benchmarks/wrapper_overhead.py
+    python benchmarks/wrapper_overhead.py --latency 1e-4 --pillars 1000 10000 --json result.json
+    python benchmarks/wrapper_overhead.py --baseline result.json --tolerance 1.5
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+import lumapi
+from lumapi import lumapi as core
+
+VERSION = 'v999'
+
+FAKE_VENDOR = '''
+"""伪厂商 lumapi：接口与 Lumerical 的 lumapi.py 相同，耗时由模块变量控制"""
+import time
+
+LOAD_DELAY = {load_delay!r}        # 加载模块的耗时（真实模块加载接口动态库）
+SESSION_DELAY = {session_delay!r}  # 创建会话的耗时
+LATENCY = {latency!r}              # 每次调用的耗时（进程间通信）
+
+def _busy(seconds):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+_busy(LOAD_DELAY)
+
+class _Simulation:
+    def __init__(self, filename=None, key=None, hide=False, serverArgs={{}}, remoteArgs={{}}, **kwargs):
+        _busy(SESSION_DELAY)
+        self.filename = filename
+        self.calls = 0
+        self.objects = 0
+
+    def _call(self):
+        self.calls += 1
+        _busy(LATENCY)
+
+    def addrect(self, **properties):
+        self._call()
+        self.objects += 1
+
+    def addcircle(self, **properties):
+        self._call()
+        self.objects += 1
+
+    def set(self, *args):
+        self._call()
+
+    def getnamednumber(self, name):
+        self._call()
+        return self.objects
+
+    def eval(self, script):
+        self._call()
+        self.objects += script.count('addcircle;')
+
+    def gdsimport(self, path, cell, layer, material=None, z_min=None, z_max=None):
+        self._call()
+        self.objects += 1
+
+    def close(self):
+        self._call()
+
+class FDTD(_Simulation):
+    pass
+
+class MODE(_Simulation):
+    pass
+
+class DEVICE(_Simulation):
+    pass
+
+class INTERCONNECT(_Simulation):
+    pass
+'''
+
+def install_fake_vendor(root, load_delay, session_delay, latency):
+    '''在 root 下建立 v999/api/python/lumapi.py 与 config.json，return: config.json 路径'''
+    api_dir = os.path.join(root, VERSION, 'api', 'python')
+    os.makedirs(api_dir)
+    with open(os.path.join(api_dir, 'lumapi.py'), 'w') as f:
+        f.write(FAKE_VENDOR.format(load_delay=load_delay, session_delay=session_delay, latency=latency))
+    config_path = os.path.join(root, 'config.json')
+    with open(config_path, 'w') as f:
+        json.dump({'lumerical_path': root, 'version': VERSION}, f)
+    return config_path
+
+def measure(func, number, repeat=5):
+    '''每次调用的耗时（重复 repeat 轮取最小值），return: 秒'''
+    best = float('inf')
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for _ in range(number):
+            func()
+        best = min(best, (time.perf_counter() - t0) / number)
+    return best
+
+def measure_import(statement, repeat):
+    '''新解释器中执行 statement 的耗时（不含解释器启动），return: 秒'''
+    code = f'import time; t0 = time.perf_counter(); {statement}; print(time.perf_counter() - t0)'
+    env = dict(os.environ, PYTHONPATH=ROOT + os.pathsep + os.environ.get('PYTHONPATH', ''))
+    times = []
+    for _ in range(repeat):
+        out = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, env=env, cwd=ROOT, check=True)
+        times.append(float(out.stdout.strip().splitlines()[-1]))
+    return min(times)
+
+def bench_import(args):
+    return {
+        'import lumapi': measure_import('import lumapi', args.import_repeat),
+        'from lumapi import LumAPI': measure_import('from lumapi import LumAPI', args.import_repeat),
+        'lumapi.Kirchhoff (numpy)': measure_import('import lumapi; lumapi.Kirchhoff', args.import_repeat),
+    }
+
+def bench_setup(root, config_path, args):
+    def cold_validate():
+        core._LUMAPI_CACHE.clear()
+        core.validate_path(root, VERSION)
+    def cold_config():
+        core._CONFIG_CACHE.clear()
+        lumapi.LumAPI(config_path=config_path)
+    results = {
+        'validate_path (首次加载)': measure(cold_validate, 3),
+        'validate_path (缓存)': measure(lambda: core.validate_path(root, VERSION), 1000),
+        'LumAPI() (读取 config.json)': measure(cold_config, 200),
+        'LumAPI() (配置缓存)': measure(lambda: lumapi.LumAPI(config_path=config_path), 1000),
+    }
+    api = lumapi.LumAPI(config_path=config_path)
+    vendor = api.lumapi
+    vendor.SESSION_DELAY = args.session_delay
+    for name in ('FDTD', 'MODE', 'DEVICE', 'INTERCONNECT'):
+        # 伪厂商的各会话类完全相同，计时之前先确认包装层创建的是对应类型的会话
+        session = getattr(api, name)()
+        if type(session).__name__ != name:
+            raise RuntimeError(f'LumAPI().{name}() 创建了 {type(session).__name__} 会话')
+        vendor_session = type(session.__dict__[name.lower()]).__name__
+        if vendor_session != name:
+            raise RuntimeError(f'LumAPI().{name}() 的厂商会话为 {vendor_session}')
+        direct = measure(lambda: getattr(vendor, name)(), 200)
+        wrapped = measure(lambda: getattr(api, name)(), 200)
+        results[f'{name}() 包装层'] = wrapped - direct
+    return results, api
+
+def bench_calls(api, args):
+    '''每次调用的额外耗时 = 经过包装层的调用 - 直接调用厂商会话'''
+    api.lumapi.LATENCY = 0.0
+    n = args.calls
+    fdtd = api.FDTD()
+    direct = measure(lambda: fdtd.fdtd.set('x', 0), n)
+
+    def first_access():
+        session = api.FDTD()
+        t0 = time.perf_counter()
+        session.set('x', 0)
+        return time.perf_counter() - t0
+    first = min(first_access() for _ in range(200))
+    cached = measure(lambda: fdtd.set('x', 0), n)
+    traced_session = lumapi.LumAPI(config_path=api.config_path, tracer=lumapi.CallTracer()).FDTD()
+    traced = measure(lambda: traced_session.set('x', 0), n)
+    return {
+        '直接调用厂商会话': direct,
+        '首次调用 (__getattr__)': first - direct,
+        '之后的调用 (实例缓存)': cached - direct,
+        '开启 CallTracer': traced - direct,
+    }
+
+def bench_geometry(api, tmp, args):
+    import numpy as np
+    from lumapi.gds import PillarLayout
+    api.lumapi.LATENCY = args.latency
+    rows = {}
+    for n in args.pillars:
+        side = int(np.ceil(np.sqrt(n)))
+        X, Y = np.meshgrid(np.arange(side) * 500e-9, np.arange(side) * 500e-9)
+        x, y = X.ravel()[:n], Y.ravel()[:n]
+        radius = np.full(n, 100e-9)
+
+        fdtd = api.FDTD()
+        t0 = time.perf_counter()
+        for i in range(n):
+            fdtd.addcircle(name='pillar', x=x[i], y=y[i], radius=radius[i], z_min=0, z_max=600e-9, material='TiO2')
+        unbatched = time.perf_counter() - t0
+
+        fdtd = api.FDTD()
+        t0 = time.perf_counter()
+        script = ''.join(f'addcircle; set("x",{x[i]!r}); set("y",{y[i]!r}); set("radius",{radius[i]!r});'
+                         f'set("z min",0); set("z max",6e-7); set("material","TiO2");\n' for i in range(n))
+        fdtd.eval(script)
+        scripted = time.perf_counter() - t0
+
+        fdtd = api.FDTD()
+        t0 = time.perf_counter()
+        layout = PillarLayout()
+        layout.add_pillars(x, y, radius=radius, layer=1)
+        path = os.path.join(tmp, f'pillars_{n}.gds')
+        layout.write(path)
+        layout.import_to(fdtd, path, {(1, 0): {'material': 'TiO2', 'z_min': 0, 'z_max': 600e-9}})
+        gds = time.perf_counter() - t0
+        rows[n] = {'逐个 addcircle': unbatched, '一次 eval 脚本': scripted, 'PillarLayout + gdsimport': gds,
+                   'calls': {'逐个 addcircle': n, '一次 eval 脚本': 1, 'PillarLayout + gdsimport': 1}}
+    return rows
+
+def compare(results, baseline, tolerance):
+    '''与基准结果比较，return: 变慢超过 tolerance 倍的项目 [(分组, 项目, 基准, 当前)]'''
+    slower = []
+    for group in ('import', 'setup', 'call'):
+        for name, value in results.get(group, {}).items():
+            old = baseline.get(group, {}).get(name)
+            # 小于 1 µs 的差值主要是计时噪声
+            if old is not None and value > max(old * tolerance, old + 1e-6):
+                slower.append((group, name, old, value))
+    return slower
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=ROOT, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def print_group(title, results, unit='µs', scale=1e6):
+    print(f"\n== {title} ==")
+    for name, value in results.items():
+        print(f"  {name:<32}{value*scale:>12.2f} {unit}")
+
+def main():
+    parser = argparse.ArgumentParser(description="包装层开销：导入、构造、转发调用与批量建模（伪厂商 lumapi）")
+    parser.add_argument('--latency', type=float, default=1e-4, help="伪厂商每次调用的耗时（秒），用于批量建模对比")
+    parser.add_argument('--load-delay', type=float, default=0.02, help="伪厂商模块加载耗时（秒）")
+    parser.add_argument('--session-delay', type=float, default=0.0, help="伪厂商创建会话的耗时（秒）")
+    parser.add_argument('--calls', type=int, default=100000, help="测量转发开销的调用次数")
+    parser.add_argument('--pillars', type=int, nargs='+', default=[1000, 10000], help="批量建模的柱子数")
+    parser.add_argument('--import-repeat', type=int, default=5, help="导入耗时的测量次数（取最小值）")
+    parser.add_argument('--skip', nargs='*', default=[], choices=['import', 'setup', 'call', 'geometry'])
+    parser.add_argument('--json', help="将结果保存为 JSON")
+    parser.add_argument('--history', help="把结果追加到该文件（JSON Lines，每次运行一行）")
+    parser.add_argument('--baseline', help="与该 JSON 结果比较，变慢超过 --tolerance 倍时返回非零")
+    parser.add_argument('--tolerance', type=float, default=1.5)
+    args = parser.parse_args()
+
+    results = {'meta': {'time': time.strftime('%Y-%m-%d %H:%M:%S'), 'commit': git_commit(),
+                        'python': platform.python_version(), 'platform': platform.platform(),
+                        'latency': args.latency, 'load_delay': args.load_delay, 'calls': args.calls}}
+    with tempfile.TemporaryDirectory() as tmp:
+        config_path = install_fake_vendor(tmp, args.load_delay, args.session_delay, args.latency)
+        if 'import' not in args.skip:
+            results['import'] = bench_import(args)
+            print_group('导入（新解释器）', results['import'], 'ms', 1e3)
+        with contextlib.redirect_stdout(io.StringIO()):
+            results['setup'], api = bench_setup(tmp, config_path, args)
+        if 'setup' not in args.skip:
+            print_group('加载与构造', results['setup'])
+        else:
+            del results['setup']
+        if 'call' not in args.skip:
+            results['call'] = bench_calls(api, args)
+            print_group('每次调用的额外耗时', results['call'], 'ns', 1e9)
+        if 'geometry' not in args.skip:
+            with contextlib.redirect_stdout(io.StringIO()):
+                geometry = bench_geometry(api, tmp, args)
+            results['geometry'] = {str(n): row for n, row in geometry.items()}
+            print(f"\n== 批量建模（每次调用 {args.latency*1e6:g} µs）==")
+            print(f"  {'柱子数':>8}  {'方式':<26}{'调用次数':>10}{'耗时(s)':>12}")
+            for n, row in geometry.items():
+                for name, calls in row['calls'].items():
+                    print(f"  {n:>8}  {name:<26}{calls:>10}{row[name]:>12.4f}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=4, ensure_ascii=False)
+        print(f"\n结果已保存到 {args.json}")
+    if args.history:
+        with open(args.history, 'a') as f:
+            f.write(json.dumps(results, ensure_ascii=False) + '\n')
+        print(f"结果已追加到 {args.history}")
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        slower = compare(results, baseline, args.tolerance)
+        print(f"\n与基准 {args.baseline}（commit {baseline.get('meta', {}).get('commit')}）比较，阈值 {args.tolerance:g} 倍:")
+        for group, name, old, new in slower:
+            print(f"  变慢: [{group}] {name}: {old*1e6:.3f} µs -> {new*1e6:.3f} µs")
+        if slower:
+            sys.exit(1)
+        print("  没有变慢的项目")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,205 @@
+"""
+Lumerical 安装路径发现（GUI 与 CLI 共用）
+
+所有候选目录并发探测，每个探测有超时限制，失效的网络驱动器/NFS挂载不会阻塞启动；
+结果按 路径+修改时间（根目录与各版本目录）缓存到本地索引文件，下次启动直接使用缓存，并在后台重新验证。
+"""
+import json
+import os
+import platform
+import re
+import threading
+import time
+
+CACHE_PATH = os.path.join(os.path.expanduser("~"), ".lumapi", "install_index.json")
+PROBE_TIMEOUT = 2.0
+
+def get_lumapi_path(lumerical_root, version):
+    base_path = os.path.join(lumerical_root, version)
+    ansys_path = os.path.join(base_path, "Lumerical", "api", "python", "lumapi.py")
+    if os.path.exists(ansys_path): return ansys_path
+    standalone_path = os.path.join(base_path, "api", "python", "lumapi.py")
+    if os.path.exists(standalone_path): return standalone_path
+    return standalone_path
+
+def detect_version(lumerical_root):
+    try:
+        if not os.path.exists(lumerical_root): return None
+        for item in os.listdir(lumerical_root):
+            item_path = os.path.join(lumerical_root, item)
+            if os.path.isdir(item_path) and re.match(r'^v\d{3}$', item):
+                if os.path.exists(get_lumapi_path(lumerical_root, item)):
+                    return item
+        return None
+    except: return None
+
+def candidate_roots():
+    """返回当前系统上可能的 Lumerical 安装根目录列表"""
+    if platform.system() == "Windows":
+        import string
+        from ctypes import windll
+        drives = []
+        bitmask = windll.kernel32.GetLogicalDrives()
+        for letter in string.ascii_uppercase:
+            if bitmask & 1: drives.append(letter + ":\\")
+            bitmask >>= 1
+        paths = []
+        for drive in drives:
+            paths += [
+                os.path.join(drive, "Program Files", "Lumerical"),
+                os.path.join(drive, "Program Files (x86)", "Lumerical"),
+                os.path.join(drive, "Lumerical"),
+                os.path.join(drive, "Program Files", "Ansys Inc"),
+                os.path.join(drive, "Program Files (x86)", "Ansys Inc")
+            ]
+        return paths
+    elif platform.system() == "Linux":
+        return [
+            "/opt/lumerical", "/usr/local/lumerical",
+            "/usr/ansys_inc", "/opt/ansys_inc",
+            os.path.expanduser("~/Ansys/ansys_inc"), os.path.expanduser("~/ansys_inc")
+        ]
+    return []
+
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime
+    except OSError:
+        return None
+
+def tree_signature(path):
+    '''
+    候选目录的修改时间签名：根目录及每个 vXXX 目录、其下两种 api/python 目录的修改时间
+    已有版本目录中新增或删除 lumapi.py 时签名也会变化
+    return: [根目录mtime, [[版本, mtime, ...], ...]]，目录不存在时为 None
+    '''
+    root = _mtime(path)
+    if root is None:
+        return None
+    versions = []
+    try:
+        names = sorted(os.listdir(path))
+    except OSError:
+        names = []
+    for item in names:
+        if re.match(r'^v\d{3}$', item):
+            base = os.path.join(path, item)
+            versions.append([item, _mtime(base), _mtime(os.path.join(base, "api", "python")),
+                             _mtime(os.path.join(base, "Lumerical", "api", "python"))])
+    return [root, versions]
+
+def probe_root(path):
+    """探测单个候选目录，返回 (signature, version)；目录不存在时 signature 为 None"""
+    signature = tree_signature(path)
+    if signature is None:
+        return None, None
+    return signature, detect_version(path)
+
+def run_with_timeout(func, items, timeout):
+    '''
+    对每个item并发执行func(item)，最多等待timeout秒
+    return: {item: 结果}，超时未完成的item不在结果中
+    探测线程为守护线程，卡死的挂载点不会阻止程序退出
+    '''
+    results = {}
+    lock = threading.Lock()
+    done = threading.Semaphore(0)
+
+    def worker(item):
+        try:
+            value = func(item)
+        except Exception:
+            value = None
+        with lock:
+            results[item] = value
+        done.release()
+
+    for item in items:
+        threading.Thread(target=worker, args=(item,), daemon=True).start()
+    deadline = time.monotonic() + timeout
+    for _ in items:
+        if not done.acquire(timeout=max(0.0, deadline - time.monotonic())):
+            break
+    with lock:
+        return dict(results)
+
+def load_index(cache_path=CACHE_PATH):
+    try:
+        with open(cache_path, 'r') as f:
+            return json.load(f)
+    except Exception:
+        return {}
+
+def save_index(index, cache_path=CACHE_PATH):
+    try:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(index, f, indent=4)
+        os.replace(tmp_path, cache_path)
+    except Exception:
+        pass
+
+def _found(index, candidates):
+    return [(p, index[p]['version']) for p in candidates if index.get(p, {}).get('version')]
+
+def revalidate(candidates, cache_path=CACHE_PATH, timeout=PROBE_TIMEOUT, probe=probe_root, signature=tree_signature):
+    '''
+    重新探测候选目录并更新缓存索引：只对修改时间签名变化的目录重新检测版本
+    return: (found, changed)
+    '''
+    index = load_index(cache_path)
+    stats = run_with_timeout(signature, candidates, timeout)
+    changed = False
+    for p in candidates:
+        # 超时的目录：已有缓存则保留，否则记为不可用，下次启动不再等待，由后台验证重试
+        if p not in stats and p not in index:
+            index[p] = {'signature': None, 'version': None}
+            changed = True
+    stale = [p for p in candidates if p in stats and stats[p] != index.get(p, {}).get('signature', -1)]
+    results = run_with_timeout(probe, stale, timeout)
+    for p in stale:
+        if p not in results:
+            if p not in index:
+                index[p] = {'signature': None, 'version': None}
+                changed = True
+            continue
+        sig, version = results[p] or (None, None)
+        entry = {'signature': sig, 'version': version}
+        if index.get(p) != entry:
+            index[p] = entry
+            changed = True
+    if changed:
+        save_index(index, cache_path)
+    return _found(index, candidates), changed
+
+def discover(candidates=None, cache_path=CACHE_PATH, timeout=PROBE_TIMEOUT, probe=probe_root,
+             use_cache=True, on_update=None, signature=tree_signature):
+    '''
+    查找 Lumerical 安装
+    candidates: 候选根目录列表，默认由 candidate_roots() 生成
+    cache_path: 缓存索引文件，None 表示不使用缓存
+    timeout: 探测超时(秒)，超时的目录视为不可用
+    probe: 探测函数 probe(path) -> (signature, version)，可替换为测试用的模拟函数
+    signature: 修改时间签名函数，签名与缓存一致的目录不再探测，见 tree_signature
+    use_cache: 缓存覆盖全部候选目录时直接返回缓存结果，并在后台线程中重新验证
+    on_update: 后台验证发现变化时调用 on_update(found)
+    return: [(path, version), ...]
+    '''
+    if candidates is None:
+        candidates = candidate_roots()
+    if not cache_path:
+        results = run_with_timeout(probe, candidates, timeout)
+        return [(p, results[p][1]) for p in candidates if results.get(p) and results[p][1]]
+
+    index = load_index(cache_path)
+    if use_cache and candidates and all(p in index for p in candidates):
+        def background():
+            found, changed = revalidate(candidates, cache_path, timeout, probe, signature)
+            if changed and on_update:
+                on_update(found)
+        threading.Thread(target=background, daemon=True).start()
+        return _found(index, candidates)
+
+    found, _ = revalidate(candidates, cache_path, timeout, probe, signature)
+    return found
@@ -1,3 +1,51 @@
-from lumapi.lumapi import *
+import importlib
 
+# 按需导入：名称 -> 所在子模块，未列出的名称从 lumapi.lumapi 中查找
+# 只有在首次访问某个名称时才会导入对应模块（以及 numpy 等依赖）
+_LAZY = {
+    'EngineScheduler': 'lumapi.scheduler',
+    'run_fsp_files': 'lumapi.scheduler',
+    'AsyncFDTD': 'lumapi.aio',
+    'AsyncMODE': 'lumapi.aio',
+    'AsyncDEVICE': 'lumapi.aio',
+    'AsyncINTERCONNECT': 'lumapi.aio',
+    'offload': 'lumapi.aio',
+    'IncrementalFarField': 'lumapi.incremental',
+    'floquet_orders': 'lumapi.periodic',
+    'periodic_field': 'lumapi.periodic',
+    'finite_array_far_field': 'lumapi.periodic',
+    'far_field_pattern': 'lumapi.angular',
+    'DistributedPropagator': 'lumapi.distributed',
+    'LocalCluster': 'lumapi.distributed',
+    'PillarLayout': 'lumapi.gds',
+    'GDSWriter': 'lumapi.gds',
+    'read_gds': 'lumapi.gds',
+    'flatten_gds': 'lumapi.gds',
+    'MetaAtomLibrary': 'lumapi.metaatom',
+    'run_pipeline': 'lumapi.pipeline',
+    'FieldPyramid': 'lumapi.plotting',
+    'imshow_lod': 'lumapi.plotting',
+    'FieldStore': 'lumapi.fieldstore',
+}
 
+__all__ = [
+    'LumAPI', 'FDTD', 'MODE', 'DEVICE', 'INTERCONNECT', 'CallTracer',
+    'validate_path', 'detect_version', 'get_lumapi_path', 'load_config', 'create_cmap',
+    'Kirchhoff', 'RorySommerfeld_Scalar', 'RorySommerfeld_Vector',
+    'plan_propagation', 'get_propagation_stats',
+    'propagate', 'register_kernel', 'PropagationKernel', 'detect_symmetry',
+] + list(_LAZY)
+
+def __getattr__(name):
+    if name.startswith('__'):
+        raise AttributeError(name)
+    module = importlib.import_module(_LAZY.get(name, 'lumapi.lumapi'))
+    try:
+        value = getattr(module, name)
+    except AttributeError:
+        raise AttributeError(f"module 'lumapi' has no attribute '{name}'") from None
+    globals()[name] = value
+    return value
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -0,0 +1,123 @@
+import numpy as np
+
+from lumapi.lumapi import _numpy, _get_kernel, _propagate_fields
+
+# 正向与伴随算子都由 lumapi.lumapi 的传播引擎计算：内置核与 register_kernel 注册的核均可使用，
+# 所有计算模式（'numba'、'vectorized'、'nufft' 等）和 numba 编译结果与 Kirchhoff 等函数共用
+
+def _is_vector(kernel):
+    """RorySommerfeld_Vector：x/y 分量共用一个系数 G，z 分量为 -(E_x + E_y) 的传播"""
+    return kernel.name == 'RorySommerfeld_Vector'
+
+def _far_axes(x_far, y_far, z_far):
+    return tuple(np.atleast_1d(np.asarray(a, dtype=np.float64)) for a in (x_far, y_far, z_far))
+
+def _forward(kernel, lamb, x_near, y_near, fields, x_far, y_far, z_far, mode):
+    '''基础线性算子 A：近场列表 (len(y_near), len(x_near)) -> 远场列表 (len(x_far), len(y_far), len(z_far))'''
+    return _propagate_fields(kernel, lamb, np.asarray(x_near, dtype=np.float64), np.asarray(y_near, dtype=np.float64),
+                             fields, *_far_axes(x_far, y_far, z_far), mode, 1e-6, None)
+
+def _adjoint(kernel, lamb, x_near, y_near, g_fars, x_far, y_far, z_far, mode):
+    '''
+    共轭转置 A^H：(A^H g)[近场点] = Σ_远场点 conj(K)·g
+    每个 z 平面上把远场网格当作"近场"、近场网格当作同一 z 处的"远场"做一次正向传播。
+    两组坐标都取负号，引擎中的位移 (-x_near) - (-x_far) 就等于正向传播的 x_far - x_near，
+    任意核（不要求镜像对称）都得到同一个系数 K，再由 conj(Σ K·conj(g)) 得到 Σ conj(K)·g
+    '''
+    x_near = np.asarray(x_near, dtype=np.float64)
+    y_near = np.asarray(y_near, dtype=np.float64)
+    x_far, y_far, z_far = _far_axes(x_far, y_far, z_far)
+    shape = (len(x_far), len(y_far), len(z_far))
+    g_fars = [np.broadcast_to(np.asarray(g, dtype=np.complex128), shape) for g in g_fars]
+    outs = [np.zeros((len(y_near), len(x_near)), dtype=np.complex128) for _ in g_fars]
+    for iz, z in enumerate(z_far):
+        sources = [np.conj(g[:, :, iz]).T for g in g_fars]   # [y_far, x_far]
+        results = _propagate_fields(kernel, lamb, -x_far, -y_far, sources, -x_near, -y_near, np.array([z]),
+                                    mode, 1e-6, None)
+        for out, result in zip(outs, results):
+            out += np.conj(result[:, :, 0]).T
+    return outs
+
+def forward(lamb, x_near, y_near, E_near, x_far, y_far, z_far, kernel='Kirchhoff', mode='numba'):
+    '''
+    正向传播（与 Kirchhoff/RorySommerfeld_* 结果一致，共用同一个传播引擎和 numba 编译结果）
+    kernel: 'Kirchhoff' / 'RorySommerfeld_Scalar' / 'RorySommerfeld_Vector'，或 register_kernel 注册的核
+    E_near: 标量核为二维数组（或共用同一个核的多个近场组成的列表）；矢量核为 (E_near_x, E_near_y)
+    mode: 计算模式，见 Kirchhoff
+    return: 标量核为远场数组 (len(x_far), len(y_far), len(z_far))，E_near 为列表时为列表；矢量核为 (E_far_x, E_far_y, E_far_z)
+    '''
+    _numpy()
+    kernel = _get_kernel(kernel)
+    if _is_vector(kernel):
+        E_far_x, E_far_y = _forward(kernel, lamb, x_near, y_near, list(E_near), x_far, y_far, z_far, mode)
+        return E_far_x, E_far_y, -(E_far_x + E_far_y)
+    if isinstance(E_near, (list, tuple)):
+        return _forward(kernel, lamb, x_near, y_near, list(E_near), x_far, y_far, z_far, mode)
+    return _forward(kernel, lamb, x_near, y_near, [E_near], x_far, y_far, z_far, mode)[0]
+
+def adjoint(lamb, x_near, y_near, g_far, x_far, y_far, z_far, kernel='Kirchhoff', mode='numba'):
+    '''
+    伴随（共轭转置）传播：把远场上的灵敏度 g_far 传回近场
+    g_far: 标量核为远场形状的数组（或多个远场组成的列表）；矢量核为 (g_x, g_y, g_z)
+    return: 标量核为 (len(y_near), len(x_near)) 数组，g_far 为列表时为列表；矢量核为 (grad_x, grad_y)
+    '''
+    _numpy()
+    kernel = _get_kernel(kernel)
+    if _is_vector(kernel):
+        g_x, g_y, g_z = (np.asarray(g) for g in g_far)
+        # E_far_z = -G(E_near_x + E_near_y)，因此 z 分量的灵敏度以 -G^H 分别回传到 x/y 分量
+        back_x, back_y = _adjoint(kernel, lamb, x_near, y_near, [g_x - g_z, g_y - g_z], x_far, y_far, z_far, mode)
+        return back_x, back_y
+    if isinstance(g_far, (list, tuple)):
+        return _adjoint(kernel, lamb, x_near, y_near, list(g_far), x_far, y_far, z_far, mode)
+    return _adjoint(kernel, lamb, x_near, y_near, [g_far], x_far, y_far, z_far, mode)[0]
+
+# ================= 目标函数（同时返回值和梯度） =================
+# 梯度 grad 满足 δJ ≈ Re(Σ conj(grad)·δE_near)，即 ∂J/∂Re(E) = Re(grad)，∂J/∂Im(E) = Im(grad)
+# 每个目标函数的代价约为一次正向传播加一次伴随传播
+
+def _components(E_far):
+    return list(E_far) if isinstance(E_far, (list, tuple)) else [E_far]
+
+def intensity_at_points(lamb, x_near, y_near, E_near, x_far, y_far, z_far, weights=None,
+                        kernel='Kirchhoff', mode='numba'):
+    '''
+    远场点光强的加权和 J = Σ w·|E_far|²（矢量核为三个分量光强之和）
+    x_far, y_far, z_far: 目标点坐标（按网格组合），例如焦点 (0, 0, f)
+    weights: 与远场同形状的权重，默认全为1
+    return: (J, grad)
+    '''
+    E_far = forward(lamb, x_near, y_near, E_near, x_far, y_far, z_far, kernel, mode)
+    comps = _components(E_far)
+    w = 1.0 if weights is None else np.asarray(weights, dtype=np.float64)
+    J = float(sum(np.sum(w * np.abs(c)**2) for c in comps))
+    sens = [2 * w * c for c in comps]
+    grad = adjoint(lamb, x_near, y_near, sens if isinstance(E_far, (list, tuple)) else sens[0], x_far, y_far, z_far, kernel, mode)
+    return J, grad
+
+def power_in_region(lamb, x_near, y_near, E_near, x_far, y_far, z_far, region,
+                    kernel='Kirchhoff', mode='numba'):
+    '''
+    远场区域内的功率 J = Σ_{region} |E_far|²
+    region: 与远场同形状的布尔数组（或0~1的权重）
+    return: (J, grad)
+    '''
+    return intensity_at_points(lamb, x_near, y_near, E_near, x_far, y_far, z_far,
+                               weights=np.asarray(region, dtype=np.float64), kernel=kernel, mode=mode)
+
+def overlap(lamb, x_near, y_near, E_near, x_far, y_far, z_far, E_target,
+            kernel='Kirchhoff', mode='numba'):
+    '''
+    与目标场的重叠 J = |Σ conj(E_target)·E_far|² / Σ|E_target|²
+    E_target: 与远场同形状的目标场（矢量核为三个分量的元组）
+    return: (J, grad)
+    '''
+    E_far = forward(lamb, x_near, y_near, E_near, x_far, y_far, z_far, kernel, mode)
+    comps = _components(E_far)
+    targets = [np.asarray(t, dtype=np.complex128) for t in _components(E_target)]
+    norm = sum(np.sum(np.abs(t)**2) for t in targets)
+    c = sum(np.sum(np.conj(t) * f) for t, f in zip(targets, comps))
+    J = float(np.abs(c)**2 / norm)
+    sens = [2 * c * t / norm for t in targets]
+    grad = adjoint(lamb, x_near, y_near, sens if isinstance(E_far, (list, tuple)) else sens[0], x_far, y_far, z_far, kernel, mode)
+    return J, grad
@@ -0,0 +1,135 @@
+import asyncio
+import functools
+import itertools
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+_session_ids = itertools.count()
+
+
+class AsyncSession:
+    '''
+    会话的asyncio外观：所有方法均为可等待的协程
+
+    每个会话独占一个工作线程，阻塞的厂商接口调用都在该线程中按提交顺序执行，
+    因此同一会话内的调用顺序不变，而不同会话之间可以由协程并发驱动。
+
+    factory: 在工作线程中创建同步会话的函数，例如 LumAPI().FDTD
+    *args, **kwargs: 传给factory的参数
+    '''
+    def __init__(self, factory, *args, **kwargs):
+        self.id = next(_session_ids)
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f'lumapi-session-{self.id}')
+        # 会话本身也在工作线程中创建，避免厂商接口跨线程使用
+        self._session = None
+        self._error = None
+        self._created = self._executor.submit(self._create, factory, args, kwargs)
+        self._methods = {}
+
+    def _create(self, factory, args, kwargs):
+        try:
+            self._session = factory(*args, **kwargs)
+        except BaseException as e:
+            # 创建失败时保存原始异常，之后的调用都重新抛出它，并释放工作线程
+            self._error = e
+            self._executor.shutdown(wait=False)
+            raise
+        return self._session
+
+    @property
+    def session(self):
+        """同步会话对象（等待创建完成）"""
+        return self._created.result()
+
+    async def ready(self):
+        """等待会话创建完成，返回自身"""
+        await asyncio.wrap_future(self._created)
+        return self
+
+    def __await__(self):
+        return self.ready().__await__()
+
+    async def call(self, name, *args, **kwargs):
+        """在会话工作线程中调用同步方法name"""
+        if self._error is not None:
+            raise self._error
+        def run():
+            # 会话创建失败前已排队的调用
+            if self._error is not None:
+                raise self._error
+            return getattr(self._session, name)(*args, **kwargs)
+        return await asyncio.wrap_future(self._executor.submit(run))
+
+    def __getattr__(self, name):
+        '''
+        将原本函数包装为协程转发回去
+        '''
+        if name.startswith('_'):
+            raise AttributeError(name)
+        method = self._methods.get(name)
+        if method is None:
+            method = functools.partial(self.call, name)
+            self._methods[name] = method
+        return method
+
+    async def close(self):
+        """关闭会话并释放工作线程"""
+        if self._error is not None:
+            return
+        try:
+            await self.call('close')
+        finally:
+            self._executor.shutdown(wait=False)
+
+    async def __aenter__(self):
+        return await self.ready()
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+
+class AsyncFDTD(AsyncSession):
+    '''
+    FDTD会话的asyncio外观
+    lumapi: LumAPI对象
+    其余参数与 LumAPI.FDTD 相同
+
+    示例:
+        async with AsyncFDTD(LumAPI(), 'a.fsp', hide=True) as fdtd:
+            await fdtd.addrect(name='base', x=0, y=0)
+            await fdtd.run()
+    '''
+    def __init__(self, lumapi, filename=None, key = None, hide = False, serverArgs = {}, remoteArgs = {}, **kwargs):
+        super().__init__(lumapi.FDTD, filename, key, hide, serverArgs, remoteArgs, **kwargs)
+
+
+class AsyncMODE(AsyncSession):
+    def __init__(self, lumapi, filename=None, key = None, hide = False, serverArgs = {}, remoteArgs = {}, **kwargs):
+        super().__init__(lumapi.MODE, filename, key, hide, serverArgs, remoteArgs, **kwargs)
+
+
+class AsyncDEVICE(AsyncSession):
+    def __init__(self, lumapi, filename=None, key = None, hide = False, serverArgs = {}, remoteArgs = {}, **kwargs):
+        super().__init__(lumapi.DEVICE, filename, key, hide, serverArgs, remoteArgs, **kwargs)
+
+
+class AsyncINTERCONNECT(AsyncSession):
+    def __init__(self, lumapi, filename=None, key = None, hide = False, serverArgs = {}, remoteArgs = {}, **kwargs):
+        super().__init__(lumapi.INTERCONNECT, filename, key, hide, serverArgs, remoteArgs, **kwargs)
+
+
+_process_pool = None
+
+async def offload(func, *args, process=False, **kwargs):
+    '''
+    在后台执行CPU密集的后处理（例如Kirchhoff），使其与求解器运行重叠
+    func: 要执行的函数
+    process: True时在进程池中执行（func和参数必须可pickle），否则在默认线程池中执行
+    '''
+    global _process_pool
+    loop = asyncio.get_running_loop()
+    call = functools.partial(func, *args, **kwargs)
+    if process:
+        if _process_pool is None:
+            _process_pool = ProcessPoolExecutor()
+        return await loop.run_in_executor(_process_pool, call)
+    return await loop.run_in_executor(None, call)
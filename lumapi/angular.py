@@ -0,0 +1,130 @@
+'''
+角度域远场投影：E(θ, φ) 辐射方向图
+
+对均匀网格上的近场做一次（补零）FFT 得到角谱，再插值到所需的 (θ, φ) 或方向余弦 (u, v) 网格，
+不需要在巨大的远距离球面上逐点调用 Kirchhoff。
+
+远场（Rayleigh-Sommerfeld 远场近似，以坐标原点为参考）:
+    E(R, θ, φ) ≈ -i·k·cosθ/(2π) · exp(ikR)/R · A(k·u, k·v)
+    A(kx, ky) = ∫∫ E_near·exp(-i(kx·x + ky·y)) dx dy,  u = sinθ·cosφ,  v = sinθ·sinφ
+返回的 'E' 为 R·exp(-ikR)·E，即与距离无关的方向图。
+'''
+import numpy as np
+
+def _uniform_step(coords, name):
+    coords = np.asarray(coords, dtype=np.float64)
+    if coords.size < 2:
+        raise ValueError(f'{name} 至少需要两个采样点')
+    step = np.diff(coords)
+    if not np.allclose(step, step[0], rtol=1e-6, atol=0):
+        raise ValueError(f'{name} 不是均匀网格，非均匀近场请使用 Kirchhoff(..., mode=\'nufft\')')
+    return coords, step[0]
+
+def angular_spectrum(lamb, x_near, y_near, E_near, pad=4):
+    '''
+    近场的角谱（补零FFT）
+    pad: 补零倍数（>=1），角度分辨率 Δu = λ/(pad·N·dx)
+    return: (u, v, A)，u、v 为升序的方向余弦一维数组，A[iv, iu] 以近场中心为相位参考
+    '''
+    x_near, dx = _uniform_step(x_near, 'x_near')
+    y_near, dy = _uniform_step(y_near, 'y_near')
+    E_near = np.asarray(E_near, dtype=np.complex128)
+    k = 2 * np.pi / lamb
+    Nx = max(int(np.ceil(pad * len(x_near))), len(x_near))
+    Ny = max(int(np.ceil(pad * len(y_near))), len(y_near))
+    kx = np.fft.fftshift(2*np.pi*np.fft.fftfreq(Nx, dx))
+    ky = np.fft.fftshift(2*np.pi*np.fft.fftfreq(Ny, dy))
+    A = np.fft.fftshift(np.fft.fft2(E_near, s=(Ny, Nx))) * (dx*dy)
+    # FFT 以第一个采样点为相位参考，换算到近场中心，使角谱在方向上变化平缓，便于插值
+    xc, yc = (x_near[0] + x_near[-1])/2, (y_near[0] + y_near[-1])/2
+    A *= np.exp(-1j*ky*(y_near[0] - yc))[:, np.newaxis] * np.exp(-1j*kx*(x_near[0] - xc))[np.newaxis, :]
+    return kx/k, ky/k, A
+
+def _bilinear(u_grid, v_grid, A, u, v):
+    """升序均匀网格上的双线性插值，超出网格的点返回0"""
+    du, dv = u_grid[1] - u_grid[0], v_grid[1] - v_grid[0]
+    fu, fv = (u - u_grid[0]) / du, (v - v_grid[0]) / dv
+    inside = (fu >= 0) & (fu <= len(u_grid) - 1) & (fv >= 0) & (fv <= len(v_grid) - 1)
+    iu = np.clip(np.floor(fu).astype(np.int64), 0, len(u_grid) - 2)
+    iv = np.clip(np.floor(fv).astype(np.int64), 0, len(v_grid) - 2)
+    tu, tv = fu - iu, fv - iv
+    out = ((1 - tv)*((1 - tu)*A[iv, iu] + tu*A[iv, iu + 1])
+           + tv*((1 - tu)*A[iv + 1, iu] + tu*A[iv + 1, iu + 1]))
+    return np.where(inside, out, 0)
+
+def far_field_pattern(lamb, x_near, y_near, E_near, theta=None, phi=None, u=None, v=None, pad=4, beam_angle=None):
+    '''
+    计算辐射方向图、方向性系数与波束效率
+    lamb: 波长
+    x_near, y_near: 近场位置（均匀网格的一维数组）
+    E_near: 近场电场，二维数组 (len(y_near), len(x_near))
+    theta, phi: 所需的角度（弧度），一维数组或数值，按 'ij' 网格组合
+    u, v: 或者直接给方向余弦网格（与 theta/phi 二选一），默认 theta∈[0, π/2]、phi∈[0, 2π)
+    pad: 补零倍数，控制角度分辨率
+    beam_angle: 计算波束效率的锥角（相对主瓣方向的半角，弧度）；None 表示按半功率（-3dB）区域计算
+
+    return: dict
+        'theta', 'phi' 或 'u', 'v': 输出网格
+        'E': 复振幅方向图 R·exp(-ikR)·E
+        'power': 辐射强度 U = |R·E|²
+        'directivity': 方向性系数 D = 4πU/P
+        'total_power': 半空间总辐射功率 P（按 FFT 网格在可见区积分）
+        'max_directivity', 'peak': 最大方向性系数及其方向 (θ, φ)
+        'beam_efficiency': 主瓣功率占总功率的比例
+    '''
+    k = 2 * np.pi / lamb
+    x_near = np.asarray(x_near, dtype=np.float64)
+    y_near = np.asarray(y_near, dtype=np.float64)
+    u_grid, v_grid, A = angular_spectrum(lamb, x_near, y_near, E_near, pad)
+    xc, yc = (x_near[0] + x_near[-1])/2, (y_near[0] + y_near[-1])/2
+
+    # 在FFT网格的可见区上积分总功率：dΩ = du·dv/cosθ，U ∝ cos²θ|A|²
+    U_grid, V_grid = np.meshgrid(u_grid, v_grid)
+    cos2 = 1 - U_grid**2 - V_grid**2
+    visible = cos2 > 0
+    cos_grid = np.sqrt(np.where(visible, cos2, 0))
+    power_grid = (k/(2*np.pi))**2 * cos_grid**2 * np.abs(A)**2
+    dOmega = np.where(visible, (u_grid[1] - u_grid[0])*(v_grid[1] - v_grid[0]) / np.where(visible, cos_grid, 1), 0)
+    P = float(np.sum(power_grid * dOmega))
+
+    # 主瓣方向及波束效率
+    ipk = np.unravel_index(np.argmax(np.where(visible, power_grid, -1)), power_grid.shape)
+    u0, v0 = U_grid[ipk], V_grid[ipk]
+    theta0, phi0 = np.arcsin(min(np.hypot(u0, v0), 1.0)), np.arctan2(v0, u0) % (2*np.pi)
+    if beam_angle is None:
+        beam = visible & (power_grid >= power_grid[ipk] / 2)
+    else:
+        w0 = np.sqrt(max(1 - u0**2 - v0**2, 0))
+        cos_sep = U_grid*u0 + V_grid*v0 + cos_grid*w0
+        beam = visible & (cos_sep >= np.cos(beam_angle))
+    beam_efficiency = float(np.sum((power_grid*dOmega)[beam]) / P) if P > 0 else 0.0
+
+    # 插值到所需网格
+    if u is not None or v is not None:
+        grid = {'u': np.atleast_1d(np.asarray(u, dtype=np.float64)),
+                'v': np.atleast_1d(np.asarray(v, dtype=np.float64))}
+        Uq, Vq = np.meshgrid(grid['u'], grid['v'], indexing='ij')
+    else:
+        theta = np.linspace(0, np.pi/2, 91) if theta is None else theta
+        phi = np.linspace(0, 2*np.pi, 181) if phi is None else phi
+        grid = {'theta': np.atleast_1d(np.asarray(theta, dtype=np.float64)),
+                'phi': np.atleast_1d(np.asarray(phi, dtype=np.float64))}
+        T, F = np.meshgrid(grid['theta'], grid['phi'], indexing='ij')
+        Uq, Vq = np.sin(T)*np.cos(F), np.sin(T)*np.sin(F)
+    cos2q = 1 - Uq**2 - Vq**2
+    cosq = np.sqrt(np.clip(cos2q, 0, None))
+    Aq = _bilinear(u_grid, v_grid, A, Uq, Vq) * np.exp(-1j*k*(Uq*xc + Vq*yc))
+    E = np.where(cos2q >= 0, -1j*k*cosq/(2*np.pi) * Aq, 0)
+    power = np.abs(E)**2
+
+    result = dict(grid)
+    result.update({
+        'E': E,
+        'power': power,
+        'directivity': 4*np.pi*power/P if P > 0 else np.zeros_like(power),
+        'total_power': P,
+        'max_directivity': 4*np.pi*float(power_grid[ipk])/P if P > 0 else 0.0,
+        'peak': (float(theta0), float(phi0)),
+        'beam_efficiency': beam_efficiency,
+    })
+    return result
@@ -0,0 +1,509 @@
+'''
+多机远场分块计算：把远场目标点分成若干块，经 TCP 分发给 lumapi-worker 进程计算后汇总
+
+每个 worker 连接只发送一次近场（setup），之后逐块发送远场坐标（tile），worker 调用
+Kirchhoff / RorySommerfeld_* 计算该块并返回结果。连接断开或超时的分块会重新排队，
+由其他 worker（或重连后的同一 worker）重算。
+
+启动 worker（每台计算节点一个）:
+    python lumapi_worker.py --host 0.0.0.0 --port 5757
+    python -m lumapi.distributed --host 0.0.0.0 --port 5757
+
+协议：每条消息为 4 字节大端长度 + JSON 头 + 若干 .npy 数据块，
+JSON 头的 'arrays' 字段列出各数组的名称和字节数。协议没有加密，只应在可信网络中使用，
+可用 token 参数（或环境变量 LUMAPI_WORKER_TOKEN）做简单的口令校验。
+'''
+import io
+import os
+import sys
+import json
+import time
+import queue
+import socket
+import struct
+import argparse
+import threading
+import itertools
+import socketserver
+import subprocess
+
+import numpy as np
+
+PROTOCOL_VERSION = 1
+DEFAULT_PORT = 5757
+KERNELS = ('Kirchhoff', 'RorySommerfeld_Scalar', 'RorySommerfeld_Vector')
+
+
+class ProtocolError(Exception):
+    pass
+
+# ================= 消息格式 =================
+def _recv_exact(sock, n):
+    buf = bytearray()
+    while len(buf) < n:
+        chunk = sock.recv(min(n - len(buf), 1 << 20))
+        if not chunk:
+            raise ConnectionError('连接已关闭')
+        buf += chunk
+    return bytes(buf)
+
+def send_message(sock, header, arrays=None):
+    '''发送一条消息，return: 发送的字节数'''
+    blobs, meta = [], []
+    for name, array in (arrays or {}).items():
+        buf = io.BytesIO()
+        np.lib.format.write_array(buf, np.ascontiguousarray(array), allow_pickle=False)
+        blobs.append(buf.getvalue())
+        meta.append([name, len(blobs[-1])])
+    head = json.dumps(dict(header, arrays=meta)).encode('utf-8')
+    sock.sendall(struct.pack('!I', len(head)) + head)
+    for blob in blobs:
+        sock.sendall(blob)
+    return 4 + len(head) + sum(len(b) for b in blobs)
+
+def recv_message(sock):
+    '''接收一条消息，return: (header, arrays, 接收的字节数)'''
+    size, = struct.unpack('!I', _recv_exact(sock, 4))
+    try:
+        header = json.loads(_recv_exact(sock, size).decode('utf-8'))
+    except ValueError as e:
+        raise ProtocolError(f'无法解析消息头: {e}') from None
+    arrays, total = {}, 4 + size
+    for name, nbytes in header.pop('arrays', []):
+        arrays[name] = np.lib.format.read_array(io.BytesIO(_recv_exact(sock, nbytes)), allow_pickle=False)
+        total += nbytes
+    return header, arrays, total
+
+# ================= worker 端 =================
+def _compute_tile(setup, near, x_far, y_far, z_far):
+    '''在 worker 上计算一个分块，return: 结果数组字典'''
+    from lumapi import lumapi as core
+    kernel = setup['kernel']
+    params = {'mode': setup.get('mode', 'auto'), 'eps': setup.get('eps', 1e-6),
+              'quadrature': setup.get('quadrature')}
+    if kernel == 'RorySommerfeld_Vector':
+        _, E_far_x, E_far_y, E_far_z = core.RorySommerfeld_Vector(
+            setup['lamb'], near['x_near'], near['y_near'], near['E_near_x'], near['E_near_y'],
+            x_far, y_far, z_far, **params)
+        return {'E_far_x': E_far_x, 'E_far_y': E_far_y, 'E_far_z': E_far_z}
+    func = getattr(core, kernel)
+    return {'E_far': func(setup['lamb'], near['x_near'], near['y_near'], near['E_near'],
+                          x_far, y_far, z_far, **params)}
+
+class _WorkerHandler(socketserver.BaseRequestHandler):
+    '''一个连接对应一个客户端会话：hello -> setup -> tile ... -> 断开'''
+    def handle(self):
+        sock = self.request
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        setup, near = None, None
+        authorized = False
+        while True:
+            try:
+                header, arrays, _ = recv_message(sock)
+            except (ConnectionError, OSError, ProtocolError):
+                return
+            op = header.get('op')
+            try:
+                if op == 'hello':
+                    if header.get('version') != PROTOCOL_VERSION:
+                        raise ProtocolError(f"协议版本不一致: {header.get('version')} != {PROTOCOL_VERSION}")
+                    if self.server.token and header.get('token') != self.server.token:
+                        send_message(sock, {'op': 'error', 'message': '口令错误'})
+                        return
+                    authorized = True
+                    send_message(sock, {'op': 'ok', 'pid': os.getpid(), 'host': socket.gethostname(),
+                                        'cores': os.cpu_count()})
+                elif not authorized:
+                    send_message(sock, {'op': 'error', 'message': '需要先发送 hello'})
+                    return
+                elif op == 'setup':
+                    if header.get('kernel') not in KERNELS:
+                        raise ProtocolError(f"未知的 kernel: {header.get('kernel')}")
+                    setup, near = header, arrays
+                    send_message(sock, {'op': 'ok'})
+                elif op == 'tile':
+                    if setup is None:
+                        raise ProtocolError('尚未发送近场（setup）')
+                    t0 = time.perf_counter()
+                    result = _compute_tile(setup, near, arrays['x_far'], arrays['y_far'], arrays['z_far'])
+                    send_message(sock, {'op': 'result', 'tile': header.get('tile'),
+                                        'elapsed': time.perf_counter() - t0}, result)
+                elif op == 'ping':
+                    send_message(sock, {'op': 'ok'})
+                elif op == 'shutdown':
+                    send_message(sock, {'op': 'ok'})
+                    threading.Thread(target=self.server.shutdown, daemon=True).start()
+                    return
+                else:
+                    raise ProtocolError(f'未知的操作: {op}')
+            except (ConnectionError, OSError):
+                return
+            except Exception as e:
+                # 计算出错时告知客户端，由客户端决定是否换一个 worker 重试
+                try:
+                    send_message(sock, {'op': 'error', 'tile': header.get('tile'),
+                                        'message': f'{type(e).__name__}: {e}'})
+                except OSError:
+                    return
+
+class WorkerServer(socketserver.ThreadingTCPServer):
+    '''
+    lumapi-worker 服务端，每个连接一个线程
+    host, port: 监听地址，port=0 时自动选择空闲端口（见 server_address）
+    token: 口令，None 时不校验
+    '''
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, host='127.0.0.1', port=DEFAULT_PORT, token=None):
+        self.token = token
+        super().__init__((host, port), _WorkerHandler)
+
+def serve(host='127.0.0.1', port=DEFAULT_PORT, token=None, announce=False):
+    '''启动 worker 并一直运行，直到收到 shutdown 或 Ctrl+C'''
+    server = WorkerServer(host, port, token)
+    with server:
+        host, port = server.server_address[:2]
+        if announce:
+            # 供 LocalCluster 读取实际端口
+            print(f'LUMAPI-WORKER {port}', flush=True)
+        print(f'lumapi-worker 已启动: {host}:{port} (pid {os.getpid()})', flush=True)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+
+# ================= 客户端 =================
+def _parse_address(address):
+    if isinstance(address, str):
+        host, _, port = address.rpartition(':')
+        return (host or '127.0.0.1', int(port))
+    host, port = address
+    return (host, int(port))
+
+def _split_axis(n, parts):
+    bounds = np.linspace(0, n, parts + 1).round().astype(int)
+    return [slice(a, b) for a, b in zip(bounds[:-1], bounds[1:]) if b > a]
+
+def make_tiles(shape, tile_points):
+    '''
+    把 (len(x_far), len(y_far), len(z_far)) 的远场网格分成约 tile_points 个点的块
+    return: [(sx, sy, sz), ...] 三个维度的切片
+    '''
+    parts = [1, 1, 1]
+    # 每次把当前块最长的维度再分一半，直到每块的点数不超过 tile_points
+    while np.prod([-(-n // p) for n, p in zip(shape, parts)]) > max(int(tile_points), 1):
+        sizes = [-(-n // p) for n, p in zip(shape, parts)]
+        axis = int(np.argmax(sizes))
+        if sizes[axis] <= 1:
+            break
+        parts[axis] = min(parts[axis] * 2, shape[axis])
+    return list(itertools.product(*(_split_axis(n, p) for n, p in zip(shape, parts))))
+
+class DistributedPropagator:
+    '''
+    把 Kirchhoff / RorySommerfeld_* 的远场目标点分块分发给多个 lumapi-worker
+
+    workers: worker 地址列表，(host, port) 或 'host:port'
+    tile_points: 每个分块的远场点数上限（实际还会保证每个 worker 至少分到约4块，以平衡负载）
+    retries: 每个分块最多重试的次数（连接断开、超时或 worker 端出错都算一次）；
+             也是每个 worker 断线后的最大重连次数
+    timeout: 单个分块的超时时间（秒），超时视为该分块丢失
+    connect_timeout: 建立连接的超时时间（秒）
+    token: worker 口令，默认读取环境变量 LUMAPI_WORKER_TOKEN
+
+    调用后 self.stats 为各 worker 的统计（分块数、点数、失败次数、收发字节数、吞吐量），
+    self.last_run 为最近一次调用的汇总。
+    '''
+    def __init__(self, workers, tile_points=65536, retries=3, timeout=600.0, connect_timeout=10.0, token=None):
+        self.workers = [_parse_address(w) for w in workers]
+        if not self.workers:
+            raise ValueError('至少需要一个 worker 地址')
+        self.tile_points = tile_points
+        self.retries = retries
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.token = token if token is not None else os.environ.get('LUMAPI_WORKER_TOKEN')
+        self.stats = {}
+        self.last_run = None
+
+    # ================= 对外接口（与 lumapi 中的同名函数参数一致） =================
+    def Kirchhoff(self, lamb, x_near, y_near, E_near, x_far, y_far, z_far, mode='auto', eps=1e-6, quadrature=None):
+        return self.run('Kirchhoff', lamb, x_near, y_near, {'E_near': E_near}, x_far, y_far, z_far,
+                        mode=mode, eps=eps, quadrature=quadrature)['E_far']
+
+    def RorySommerfeld_Scalar(self, lamb, x_near, y_near, E_near, x_far, y_far, z_far, mode='auto', eps=1e-6,
+                              quadrature=None):
+        return self.run('RorySommerfeld_Scalar', lamb, x_near, y_near, {'E_near': E_near}, x_far, y_far, z_far,
+                        mode=mode, eps=eps, quadrature=quadrature)['E_far']
+
+    def RorySommerfeld_Vector(self, lamb, x_near, y_near, E_near_x, E_near_y, x_far, y_far, z_far, mode='auto',
+                              eps=1e-6, quadrature=None):
+        out = self.run('RorySommerfeld_Vector', lamb, x_near, y_near, {'E_near_x': E_near_x, 'E_near_y': E_near_y},
+                       x_far, y_far, z_far, mode=mode, eps=eps, quadrature=quadrature)
+        E_far = np.sqrt(np.abs(out['E_far_x'])**2 + np.abs(out['E_far_y'])**2 + np.abs(out['E_far_z'])**2)
+        return E_far, out['E_far_x'], out['E_far_y'], out['E_far_z']
+
+    # ================= 调度 =================
+    def run(self, kernel, lamb, x_near, y_near, near_fields, x_far, y_far, z_far, mode='auto', eps=1e-6,
+            quadrature=None):
+        '''
+        分块计算
+        near_fields: 近场字典，标量核为 {'E_near': ...}，矢量核为 {'E_near_x': ..., 'E_near_y': ...}
+        mode: 各 worker 上使用的计算模式（默认 'auto'，由 worker 按本机资源和分块大小选择）
+        return: 结果字典，标量核为 {'E_far'}，矢量核为 {'E_far_x', 'E_far_y', 'E_far_z'}
+        '''
+        if kernel not in KERNELS:
+            raise ValueError(f'Invalid kernel(可选 {KERNELS})')
+        x_far, y_far, z_far = (np.atleast_1d(np.asarray(a, dtype=np.float64)) for a in (x_far, y_far, z_far))
+        shape = (len(x_far), len(y_far), len(z_far))
+        names = ['E_far_x', 'E_far_y', 'E_far_z'] if kernel == 'RorySommerfeld_Vector' else ['E_far']
+        outputs = {name: np.zeros(shape, dtype=np.complex128) for name in names}
+
+        setup = {'op': 'setup', 'kernel': kernel, 'lamb': float(lamb), 'mode': mode, 'eps': eps,
+                 'quadrature': quadrature}
+        near = {'x_near': np.asarray(x_near, dtype=np.float64), 'y_near': np.asarray(y_near, dtype=np.float64)}
+        near.update({name: np.asarray(E, dtype=np.complex128) for name, E in near_fields.items()})
+
+        total = int(np.prod(shape))
+        tile_points = min(self.tile_points, max(1, -(-total // (4*len(self.workers)))))
+        tiles = queue.Queue()
+        for i, (sx, sy, sz) in enumerate(make_tiles(shape, tile_points)):
+            tiles.put({'id': i, 'slices': (sx, sy, sz), 'attempts': 0})
+        state = {'remaining': tiles.qsize(), 'error': None, 'retried': 0, 'lock': threading.Lock()}
+        n_tiles = state['remaining']
+
+        self.stats = {f'{h}:{p}': {'address': (h, p), 'tiles': 0, 'points': 0, 'pairs': 0, 'failures': 0,
+                                   'reconnects': 0, 'busy': 0.0, 'compute': 0.0, 'bytes_sent': 0,
+                                   'bytes_received': 0, 'alive': False, 'last_error': None}
+                      for h, p in self.workers}
+        near_points = near['x_near'].size * near['y_near'].size
+        t0 = time.perf_counter()
+        threads = [threading.Thread(target=self._worker_loop, daemon=True,
+                                    args=(address, setup, near, (x_far, y_far, z_far), tiles, outputs,
+                                          state, near_points))
+                   for address in self.workers]
+        for thread in threads:
+            thread.start()
+        while True:
+            with state['lock']:
+                if state['remaining'] == 0 or state['error']:
+                    break
+            if not any(thread.is_alive() for thread in threads):
+                break
+            time.sleep(0.02)
+        with state['lock']:
+            remaining, error = state['remaining'], state['error']
+            state['remaining'] = 0  # 通知仍在运行的线程退出
+        for thread in threads:
+            thread.join(timeout=1.0)
+        elapsed = time.perf_counter() - t0
+
+        for s in self.stats.values():
+            s['throughput'] = s['points'] / s['busy'] if s['busy'] > 0 else 0.0
+            s['pairs_per_s'] = s['pairs'] / s['busy'] if s['busy'] > 0 else 0.0
+        self.last_run = {'kernel': kernel, 'tiles': n_tiles, 'retried': state['retried'], 'far_points': total,
+                         'near_points': near_points, 'elapsed': elapsed,
+                         'throughput': total / elapsed if elapsed > 0 else 0.0}
+        if error:
+            raise RuntimeError(f'分布式计算失败: {error}')
+        if remaining:
+            raise RuntimeError(f'所有 worker 均不可用，剩余 {remaining}/{n_tiles} 个分块未完成')
+        return outputs
+
+    def _connect(self, address, setup, near, stats):
+        sock = socket.create_connection(address, timeout=self.connect_timeout)
+        try:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            sock.settimeout(self.timeout)
+            for header, arrays in (({'op': 'hello', 'version': PROTOCOL_VERSION, 'token': self.token}, None),
+                                   (setup, near)):
+                stats['bytes_sent'] += send_message(sock, header, arrays)
+                reply, _, nbytes = recv_message(sock)
+                stats['bytes_received'] += nbytes
+                if reply.get('op') != 'ok':
+                    raise ProtocolError(reply.get('message', f'意外的回复: {reply}'))
+        except BaseException:
+            sock.close()
+            raise
+        return sock
+
+    def _requeue(self, tile, tiles, state, reason):
+        tile['attempts'] += 1
+        with state['lock']:
+            state['retried'] += 1
+            if tile['attempts'] > self.retries:
+                state['error'] = state['error'] or f"分块 {tile['id']} 重试 {self.retries} 次后仍失败: {reason}"
+                return
+        tiles.put(tile)
+
+    def _worker_loop(self, address, setup, near, far, tiles, outputs, state, near_points):
+        '''单个 worker 的发送/接收循环（每个 worker 一个线程）'''
+        stats = self.stats[f'{address[0]}:{address[1]}']
+        x_far, y_far, z_far = far
+        connect_failures = 0
+        while True:
+            with state['lock']:
+                if state['remaining'] == 0 or state['error']:
+                    return
+            try:
+                sock = self._connect(address, setup, near, stats)
+            except (OSError, ProtocolError) as e:
+                stats['last_error'] = f'{type(e).__name__}: {e}'
+                connect_failures += 1
+                if connect_failures > self.retries:
+                    return
+                time.sleep(min(0.2 * 2**connect_failures, 5.0))
+                continue
+            stats['alive'] = True
+            if connect_failures or stats['tiles'] or stats['failures']:
+                stats['reconnects'] += 1
+            connect_failures = 0
+            try:
+                while True:
+                    try:
+                        tile = tiles.get(timeout=0.05)
+                    except queue.Empty:
+                        with state['lock']:
+                            if state['remaining'] == 0 or state['error']:
+                                return
+                        continue
+                    sx, sy, sz = tile['slices']
+                    t0 = time.perf_counter()
+                    try:
+                        stats['bytes_sent'] += send_message(
+                            sock, {'op': 'tile', 'tile': tile['id']},
+                            {'x_far': x_far[sx], 'y_far': y_far[sy], 'z_far': z_far[sz]})
+                        reply, result, nbytes = recv_message(sock)
+                        stats['bytes_received'] += nbytes
+                    except (OSError, ProtocolError) as e:
+                        # 连接断开或超时：分块重新排队，重新连接该 worker
+                        stats['failures'] += 1
+                        stats['last_error'] = f'{type(e).__name__}: {e}'
+                        self._requeue(tile, tiles, state, stats['last_error'])
+                        break
+                    if reply.get('op') != 'result' or reply.get('tile') != tile['id']:
+                        stats['failures'] += 1
+                        stats['last_error'] = reply.get('message', f'意外的回复: {reply.get("op")}')
+                        self._requeue(tile, tiles, state, stats['last_error'])
+                        continue
+                    for name, out in outputs.items():
+                        out[sx, sy, sz] = result[name]
+                    points = len(x_far[sx]) * len(y_far[sy]) * len(z_far[sz])
+                    stats['tiles'] += 1
+                    stats['points'] += points
+                    stats['pairs'] += points * near_points
+                    stats['busy'] += time.perf_counter() - t0
+                    stats['compute'] += float(reply.get('elapsed', 0.0))
+                    with state['lock']:
+                        state['remaining'] -= 1
+            finally:
+                stats['alive'] = False
+                sock.close()
+
+    def shutdown_workers(self):
+        '''通知所有 worker 退出'''
+        for address in self.workers:
+            try:
+                with socket.create_connection(address, timeout=self.connect_timeout) as sock:
+                    send_message(sock, {'op': 'hello', 'version': PROTOCOL_VERSION, 'token': self.token})
+                    recv_message(sock)
+                    send_message(sock, {'op': 'shutdown'})
+                    recv_message(sock)
+            except (OSError, ProtocolError):
+                pass
+
+    def print_stats(self):
+        print(f"{'worker':<24}{'分块':>6}{'失败':>6}{'重连':>6}{'点数':>10}{'点/s':>12}{'发送MB':>10}{'接收MB':>10}")
+        for name, s in self.stats.items():
+            print(f"{name:<24}{s['tiles']:>6}{s['failures']:>6}{s['reconnects']:>6}{s['points']:>10}"
+                  f"{s.get('throughput', 0.0):>12.3g}{s['bytes_sent']/2**20:>10.2f}{s['bytes_received']/2**20:>10.2f}")
+
+# ================= 本机 worker（测试用） =================
+class LocalCluster:
+    '''
+    在本机启动若干 worker 子进程，用于测试或单机多进程计算
+    n: worker 数量
+    threads: 每个 worker 的 numba 线程数（NUMBA_NUM_THREADS），None 则不限制
+    with LocalCluster(4) as cluster:
+        E_far = DistributedPropagator(cluster.addresses).Kirchhoff(...)
+    '''
+    def __init__(self, n=2, host='127.0.0.1', threads=None, token=None, startup_timeout=60.0):
+        self.host = host
+        self.processes = []
+        self.addresses = []
+        env = dict(os.environ)
+        package_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        env['PYTHONPATH'] = package_root + os.pathsep + env.get('PYTHONPATH', '')
+        env['PYTHONUNBUFFERED'] = '1'
+        if threads:
+            env['NUMBA_NUM_THREADS'] = str(threads)
+        if token:
+            env['LUMAPI_WORKER_TOKEN'] = token
+        try:
+            for _ in range(n):
+                process = subprocess.Popen([sys.executable, '-m', 'lumapi.distributed', '--host', host,
+                                            '--port', '0', '--announce'],
+                                           stdout=subprocess.PIPE, stderr=subprocess.STDOUT, env=env,
+                                           text=True, encoding='utf-8', errors='replace')
+                self.processes.append(process)
+                self.addresses.append((host, self._read_port(process, startup_timeout)))
+                # 持续读取输出，避免管道写满阻塞 worker
+                threading.Thread(target=self._drain, args=(process,), daemon=True).start()
+        except BaseException:
+            self.close()
+            raise
+
+    @staticmethod
+    def _read_port(process, timeout):
+        result = {}
+        def read():
+            for line in process.stdout:
+                if line.startswith('LUMAPI-WORKER '):
+                    result['port'] = int(line.split()[1])
+                    return
+        reader = threading.Thread(target=read, daemon=True)
+        reader.start()
+        reader.join(timeout)
+        if 'port' not in result:
+            process.kill()
+            raise RuntimeError('worker 启动失败或超时')
+        return result['port']
+
+    @staticmethod
+    def _drain(process):
+        for _ in process.stdout:
+            pass
+
+    def kill(self, index):
+        '''强制结束第 index 个 worker（用于测试分块重试）'''
+        self.processes[index].kill()
+        self.processes[index].wait()
+
+    def close(self):
+        for process in self.processes:
+            if process.poll() is None:
+                process.terminate()
+                try:
+                    process.wait(timeout=5)
+                except subprocess.TimeoutExpired:
+                    process.kill()
+                    process.wait()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='lumapi-worker: 远场分块计算节点')
+    parser.add_argument('--host', default='127.0.0.1', help='监听地址（多机时用 0.0.0.0）')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help='监听端口，0 为自动选择')
+    parser.add_argument('--token', default=os.environ.get('LUMAPI_WORKER_TOKEN'), help='口令')
+    parser.add_argument('--announce', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    serve(args.host, args.port, args.token, args.announce)
+
+if __name__ == '__main__':
+    main()
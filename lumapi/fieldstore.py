@@ -0,0 +1,466 @@
+'''
+分块压缩的场数据文件（.lfs）：按需读取切片，传播函数可直接流式读取近场、分块写出远场
+
+复数场按固定大小的块存储，每块单独压缩（zlib/lzma，可选 zstandard），同时保存坐标和波长等元数据。
+store[f, :, :, z] 这样的切片只读取并解压涉及的块，不需要把整个文件载入内存。
+
+文件结构：8 字节文件头 | 压缩块与坐标数组 ... | JSON 索引 | 8 字节索引长度 | 8 字节文件尾
+修改数据时新块追加到文件末尾，flush()/close() 时在末尾写入新的索引（旧块占用的空间由 compact() 回收）。
+
+store = FieldStore.create('near.lfs', shape=(ny, nx), dims=('y', 'x'), dtype='complex64',
+                          coords={'x': x_near, 'y': y_near}, attrs={'lambda': 1.55e-6})
+store[:, :] = E_near
+store.close()
+
+near = FieldStore.open('near.lfs')
+E_far = Kirchhoff(lamb, near.coords['x'], near.coords['y'], near.field(), x_far, y_far, z_far)   # 按块流式计算
+'''
+import io
+import os
+import json
+import zlib
+import lzma
+import struct
+import itertools
+import threading
+import collections
+
+import numpy as np
+
+MAGIC = b'LUMFS\x00\x01\x00'
+FORMAT_VERSION = 1
+CODECS = ('zlib', 'lzma', 'zstd', 'none')
+DEFAULT_CHUNK_BYTES = 1 << 20
+
+def _compressor(codec, level):
+    if codec == 'zlib':
+        return (lambda b: zlib.compress(b, level)), zlib.decompress
+    if codec == 'lzma':
+        return (lambda b: lzma.compress(b, preset=level)), lzma.decompress
+    if codec == 'zstd':
+        try:
+            import zstandard
+        except ImportError:
+            raise ImportError("codec='zstd' 需要 zstandard 库（pip install zstandard）") from None
+        return zstandard.ZstdCompressor(level=level).compress, zstandard.ZstdDecompressor().decompress
+    if codec == 'none':
+        return bytes, bytes
+    raise ValueError(f'Invalid codec(可选 {CODECS})')
+
+def auto_chunks(shape, dtype, chunk_bytes=DEFAULT_CHUNK_BYTES):
+    '''默认分块：最长的两个维度整块保留、其余维度取 1，再对半分直到单块不超过 chunk_bytes'''
+    shape = tuple(int(n) for n in shape)
+    keep = sorted(range(len(shape)), key=lambda d: -shape[d])[:2]
+    chunks = [shape[d] if d in keep else 1 for d in range(len(shape))]
+    itemsize = np.dtype(dtype).itemsize
+    while int(np.prod(chunks)) * itemsize > chunk_bytes and max(chunks) > 1:
+        d = int(np.argmax(chunks))
+        chunks[d] = (chunks[d] + 1) // 2
+    return tuple(max(c, 1) for c in chunks)
+
+def _normalize_key(key, shape):
+    '''切片 -> (各维度的整数下标数组, 各维度是否被整数下标去掉)'''
+    if not isinstance(key, tuple):
+        key = (key,)
+    if any(k is Ellipsis for k in key):
+        i = next(i for i, k in enumerate(key) if k is Ellipsis)
+        key = key[:i] + (slice(None),) * (len(shape) - len(key) + 1) + key[i + 1:]
+    if len(key) > len(shape):
+        raise IndexError(f'下标维数 {len(key)} 超过数据维数 {len(shape)}')
+    key = key + (slice(None),) * (len(shape) - len(key))
+    indices, dropped = [], []
+    for k, n in zip(key, shape):
+        if isinstance(k, slice):
+            indices.append(np.arange(*k.indices(n)))
+            dropped.append(False)
+        elif isinstance(k, (int, np.integer)):
+            if not -n <= k < n:
+                raise IndexError(f'下标 {k} 超出范围 [0, {n})')
+            indices.append(np.array([k % n]))
+            dropped.append(True)
+        else:
+            k = np.asarray(k)
+            if k.dtype == bool:
+                k = np.flatnonzero(k)
+            if np.any((k < -n) | (k >= n)):
+                raise IndexError(f'下标超出范围 [0, {n})')
+            indices.append(np.asarray(k, dtype=np.int64).ravel() % n)
+            dropped.append(False)
+    return indices, dropped
+
+def _as_slice(index):
+    '''连续的下标用切片，避免花式索引的复制'''
+    if index.size and index[-1] - index[0] == index.size - 1 and np.all(np.diff(index) == 1):
+        return slice(int(index[0]), int(index[-1]) + 1)
+    return index
+
+class FieldStore:
+    '''
+    分块压缩的 N 维场数据
+    用 FieldStore.create / FieldStore.open / FieldStore.from_arrays / FieldStore.from_monitor 创建，不直接构造
+
+    store.shape, store.dtype, store.dims, store.chunks
+    store.coords: {名称: 一维坐标}（如 'x', 'y', 'z', 'lambda'）
+    store.attrs: 其他元数据（可 JSON 序列化）
+    store[...]: 按需读取切片（只解压涉及的块）；可写模式下 store[...] = value 写入
+               下标数组按维度独立作用（正交索引，同 np.ix_），与 NumPy 多个数组下标的广播规则不同
+    store.stats: 读取的块数、压缩字节数、缓存命中数
+    '''
+    def __init__(self, path, mode, index, cache_bytes):
+        self.path = path
+        self.mode = mode
+        self._index = index
+        self.shape = tuple(index['shape'])
+        self.dtype = np.dtype(index['dtype'])
+        self.dims = tuple(index['dims'])
+        self.chunks = tuple(index['chunks'])
+        self.attrs = index['attrs']
+        self._compress, self._decompress = _compressor(index['codec'], index['level'])
+        self._chunk_index = {tuple(int(i) for i in key.split(',')): tuple(v)
+                             for key, v in index['chunk_index'].items()}
+        self._file = open(path, 'r+b' if mode != 'r' else 'rb')
+        self._lock = threading.Lock()
+        self._cache = collections.OrderedDict()
+        self._cache_bytes = cache_bytes
+        self._cached = 0
+        self._dirty = False
+        self.stats = {'chunks_read': 0, 'bytes_read': 0, 'cache_hits': 0, 'chunks_written': 0}
+        self.coords = {name: self._read_blob(*entry) for name, entry in index['coords'].items()}
+
+    # ================= 创建与打开 =================
+    @classmethod
+    def create(cls, path, shape, dims=None, dtype='complex128', chunks=None, coords=None, attrs=None,
+               codec='zlib', level=1, shuffle=True, cache_bytes=64 << 20, overwrite=False):
+        '''
+        新建文件（全部元素初始为 0，未写入的块不占空间）
+        shape: 数据形状；dims: 维度名称（默认 dim0, dim1, ...）
+        dtype: 数据类型，近场/远场常用 complex64（体积减半）或 complex128
+        chunks: 块形状，默认见 auto_chunks（约 1 MB 一块）
+        coords: {名称: 一维坐标}；attrs: 其他元数据
+        codec, level: 压缩算法与等级；shuffle: 压缩前按字节重排（对浮点数据压缩率更高）
+        '''
+        if os.path.exists(path) and not overwrite:
+            raise FileExistsError(f'文件已存在: {path}（覆盖请使用 overwrite=True）')
+        shape = tuple(int(n) for n in np.atleast_1d(shape))
+        dims = tuple(dims) if dims is not None else tuple(f'dim{i}' for i in range(len(shape)))
+        if len(dims) != len(shape):
+            raise ValueError(f'dims {dims} 与 shape {shape} 的维数不一致')
+        chunks = tuple(int(c) for c in chunks) if chunks is not None else auto_chunks(shape, dtype)
+        if len(chunks) != len(shape) or min(chunks) < 1:
+            raise ValueError(f'chunks {chunks} 与 shape {shape} 不匹配')
+        _compressor(codec, level)
+        index = {'version': FORMAT_VERSION, 'shape': list(shape), 'dtype': np.dtype(dtype).str, 'dims': list(dims),
+                 'chunks': list(chunks), 'codec': codec, 'level': level, 'shuffle': bool(shuffle),
+                 'attrs': dict(attrs or {}), 'coords': {}, 'chunk_index': {}}
+        with open(path, 'wb') as f:
+            f.write(MAGIC)
+        store = cls(path, 'w', index, cache_bytes)
+        for name, values in (coords or {}).items():
+            store.set_coord(name, values)
+        store.flush()
+        return store
+
+    @classmethod
+    def open(cls, path, mode='r', cache_bytes=64 << 20):
+        '''打开已有文件，mode: 'r' 只读，'a' 可修改'''
+        if mode not in ('r', 'a'):
+            raise ValueError("mode 应为 'r' 或 'a'")
+        with open(path, 'rb') as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f'{path} 不是场数据文件')
+            f.seek(-16, os.SEEK_END)
+            length, = struct.unpack('<Q', f.read(8))
+            if f.read(8) != MAGIC:
+                raise ValueError(f'{path} 缺少索引（文件未正常关闭）')
+            f.seek(-16 - length, os.SEEK_END)
+            index = json.loads(f.read(length).decode('utf-8'))
+        if index.get('version', 0) > FORMAT_VERSION:
+            raise ValueError(f'文件格式版本 {index["version"]} 高于当前支持的 {FORMAT_VERSION}')
+        return cls(path, mode, index, cache_bytes)
+
+    @classmethod
+    def from_arrays(cls, path, data, dims=None, coords=None, attrs=None, dtype=None, **kwargs):
+        '''把内存中的数组写成场数据文件，return: 只读打开的 FieldStore'''
+        data = np.asarray(data)
+        store = cls.create(path, data.shape, dims, dtype or data.dtype, coords=coords, attrs=attrs, **kwargs)
+        store[...] = data
+        store.close()
+        return cls.open(path)
+
+    @classmethod
+    def from_monitor(cls, session, monitor, path, result='E', dtype='complex64', **kwargs):
+        '''
+        从 FDTD 会话中提取监视器结果（getresult）保存为场数据文件
+        result: 'E' / 'H' 等矢量场数据集，维度为 (x, y, z, lambda, component)
+        return: 只读打开的 FieldStore，coords 包含 x, y, z, lambda, f
+        '''
+        dataset = session.getresult(monitor, result)
+        data = np.asarray(dataset[result])
+        coords = {}
+        for name in ('x', 'y', 'z', 'lambda', 'f'):
+            if name in dataset:
+                coords[name] = np.asarray(dataset[name], dtype=np.float64).ravel()
+        dims = ('x', 'y', 'z', 'lambda', 'component')[:data.ndim]
+        attrs = {'monitor': monitor, 'result': result}
+        return cls.from_arrays(path, data, dims=dims, coords=coords, attrs=attrs, dtype=dtype, **kwargs)
+
+    def close(self):
+        if self._file is None:
+            return
+        if self.mode != 'r':
+            self.flush()
+        self._file.close()
+        self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
+
+    def __repr__(self):
+        return (f'FieldStore({self.path!r}, shape={self.shape}, dims={self.dims}, dtype={self.dtype}, '
+                f'chunks={self.chunks}, codec={self._index["codec"]!r})')
+
+    # ================= 底层读写 =================
+    def _append(self, blob):
+        with self._lock:
+            self._file.seek(0, os.SEEK_END)
+            offset = self._file.tell()
+            self._file.write(blob)
+        self._dirty = True
+        return offset
+
+    def _read(self, offset, nbytes):
+        with self._lock:
+            self._file.seek(offset)
+            return self._file.read(nbytes)
+
+    def _read_blob(self, offset, nbytes):
+        return np.lib.format.read_array(io.BytesIO(self._read(offset, nbytes)), allow_pickle=False)
+
+    def set_coord(self, name, values):
+        '''设置坐标（可写模式）'''
+        self._check_writable()
+        values = np.asarray(values)
+        buf = io.BytesIO()
+        np.lib.format.write_array(buf, values, allow_pickle=False)
+        blob = buf.getvalue()
+        self._index['coords'][name] = [self._append(blob), len(blob)]
+        self.coords[name] = values
+
+    def flush(self):
+        '''在文件末尾写入当前索引，之前写入的数据从此可被重新打开读取'''
+        self._check_writable()
+        self._index['chunk_index'] = {','.join(map(str, key)): list(v) for key, v in self._chunk_index.items()}
+        self._index['attrs'] = self.attrs
+        head = json.dumps(self._index).encode('utf-8')
+        self._append(head + struct.pack('<Q', len(head)) + MAGIC)
+        self._file.flush()
+        self._dirty = False
+
+    def _check_writable(self):
+        if self.mode == 'r':
+            raise PermissionError('文件以只读方式打开（修改请使用 FieldStore.open(path, mode="a")）')
+
+    def _chunk_shape(self, cid):
+        return tuple(min(c, n - i*c) for i, c, n in zip(cid, self.chunks, self.shape))
+
+    def _encode(self, array):
+        raw = np.ascontiguousarray(array, dtype=self.dtype).tobytes()
+        if self._index['shuffle'] and self.dtype.itemsize > 1:
+            raw = np.frombuffer(raw, np.uint8).reshape(-1, self.dtype.itemsize).T.tobytes()
+        return self._compress(raw)
+
+    def _decode(self, blob, shape):
+        raw = self._decompress(blob)
+        if self._index['shuffle'] and self.dtype.itemsize > 1:
+            raw = np.frombuffer(raw, np.uint8).reshape(self.dtype.itemsize, -1).T.tobytes()
+        return np.frombuffer(raw, self.dtype).reshape(shape)
+
+    def read_chunk(self, cid):
+        '''读取一个块（未写入的块为 0），return: 只读数组'''
+        cid = tuple(cid)
+        if cid in self._cache:
+            self._cache.move_to_end(cid)
+            self.stats['cache_hits'] += 1
+            return self._cache[cid]
+        shape = self._chunk_shape(cid)
+        entry = self._chunk_index.get(cid)
+        if entry is None:
+            array = np.zeros(shape, self.dtype)
+        else:
+            array = self._decode(self._read(*entry), shape)
+            self.stats['chunks_read'] += 1
+            self.stats['bytes_read'] += entry[1]
+        array.flags.writeable = False
+        if array.nbytes <= self._cache_bytes:
+            self._cache[cid] = array
+            self._cached += array.nbytes
+            while self._cached > self._cache_bytes:
+                _, old = self._cache.popitem(last=False)
+                self._cached -= old.nbytes
+        return array
+
+    def write_chunk(self, cid, array):
+        '''写入一个完整的块'''
+        self._check_writable()
+        cid = tuple(cid)
+        array = np.asarray(array, dtype=self.dtype)
+        if array.shape != self._chunk_shape(cid):
+            raise ValueError(f'块 {cid} 的形状应为 {self._chunk_shape(cid)}，得到 {array.shape}')
+        blob = self._encode(array)
+        self._chunk_index[cid] = (self._append(blob), len(blob))
+        self.stats['chunks_written'] += 1
+        if cid in self._cache:
+            self._cached -= self._cache.pop(cid).nbytes
+
+    # ================= 切片 =================
+    def _touched(self, indices):
+        '''每个维度涉及的块号，及块内下标与输出位置'''
+        per_dim = []
+        for index, c in zip(indices, self.chunks):
+            ids = index // c
+            groups = []
+            for cid in np.unique(ids):
+                where = np.flatnonzero(ids == cid)
+                groups.append((int(cid), _as_slice(where), _as_slice(index[where] - cid*c)))
+            per_dim.append(groups)
+        return per_dim
+
+    def __getitem__(self, key):
+        indices, dropped = _normalize_key(key, self.shape)
+        out = np.zeros(tuple(len(i) for i in indices), self.dtype)
+        for combo in itertools.product(*self._touched(indices)):
+            chunk = self.read_chunk(tuple(g[0] for g in combo))
+            _assign(out, [g[1] for g in combo], chunk, [g[2] for g in combo])
+        return out.reshape(tuple(n for n, d in zip(out.shape, dropped) if not d))
+
+    def __setitem__(self, key, value):
+        self._check_writable()
+        indices, dropped = _normalize_key(key, self.shape)
+        sel_shape = tuple(len(i) for i in indices)
+        value = np.asarray(value, dtype=self.dtype)
+        kept = tuple(n for n, d in zip(sel_shape, dropped) if not d)
+        value = np.broadcast_to(value, kept).reshape(sel_shape)
+        for combo in itertools.product(*self._touched(indices)):
+            cid = tuple(g[0] for g in combo)
+            shape = self._chunk_shape(cid)
+            local = [g[2] for g in combo]
+            full = all(isinstance(s, slice) and s.stop - s.start == n for s, n in zip(local, shape))
+            chunk = np.zeros(shape, self.dtype) if full else np.array(self.read_chunk(cid))
+            _assign(chunk, local, value, [g[1] for g in combo])
+            self.write_chunk(cid, chunk)
+
+    def __array__(self, dtype=None, copy=None):
+        data = self[...]
+        return data.astype(dtype) if dtype is not None else data
+
+    @property
+    def ndim(self):
+        return len(self.shape)
+
+    @property
+    def nbytes(self):
+        return int(np.prod(self.shape)) * self.dtype.itemsize
+
+    def stored_bytes(self):
+        '''当前有效块压缩后的总字节数'''
+        return sum(n for _, n in self._chunk_index.values())
+
+    def compact(self, path=None):
+        '''把有效的块和坐标复制到新文件（回收修改产生的废弃空间），默认原地替换'''
+        target = path or f'{self.path}.compact{os.getpid()}'
+        index = dict(self._index, chunk_index={}, coords={})
+        with open(target, 'wb') as f:
+            f.write(MAGIC)
+            for name, (offset, nbytes) in self._index['coords'].items():
+                index['coords'][name] = [f.tell(), nbytes]
+                f.write(self._read(offset, nbytes))
+            for cid, (offset, nbytes) in sorted(self._chunk_index.items()):
+                index['chunk_index'][','.join(map(str, cid))] = [f.tell(), nbytes]
+                f.write(self._read(offset, nbytes))
+            index['attrs'] = self.attrs
+            head = json.dumps(index).encode('utf-8')
+            f.write(head + struct.pack('<Q', len(head)) + MAGIC)
+        if path is None:
+            mode = self.mode
+            self._file.close()
+            self._file = None
+            os.replace(target, self.path)
+            self.__init__(self.path, mode, FieldStore.open(self.path)._index, self._cache_bytes)
+            return self
+        return FieldStore.open(target)
+
+    # ================= 传播函数接口 =================
+    def field(self, rows='y', cols='x', **fixed):
+        '''
+        二维视图 [rows, cols]，作为 Kirchhoff 等函数的近场输入时按块流式读取
+        fixed: 其余维度的下标，如 field(lambda=0, component=0, z=0)；长度为 1 的维度可省略
+        '''
+        return FieldView(self, rows, cols, fixed)
+
+def _assign(dst, dst_index, src, src_index):
+    '''dst[dst_index] = src[src_index]，各维度的下标为切片或整数数组'''
+    if all(isinstance(i, slice) for i in dst_index + src_index):
+        dst[tuple(dst_index)] = src[tuple(src_index)]
+        return
+    dst_index = [np.arange(dst.shape[d])[i] if isinstance(i, slice) else i for d, i in enumerate(dst_index)]
+    src_index = [np.arange(src.shape[d])[i] if isinstance(i, slice) else i for d, i in enumerate(src_index)]
+    dst[np.ix_(*dst_index)] = src[np.ix_(*src_index)]
+
+class FieldView:
+    '''
+    FieldStore 的二维视图，形状 (len(rows 维度), len(cols 维度))，与近场 E_near[y, x] 的约定一致
+    iter_blocks(): 按存储的块依次给出 ((行切片, 列切片), 数组)，传播函数据此流式计算
+    '''
+    def __init__(self, store, rows, cols, fixed):
+        for name in (rows, cols, *fixed):
+            if name not in store.dims:
+                raise ValueError(f'维度 {name!r} 不存在（已有 {store.dims}）')
+        self.store = store
+        self.rows, self.cols = rows, cols
+        self._axes = (store.dims.index(rows), store.dims.index(cols))
+        self._fixed = {}
+        for d, name in enumerate(store.dims):
+            if name in (rows, cols):
+                continue
+            if name in fixed:
+                self._fixed[d] = int(fixed[name])
+            elif store.shape[d] == 1:
+                self._fixed[d] = 0
+            else:
+                raise ValueError(f'需要指定维度 {name!r} 的下标（长度 {store.shape[d]}）')
+        self.shape = (store.shape[self._axes[0]], store.shape[self._axes[1]])
+        self.dtype = store.dtype
+        self.ndim = 2
+
+    def __getitem__(self, key):
+        if not isinstance(key, tuple):
+            key = (key, slice(None))
+        full = [None] * self.store.ndim
+        for d, i in self._fixed.items():
+            full[d] = i
+        full[self._axes[0]], full[self._axes[1]] = key
+        data = self.store[tuple(full)]
+        # 去掉整数下标后，若列维度排在行维度之前则转置
+        if self._axes[0] > self._axes[1] and data.ndim == 2:
+            data = data.T
+        return data
+
+    def __array__(self, dtype=None, copy=None):
+        data = self[:, :]
+        return data.astype(dtype) if dtype is not None else data
+
+    def iter_blocks(self):
+        cr, cc = self.store.chunks[self._axes[0]], self.store.chunks[self._axes[1]]
+        for r0 in range(0, self.shape[0], cr):
+            for c0 in range(0, self.shape[1], cc):
+                rs, cs = slice(r0, min(r0 + cr, self.shape[0])), slice(c0, min(c0 + cc, self.shape[1]))
+                yield (rs, cs), self[rs, cs]
@@ -0,0 +1,449 @@
+'''
+超表面版图的 GDSII 批量导入
+
+大量柱子逐个 addrect / addcircle 会让工程文件臃肿、建模和网格划分都很慢。这里把柱子参数
+（向量化的数组）在本地写成 GDSII：相同形状的柱子只定义一次（一个 cell），其余用 SREF
+引用，规则排列的部分合并成 AREF 阵列；然后每个图层只调用一次 gdsimport 导入会话。
+
+写入、读取、展开都不依赖 Lumerical，可以离线检查吞吐量、文件大小和往返一致性。
+
+坐标约定：输入坐标与尺寸均为米（与 FDTD 脚本一致），文件中用户单位默认 1 µm，数据库精度 1 nm。
+'''
+import os
+import time
+import struct
+
+import numpy as np
+
+# 记录类型（高字节）与数据类型（低字节）
+HEADER, BGNLIB, LIBNAME, UNITS, ENDLIB = 0x0002, 0x0102, 0x0206, 0x0305, 0x0400
+BGNSTR, STRNAME, ENDSTR = 0x0502, 0x0606, 0x0700
+BOUNDARY, SREF, AREF, ENDEL = 0x0800, 0x0A00, 0x0B00, 0x1100
+LAYER, DATATYPE, XY, SNAME, COLROW = 0x0D02, 0x0E02, 0x1003, 0x1206, 0x1302
+STRANS, MAG, ANGLE = 0x1A01, 0x1B05, 0x1C05
+
+MAX_POINTS = 8191       # 一个 XY 记录最多的坐标点数（记录长度上限 65535 字节）
+MAX_COLROW = 32767      # AREF 的最大行/列数
+
+
+class GDSError(Exception):
+    pass
+
+# ================= 数据编码 =================
+def _real8(values):
+    '''浮点数 -> GDSII 8字节实数（excess-64、16进制指数）'''
+    out = bytearray()
+    for v in np.atleast_1d(np.asarray(values, dtype=np.float64)):
+        if v == 0:
+            out += bytes(8)
+            continue
+        sign = 0x80 if v < 0 else 0
+        v = abs(float(v))
+        exponent = int(np.floor(np.log(v) / np.log(16))) + 1
+        mantissa = int(round(v / 16.0**exponent * 2**56))
+        if mantissa >= 2**56:
+            mantissa //= 16
+            exponent += 1
+        out += bytes([sign | (exponent + 64)]) + mantissa.to_bytes(7, 'big')
+    return bytes(out)
+
+def _from_real8(data):
+    values = []
+    for i in range(0, len(data), 8):
+        b = data[i:i + 8]
+        mantissa = int.from_bytes(b[1:], 'big') / 2**56
+        value = mantissa * 16.0**((b[0] & 0x7F) - 64)
+        values.append(-value if b[0] & 0x80 else value)
+    return values
+
+def _string(text):
+    data = text.encode('ascii')
+    return data + b'\0' if len(data) % 2 else data
+
+def _record(rtype, payload=b''):
+    if len(payload) + 4 > 0xFFFF:
+        raise GDSError(f'记录过长: 0x{rtype:04X} ({len(payload)} 字节)')
+    return struct.pack('>HH', len(payload) + 4, rtype) + payload
+
+# ================= 写入 =================
+class GDSWriter:
+    '''
+    流式 GDSII 写入器：结构（cell）与元素按调用顺序直接写入文件，不在内存中保存整个版图
+    path: 输出文件
+    unit: 用户单位（米），precision: 数据库精度（米），坐标以数据库单位的整数给出
+    with GDSWriter('out.gds') as w:
+        w.begin_structure('PILLAR')
+        w.boundary(1, 0, xy)
+        w.end_structure()
+    '''
+    def __init__(self, path, unit=1e-6, precision=1e-9, libname='LUMAPI', buffer_size=1 << 22):
+        self.path = path
+        self.unit = unit
+        self.precision = precision
+        self._file = open(path, 'wb', buffering=buffer_size)
+        self._in_structure = False
+        self.structures = []
+        self.counts = {'boundary': 0, 'sref': 0, 'aref': 0}
+        now = time.localtime()
+        stamp = struct.pack('>6h', now.tm_year, now.tm_mon, now.tm_mday, now.tm_hour, now.tm_min, now.tm_sec)
+        self._file.write(_record(HEADER, struct.pack('>h', 600)) + _record(BGNLIB, stamp*2)
+                         + _record(LIBNAME, _string(libname)) + _record(UNITS, _real8([precision/unit, precision])))
+
+    def begin_structure(self, name):
+        if self._in_structure:
+            raise GDSError('上一个结构尚未结束')
+        now = time.localtime()
+        stamp = struct.pack('>6h', now.tm_year, now.tm_mon, now.tm_mday, now.tm_hour, now.tm_min, now.tm_sec)
+        self._file.write(_record(BGNSTR, stamp*2) + _record(STRNAME, _string(name)))
+        self._in_structure = True
+        self.structures.append(name)
+
+    def end_structure(self):
+        self._file.write(_record(ENDSTR))
+        self._in_structure = False
+
+    def boundary(self, layer, datatype, xy):
+        '''多边形，xy 为 (n, 2) 的数据库单位整数坐标（不需要重复首点）'''
+        xy = np.asarray(xy, dtype=np.int64).reshape(-1, 2)
+        if not np.array_equal(xy[0], xy[-1]):
+            xy = np.vstack([xy, xy[:1]])
+        xy = xy.astype('>i4')
+        if len(xy) > MAX_POINTS:
+            raise GDSError(f'多边形顶点过多: {len(xy) - 1} > {MAX_POINTS - 1}')
+        self._file.write(_record(BOUNDARY) + _record(LAYER, struct.pack('>h', layer))
+                         + _record(DATATYPE, struct.pack('>h', datatype)) + _record(XY, xy.tobytes())
+                         + _record(ENDEL))
+        self.counts['boundary'] += 1
+
+    def srefs(self, name, x, y):
+        '''批量写入同一结构的 SREF（x, y 为数据库单位整数数组），按固定字节模板一次生成'''
+        x = np.atleast_1d(np.asarray(x, dtype=np.int64))
+        y = np.atleast_1d(np.asarray(y, dtype=np.int64))
+        if x.size == 0:
+            return
+        head = _record(SREF) + _record(SNAME, _string(name)) + struct.pack('>HH', 12, XY)
+        tail = _record(ENDEL)
+        size = len(head) + 8 + len(tail)
+        block = np.empty((x.size, size), dtype=np.uint8)
+        block[:, :len(head)] = np.frombuffer(head, dtype=np.uint8)
+        xy = np.empty((x.size, 2), dtype='>i4')
+        xy[:, 0], xy[:, 1] = x, y
+        block[:, len(head):len(head) + 8] = xy.view(np.uint8).reshape(-1, 8)
+        block[:, len(head) + 8:] = np.frombuffer(tail, dtype=np.uint8)
+        self._file.write(block.tobytes())
+        self.counts['sref'] += x.size
+
+    def aref(self, name, cols, rows, origin, col_pitch, row_pitch):
+        '''阵列引用：cols×rows 个实例，origin 为第一个实例的位置，col_pitch/row_pitch 为 (dx, dy)'''
+        if not (1 <= cols <= MAX_COLROW and 1 <= rows <= MAX_COLROW):
+            raise GDSError(f'AREF 行列数超出范围: {cols}×{rows}')
+        x0, y0 = origin
+        xy = np.array([[x0, y0],
+                       [x0 + cols*col_pitch[0], y0 + cols*col_pitch[1]],
+                       [x0 + rows*row_pitch[0], y0 + rows*row_pitch[1]]], dtype='>i4')
+        self._file.write(_record(AREF) + _record(SNAME, _string(name)) + _record(COLROW, struct.pack('>hh', cols, rows))
+                         + _record(XY, xy.tobytes()) + _record(ENDEL))
+        self.counts['aref'] += 1
+
+    def close(self):
+        if self._file is None:
+            return
+        if self._in_structure:
+            self.end_structure()
+        self._file.write(_record(ENDLIB))
+        self._file.close()
+        self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+# ================= 读取与展开 =================
+def read_gds(path):
+    '''
+    读取 GDSII 文件（BOUNDARY / SREF / AREF，其余元素忽略）
+    return: dict
+        'libname', 'unit', 'precision': 库名、用户单位与数据库精度（米）
+        'structures': {名称: {'boundaries': [(layer, datatype, xy)], 'srefs': [...], 'arefs': [...]}}
+            srefs: (名称, (x, y), strans)，arefs: (名称, cols, rows, xy(3, 2), strans)，
+            strans 为 (reflect, mag, angle)
+    '''
+    with open(path, 'rb') as f:
+        data = f.read()
+    lib = {'libname': None, 'unit': None, 'precision': None, 'structures': {}}
+    structure, element = None, None
+    pos = 0
+    while pos + 4 <= len(data):
+        size, rtype = struct.unpack_from('>HH', data, pos)
+        if size < 4:
+            raise GDSError(f'记录长度错误（偏移 {pos}）')
+        payload = data[pos + 4:pos + size]
+        pos += size
+        if rtype == LIBNAME:
+            lib['libname'] = payload.rstrip(b'\0').decode('ascii')
+        elif rtype == UNITS:
+            db_user, lib['precision'] = _from_real8(payload)
+            lib['unit'] = lib['precision'] / db_user
+        elif rtype == STRNAME:
+            structure = {'boundaries': [], 'srefs': [], 'arefs': []}
+            lib['structures'][payload.rstrip(b'\0').decode('ascii')] = structure
+        elif rtype in (BOUNDARY, SREF, AREF):
+            element = {'type': rtype, 'reflect': False, 'mag': 1.0, 'angle': 0.0}
+        elif element is not None:
+            if rtype == LAYER:
+                element['layer'] = struct.unpack('>h', payload)[0]
+            elif rtype == DATATYPE:
+                element['datatype'] = struct.unpack('>h', payload)[0]
+            elif rtype == SNAME:
+                element['sname'] = payload.rstrip(b'\0').decode('ascii')
+            elif rtype == COLROW:
+                element['colrow'] = struct.unpack('>hh', payload)
+            elif rtype == STRANS:
+                element['reflect'] = bool(payload[0] & 0x80)
+            elif rtype == MAG:
+                element['mag'] = _from_real8(payload)[0]
+            elif rtype == ANGLE:
+                element['angle'] = _from_real8(payload)[0]
+            elif rtype == XY:
+                element['xy'] = np.frombuffer(payload, dtype='>i4').reshape(-1, 2).astype(np.int64)
+            elif rtype == ENDEL:
+                strans = (element['reflect'], element['mag'], element['angle'])
+                if element['type'] == BOUNDARY:
+                    structure['boundaries'].append((element.get('layer', 0), element.get('datatype', 0), element['xy']))
+                elif element['type'] == SREF:
+                    structure['srefs'].append((element['sname'], tuple(element['xy'][0]), strans))
+                else:
+                    cols, rows = element['colrow']
+                    structure['arefs'].append((element['sname'], cols, rows, element['xy'], strans))
+                element = None
+        elif rtype == ENDLIB:
+            break
+    return lib
+
+def _transform(polys, strans):
+    '''按 strans (reflect, mag, angle) 变换多边形数组 (m, n, 2)'''
+    reflect, mag, angle = strans
+    if reflect:
+        polys = polys * [1, -1]
+    if angle:
+        c, s = np.cos(np.radians(angle)), np.sin(np.radians(angle))
+        polys = polys @ np.array([[c, s], [-s, c]])
+    return polys * mag if mag != 1 else polys
+
+def flatten_gds(lib, cell, scale=None):
+    '''
+    展开一个结构中的全部多边形
+    scale: 坐标缩放，默认换算为米（数据库单位 × precision）
+    return: {(layer, datatype): [np.ndarray(m, n, 2), ...]}，每个数组为 m 个顶点数相同的多边形（不含闭合点）
+    '''
+    scale = lib['precision'] if scale is None else scale
+    cache = {}
+    def geometry(name):
+        if name in cache:
+            return cache[name]
+        s = lib['structures'][name]
+        out = {}
+        for layer, datatype, xy in s['boundaries']:
+            poly = xy[:-1] if len(xy) > 1 and np.array_equal(xy[0], xy[-1]) else xy
+            out.setdefault((layer, datatype), []).append(poly.astype(np.float64)[np.newaxis])
+        refs = [(sname, np.array([origin], dtype=np.float64), strans) for sname, origin, strans in s['srefs']]
+        for sname, cols, rows, xy, strans in s['arefs']:
+            col_step = (xy[1] - xy[0]) / cols
+            row_step = (xy[2] - xy[0]) / rows
+            c, r = np.meshgrid(np.arange(cols), np.arange(rows))
+            refs.append((sname, xy[0] + c.reshape(-1, 1)*col_step + r.reshape(-1, 1)*row_step, strans))
+        for sname, offsets, strans in refs:
+            for key, arrays in geometry(sname).items():
+                for polys in arrays:
+                    moved = offsets[:, np.newaxis, np.newaxis, :] + _transform(polys, strans)[np.newaxis]
+                    out.setdefault(key, []).append(moved.reshape(-1, *polys.shape[1:]))
+        cache[name] = out
+        return out
+    return {key: [a * scale for a in arrays] for key, arrays in geometry(cell).items()}
+
+# ================= 柱子版图 =================
+def _circle(radius, n_vertices):
+    t = 2*np.pi*np.arange(n_vertices)/n_vertices
+    return np.stack([radius*np.cos(t), radius*np.sin(t)], axis=1)
+
+def _rectangle(width, length, angle):
+    xy = np.array([[-width/2, -length/2], [width/2, -length/2], [width/2, length/2], [-width/2, length/2]])
+    c, s = np.cos(angle), np.sin(angle)
+    return xy @ np.array([[c, s], [-s, c]])
+
+def _runs(group, values):
+    '''
+    把按 (group, values) 排好序的一维坐标拆成等间距的连续段（向量化）
+    组内第 i 个点（i >= 2）在 values[i] - values[i-1] != values[i-1] - values[i-2] 时开始新段，
+    所以每段内的间距相同；段长超过 MAX_COLROW 时再拆开
+    return: (各段首点的索引, 点数, 间距)
+    '''
+    n = len(values)
+    new_group = np.r_[True, group[1:] != group[:-1]]
+    start = new_group.copy()
+    if n > 2:
+        d = np.diff(values)
+        start[2:] |= ~new_group[2:] & ~new_group[1:-1] & (d[1:] != d[:-1])
+    first = np.flatnonzero(start)
+    pos = np.arange(n) - np.repeat(first, np.diff(np.r_[first, n]))
+    if n > MAX_COLROW and np.any(pos >= MAX_COLROW):
+        start |= (pos > 0) & (pos % MAX_COLROW == 0)
+        first = np.flatnonzero(start)
+    counts = np.diff(np.r_[first, n])
+    pitch = np.where(counts > 1, values[np.minimum(first + 1, n - 1)] - values[first], 0)
+    return first, counts, pitch
+
+def _group_positions(X, Y, min_array):
+    '''
+    把同一 cell 的实例位置分成 AREF 阵列与单个 SREF
+    先在每一行（相同 Y）内找等间距的连续段，再把起点、间距、个数都相同的行段沿 Y 合并
+    return: (arefs [(cols, rows, x0, y0, px, py)], sref_x, sref_y)
+    '''
+    order = np.lexsort((X, Y))
+    X, Y = X[order], Y[order]
+    first, cols, px = _runs(Y, X)
+    x0, y0 = X[first], Y[first]
+    # 行段按 (x0, px, cols) 分组，组内按 y 排序后再找等间距的连续段
+    order = np.lexsort((y0, cols, px, x0))
+    x0, y0, px, cols = x0[order], y0[order], px[order], cols[order]
+    key_change = np.r_[True, (x0[1:] != x0[:-1]) | (px[1:] != px[:-1]) | (cols[1:] != cols[:-1])]
+    first, rows, py = _runs(np.cumsum(key_change), y0)
+    x0, y0, px, cols = x0[first], y0[first], px[first], cols[first]
+    big = cols * rows >= min_array
+    arefs = list(zip(*(a[big].tolist() for a in (cols, rows, x0, y0, px, py))))
+    # 其余的展开成单个实例
+    cols, rows, x0, y0, px, py = (a[~big] for a in (cols, rows, x0, y0, px, py))
+    total = cols * rows
+    block = np.repeat(np.arange(len(total)), total)
+    k = np.arange(total.sum()) - np.repeat(np.cumsum(total) - total, total)
+    sref_x = x0[block] + (k % cols[block]) * px[block]
+    sref_y = y0[block] + (k // cols[block]) * py[block]
+    return arefs, sref_x, sref_y
+
+class PillarLayout:
+    '''
+    向量化的柱子版图：按参数数组添加柱子，写成 GDSII 后每个图层一次 gdsimport 导入
+
+    layout = PillarLayout()
+    layout.add_pillars(x, y, radius=r, layer=1)                    # 圆柱
+    layout.add_pillars(x, y, width=w, length=l, angle=a, layer=2)  # 矩形柱（可旋转，角度为弧度）
+    layout.write('metasurface.gds')
+    layout.import_to(fdtd, 'metasurface.gds', {1: {'material': 'TiO2', 'z_min': 0, 'z_max': 600e-9}})
+
+    unit, precision: GDS 的用户单位和数据库精度（米）；尺寸与位置按 precision 取整，
+                     取整后相同的柱子共用一个 cell
+    n_vertices: 圆柱的多边形顶点数
+    '''
+    def __init__(self, unit=1e-6, precision=1e-9, n_vertices=64):
+        if not 3 <= n_vertices < MAX_POINTS:
+            raise ValueError(f'n_vertices 应在 3 到 {MAX_POINTS - 1} 之间')
+        self.unit = unit
+        self.precision = precision
+        self.n_vertices = n_vertices
+        self._groups = []   # (shape, x_db, y_db, a_db, b_db, angle_code, layer, datatype)
+
+    def add_pillars(self, x, y, radius=None, width=None, length=None, angle=0.0, layer=1, datatype=0):
+        '''
+        添加一批柱子，参数可以是数组或数值（广播到 x 的长度）
+        radius: 圆柱半径；或 width, length, angle: 矩形柱的尺寸与旋转角（弧度）
+        '''
+        x = np.atleast_1d(np.asarray(x, dtype=np.float64)).ravel()
+        y = np.atleast_1d(np.asarray(y, dtype=np.float64)).ravel()
+        if x.shape != y.shape:
+            raise ValueError('x 与 y 的长度不一致')
+        def per_pillar(v):
+            v = np.asarray(v, dtype=np.float64)
+            return v.ravel() if v.size == x.size else np.broadcast_to(v, x.shape)
+        def db(v):
+            return np.rint(per_pillar(v) / self.precision).astype(np.int64)
+        if radius is not None:
+            shape, a, b = 'circle', db(radius), np.zeros(x.shape, dtype=np.int64)
+            angle_code = np.zeros(x.shape, dtype=np.int64)
+        elif width is not None and length is not None:
+            shape, a, b = 'rect', db(width), db(length)
+            # 角度按 1e-6 弧度取整，作为区分 cell 的依据
+            angle_code = np.rint(per_pillar(angle) % np.pi * 1e6).astype(np.int64)
+        else:
+            raise ValueError('需要给出 radius，或 width 和 length')
+        if np.any(a <= 0) or (shape == 'rect' and np.any(b <= 0)):
+            raise ValueError('柱子尺寸必须为正')
+        self._groups.append((shape, db(x), db(y), a, b, angle_code, int(layer), int(datatype)))
+
+    @property
+    def count(self):
+        return sum(len(g[1]) for g in self._groups)
+
+    @property
+    def layers(self):
+        return sorted({(g[6], g[7]) for g in self._groups})
+
+    def write(self, path, top='TOP', use_arrays=True, min_array=4):
+        '''
+        写入 GDSII 文件
+        top: 顶层 cell 名称（gdsimport 时使用）
+        use_arrays: 是否把规则排列的柱子合并成 AREF
+        min_array: 合并成 AREF 所需的最少实例数
+        return: dict: 柱子数、cell 数、SREF/AREF 数、文件字节数、耗时、吞吐量（柱子/秒）
+        '''
+        t0 = time.perf_counter()
+        cells = {}
+        for shape, X, Y, A, B, ANG, layer, datatype in self._groups:
+            # 相同 (尺寸, 角度) 的柱子归为一个 cell
+            keys = np.stack([A, B, ANG], axis=1)
+            unique, inverse = np.unique(keys, axis=0, return_inverse=True)
+            inverse = inverse.ravel()
+            order = np.argsort(inverse, kind='stable')
+            bounds = np.searchsorted(inverse[order], np.arange(len(unique) + 1))
+            for u, (a, b, ang) in enumerate(unique):
+                idx = order[bounds[u]:bounds[u + 1]]
+                key = (shape, int(a), int(b), int(ang), layer, datatype)
+                xs, ys = cells.setdefault(key, ([], []))
+                xs.append(X[idx])
+                ys.append(Y[idx])
+
+        with GDSWriter(path, self.unit, self.precision) as w:
+            names = {}
+            for i, key in enumerate(sorted(cells)):
+                shape, a, b, ang, layer, datatype = key
+                name = f'P{i}_L{layer}_{datatype}'
+                names[key] = name
+                if shape == 'circle':
+                    xy = _circle(a, self.n_vertices)
+                else:
+                    xy = _rectangle(a, b, ang / 1e6)
+                w.begin_structure(name)
+                w.boundary(layer, datatype, np.rint(xy).astype(np.int64))
+                w.end_structure()
+            w.begin_structure(top)
+            for key, (xs, ys) in sorted(cells.items()):
+                X, Y = np.concatenate(xs), np.concatenate(ys)
+                if use_arrays:
+                    arefs, X, Y = _group_positions(X, Y, min_array)
+                    for cols, rows, x0, y0, px, py in arefs:
+                        w.aref(names[key], cols, rows, (x0, y0), (px, 0), (0, py))
+                w.srefs(names[key], X, Y)
+            w.end_structure()
+            counts = dict(w.counts)
+        elapsed = time.perf_counter() - t0
+        return {'pillars': self.count, 'cells': len(cells), 'srefs': counts['sref'], 'arefs': counts['aref'],
+                'bytes': os.path.getsize(path), 'seconds': elapsed,
+                'throughput': self.count / elapsed if elapsed > 0 else 0.0}
+
+    def import_to(self, session, path, layers, top='TOP'):
+        '''
+        把写好的 GDS 导入会话，每个图层调用一次 gdsimport
+        session: FDTD / MODE 等会话对象
+        layers: {layer 或 (layer, datatype): {'material': 材料, 'z_min': ..., 'z_max': ...}}
+        return: 导入的图层列表
+        '''
+        path = os.path.abspath(path)
+        imported = []
+        for key, spec in layers.items():
+            layer, datatype = key if isinstance(key, tuple) else (key, 0)
+            if (layer, datatype) not in self.layers:
+                raise ValueError(f'版图中没有图层 {layer}:{datatype}')
+            session.gdsimport(path, top, f'{layer}:{datatype}', spec['material'], spec['z_min'], spec['z_max'])
+            imported.append((layer, datatype))
+        return imported
@@ -0,0 +1,101 @@
+import numpy as np
+
+from lumapi.lumapi import Kirchhoff, RorySommerfeld_Scalar, _get_kernel, propagate
+
+# 旧接口中直接传入的公开函数对应的已注册核
+_WRAPPERS = {
+    Kirchhoff: 'Kirchhoff',
+    RorySommerfeld_Scalar: 'RorySommerfeld_Scalar',
+}
+
+class IncrementalFarField:
+    '''
+    近场局部修改时的增量远场更新
+
+    衍射传播对近场是线性的：E_far(E + ΔE) = E_far(E) + E_far(ΔE)。
+    每次更新只对发生变化的近场行/列构成的子网格计算 ΔE 的贡献并累加到上一次的远场上，
+    单次更新的计算量与修改区域大小成正比，而与整个孔径大小无关。
+    每 refresh_every 次增量更新后完整重算一次，以限制浮点误差累积。
+
+    lamb, x_near, y_near, E_near, x_far, y_far, z_far, mode: 与 Kirchhoff 相同
+    kernel: 'Kirchhoff'、'RorySommerfeld_Scalar'，或 register_kernel 注册的核（名称、返回值或核函数 func(dx, dy, z, r, k, lamb)），
+            由 propagate 在 lumapi.lumapi 的传播引擎中计算
+    refresh_every: 完整重算的间隔（增量更新次数），0 表示从不自动重算
+
+    示例:
+        ff = IncrementalFarField(lamb, x_near, y_near, E_near, x_far, y_far, z_far)
+        for it in range(n_iter):
+            E_near[r0:r1, c0:c1] = new_patch
+            E_far = ff.update(E_near)          # 自动找出变化的区域
+            # 或 ff.update_region((slice(r0, r1), slice(c0, c1)), new_patch)
+    '''
+    def __init__(self, lamb, x_near, y_near, E_near, x_far, y_far, z_far, mode='numba',
+                 kernel='Kirchhoff', refresh_every=50):
+        self.kernel = _get_kernel(_WRAPPERS.get(kernel, kernel))
+        if self.kernel.fields != 1:
+            raise ValueError(f'核 {self.kernel.name} 需要 {self.kernel.fields} 个近场，增量更新只支持标量核')
+        self.lamb = lamb
+        self.x_near = np.asarray(x_near, dtype=np.float64)
+        self.y_near = np.asarray(y_near, dtype=np.float64)
+        self.x_far, self.y_far, self.z_far = x_far, y_far, z_far
+        self.mode = mode
+        self.refresh_every = refresh_every
+        self.E_near = np.array(E_near, dtype=np.complex128, copy=True)
+        self.updates = 0        # 自上次完整计算以来的增量更新次数
+        self.updated_points = 0 # 累计参与增量计算的近场点数
+        self.recompute()
+
+    def _propagate(self, x_near, y_near, E_near):
+        return propagate(self.kernel, self.lamb, x_near, y_near, E_near, self.x_far, self.y_far, self.z_far,
+                         mode=self.mode)
+
+    def recompute(self):
+        """由当前近场完整重算远场"""
+        self.E_far = self._propagate(self.x_near, self.y_near, self.E_near)
+        self.updates = 0
+        return self.E_far
+
+    def _apply(self, rows, cols, delta):
+        """将子网格 rows×cols 上的近场增量 delta 传播并累加到远场"""
+        if delta.size == 0 or not np.any(delta):
+            return self.E_far
+        self.E_far += self._propagate(self.x_near[cols], self.y_near[rows], delta)
+        self.updates += 1
+        self.updated_points += delta.size
+        if self.refresh_every and self.updates >= self.refresh_every:
+            self.recompute()
+        return self.E_far
+
+    def update(self, E_near):
+        '''
+        用新的完整近场更新远场，只计算与上一次相比发生变化的行/列构成的子网格
+        return: 更新后的远场
+        '''
+        E_near = np.asarray(E_near, dtype=np.complex128)
+        if E_near.shape != self.E_near.shape:
+            raise ValueError('近场尺寸与初始化时不一致')
+        changed = E_near != self.E_near
+        rows = np.flatnonzero(changed.any(axis=1))
+        cols = np.flatnonzero(changed.any(axis=0))
+        if rows.size == 0:
+            return self.E_far
+        sub = np.ix_(rows, cols)
+        delta = E_near[sub] - self.E_near[sub]
+        self.E_near[sub] = E_near[sub]
+        return self._apply(rows, cols, delta)
+
+    def update_region(self, region, values):
+        '''
+        直接指定修改区域
+        region: (行切片, 列切片)，行对应 y_near，列对应 x_near
+        values: 该区域的新近场值
+        return: 更新后的远场
+        '''
+        row_slice, col_slice = region
+        rows = np.arange(len(self.y_near))[row_slice]
+        cols = np.arange(len(self.x_near))[col_slice]
+        sub = np.ix_(rows, cols)
+        values = np.broadcast_to(np.asarray(values, dtype=np.complex128), (len(rows), len(cols)))
+        delta = values - self.E_near[sub]
+        self.E_near[sub] = values
+        return self._apply(rows, cols, delta)
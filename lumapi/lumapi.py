@@ -1,10 +1,23 @@
-import numpy as np
 import os
 import sys
 import json
 import importlib
 import importlib.util
 import re, platform
+import time
+import bisect
+import itertools
+
+# numpy 等重依赖在首次需要时才导入，保证 import lumapi 足够快
+np = None
+
+def _numpy():
+    """按需导入numpy并绑定到模块全局变量np（numba内核也通过全局变量使用np）"""
+    global np
+    if np is None:
+        import numpy
+        np = numpy
+    return np
 
 current_dir = os.path.dirname(os.path.abspath(__file__))
 CONFIG_PATH = os.path.join(current_dir, 'config.json')
@@ -32,6 +45,9 @@ def get_lumapi_path(lumerical_root, version):
     """从Lumerical根路径和版本获取lumapi.py路径"""
     return os.path.join(lumerical_root, version, "api", "python", "lumapi.py")
 
+# 已验证的厂商lumapi模块缓存，键为(lumerical_root, version)
+_LUMAPI_CACHE = {}
+
 def validate_path(lumerical_root: str, version: str = None) -> object:
     """验证Lumerical路径有效性并返回lumapi对象
     
@@ -56,6 +72,11 @@ def validate_path(lumerical_root: str, version: str = None) -> object:
                 print(f"错误：在指定路径未找到有效的Lumerical版本 (查找路径：{lumerical_root})")
                 return None
         
+        # 同一安装只加载一次，避免重复执行lumapi.py和加载接口动态库
+        cached = _LUMAPI_CACHE.get((lumerical_root, version))
+        if cached is not None:
+            return cached
+
         # 获取lumapi.py的完整路径
         lumapi_path = get_lumapi_path(lumerical_root, version)
         
@@ -72,6 +93,7 @@ def validate_path(lumerical_root: str, version: str = None) -> object:
             # windows系统导入dll目录
             os.add_dll_directory(lumerical_root)
         
+        _LUMAPI_CACHE[(lumerical_root, version)] = lumapi
         return lumapi
         
     except Exception as e:
@@ -108,396 +130,1551 @@ def create_cmap(color_type):
     
     return cmap
 
-def Kirchhoff(lamb, x_near, y_near, E_near, x_far, y_far, z_far, mode='numba'):
+# ================= 求积规则（quadrature 参数） =================
+# None       : 直接对采样点求和（原有行为，没有面元）
+# 'trapezoid': 梯形权重，支持非均匀网格
+# 'simpson'  : Simpson 权重，支持非均匀网格；区间数为奇数时最后一个区间用三点二次公式
+# 'filon'    : Filon 型（指数拟合）梯形规则：内部与梯形相同，边界点的权重按被积函数在边界处的
+#              局部相位斜率（exp(ikr) 与近场相位之和）修正，使规则对线性相位的振荡积分精确，
+#              消除梯形规则在孔径边缘的 O(h²·k²) 误差。修正只涉及边界上的采样点，单独计算
+# 使用求积规则时，权重预先乘到近场上，所有计算模式共用；结果为乘了面元的衍射积分
+QUADRATURES = (None, 'trapezoid', 'simpson', 'filon')
+
+def _axis_weights(coords, rule):
+    """单个维度的求积权重"""
+    coords = np.asarray(coords, dtype=np.float64)
+    n = len(coords)
+    if n == 1:
+        return np.ones(1)
+    h = np.diff(coords)
+    w = np.zeros(n)
+    if rule == 'simpson' and n >= 3:
+        last = n - 1 if (n - 1) % 2 == 0 else n - 2
+        for i in range(0, last, 2):
+            h0, h1 = h[i], h[i + 1]
+            w[i] += (h0 + h1) / 6 * (2 - h1/h0)
+            w[i + 1] += (h0 + h1)**3 / (6*h0*h1)
+            w[i + 2] += (h0 + h1) / 6 * (2 - h0/h1)
+        if last != n - 1:
+            # 最后一个区间：用最后三个点的二次插值在该区间上积分
+            h0, h1 = h[-2], h[-1]
+            w[-3] += -h1**3 / (6*h0*(h0 + h1))
+            w[-2] += h1*(h1 + 3*h0) / (6*h0)
+            w[-1] += h1*(2*h1 + 3*h0) / (6*(h0 + h1))
+    else:
+        w[:-1] += h/2
+        w[1:] += h/2
+    return w
+
+def _quadrature_weights(quadrature, x_near, y_near):
     '''
-    lamb: 波长
-    x_near, y_near: 近场位置数据，x_near和y_near应当是一维ndarry数组
-    E_near: 近场的电场数据，E_near应当是二维ndarry数组
-    x_far, y_far, z_far: 远场的位置数据，应当是一维数据或者数值
-    mode: 计算模式
-        'common'('c')，   : 普通循环计算模式，兼容所有平台，最稳定，但速度最慢
-        'threaded'('t')   : 多线程计算模式，能够吃满CPU资源，测试仅windows下可用，需要joblib库
-        'vectorized'('v') : 矢量化计算模式，计算小数据非常快，但大数据会容易爆内存(目前还没写好)
-        'numba'('n')      : numba计算模式，计算速度非常快，兼容windows和linux，需要numba库，**推荐使用**
+    预先计算求积权重
+    return: 权重数组 (len(y_near), len(x_near))，quadrature=None 时为 None
+    '''
+    if quadrature not in QUADRATURES:
+        raise ValueError(f'Invalid quadrature(可选 {QUADRATURES})')
+    if quadrature is None:
+        return None
+    rule = 'trapezoid' if quadrature == 'filon' else quadrature
+    return _axis_weights(y_near, rule)[:, np.newaxis] * _axis_weights(x_near, rule)[np.newaxis, :]
 
-    return: 远场电场数据np.ndarray(len(x_far),len(y_far),len(z_far))
+def _filon_end_factor(s):
+    '''
+    Filon 型端点权重与梯形端点权重 h/2 之比，s 为端点处一个步长内的相位变化（左端取正向，右端取反向）
+    对 exp(i·s·x/h) 精确：a(s) = i/s + 1/(1 - exp(-is))，a(0) = 1/2
+    '''
+    s = np.clip(s, -np.pi, np.pi)   # 超过奈奎斯特极限时无法修正，限制在 ±π 避免权重发散
+    small = np.abs(s) < 1e-3
+    s_safe = np.where(small, 1.0, s)
+    exact = 2*(1j/s_safe + 1/(1 - np.exp(-1j*s_safe)))
+    return np.where(small, 1 + 1j*s/6, exact)
+
+def _filon_correction(kernel, lamb, x_near, y_near, E_near, W, X_far, Y_far, Z_far, chunk=4096):
+    '''
+    Filon 规则的边界修正：Σ_{边界点} E·w·K·(F - 1)，与梯形规则的结果相加即为 Filon 规则的结果
+    E_near: 原始近场（同时用于估计边界处近场自身的相位斜率）
+    W: 梯形权重
+    return: 与远场同形状的修正量
+    '''
+    func = _get_kernel(kernel).func
+    k = 2 * np.pi / lamb
+    x_near = np.asarray(x_near, dtype=np.float64)
+    y_near = np.asarray(y_near, dtype=np.float64)
+    E_near = np.asarray(E_near, dtype=np.complex128)
+    ny, nx = E_near.shape
+    # 边界点及其朝内方向：+1(左/下端)、-1(右/上端)、0(该方向为内部点)
+    ii, jj = np.meshgrid(np.arange(ny), np.arange(nx), indexing='ij')
+    ex = np.where(jj == 0, 1, np.where(jj == nx - 1, -1, 0)) if nx > 1 else np.zeros_like(jj)
+    ey = np.where(ii == 0, 1, np.where(ii == ny - 1, -1, 0)) if ny > 1 else np.zeros_like(ii)
+    edge = (ex != 0) | (ey != 0)
+    if not edge.any():
+        return np.zeros(X_far.shape, dtype=np.complex128)
+    rows, cols, sx, sy = ii[edge], jj[edge], ex[edge], ey[edge]
+    # 端点区间的长度及近场自身在该区间内（朝内）的相位变化
+    hx = np.abs(x_near[cols + sx] - x_near[cols])
+    hy = np.abs(y_near[rows + sy] - y_near[rows])
+    tx = np.angle(E_near[rows, cols + sx] * np.conj(E_near[rows, cols]))
+    ty = np.angle(E_near[rows + sy, cols] * np.conj(E_near[rows, cols]))
+    sx, sy, hx, hy, tx, ty = (a[:, np.newaxis] for a in (sx, sy, hx, hy, tx, ty))
+    xn, yn = x_near[cols][:, np.newaxis], y_near[rows][:, np.newaxis]
+    En = E_near[rows, cols] * W[rows, cols]
+
+    Xf, Yf, Zf = X_far.ravel(), Y_far.ravel(), Z_far.ravel()
+    out = np.zeros(Xf.size, dtype=np.complex128)
+    for start in range(0, Xf.size, chunk):
+        sl = slice(start, start + chunk)
+        dx, dy, z = Xf[sl] - xn, Yf[sl] - yn, Zf[sl]
+        r = np.sqrt(dx**2 + dy**2 + z**2)
+        K = func(dx, dy, z, r, k, lamb)
+        # 端点处朝内一个步长内被积函数的相位变化 = exp(ikr) 的变化 + 近场自身的变化
+        Fx = np.where(sx != 0, _filon_end_factor(-sx*k*hx*dx/r + tx), 1)
+        Fy = np.where(sy != 0, _filon_end_factor(-sy*k*hy*dy/r + ty), 1)
+        out[sl] = En @ (K * (Fx*Fy - 1))
+    return out.reshape(X_far.shape)
+
+# ================= 非均匀FFT（Fraunhofer 远场模式 mode='nufft'） =================
+
+def _nufft_axis(xs, ss, L, W):
+    '''
+    type-3 NUFFT 单个维度的高斯网格化参数
+    xs, ss: 已平移到中心的源点坐标和目标频率
+    '''
+    X, S = np.max(np.abs(xs)), np.max(np.abs(ss))
+    if X == 0 or S == 0:
+        # 该维度相位恒为0
+        xs, ss = np.zeros_like(xs), np.zeros_like(ss)
+        X = S = 1.0
+    P = max(np.sqrt(X*S), 1.0)
+    gamma = P / X                    # 缩放后 |u| <= P, |t| <= P
+    u, t = xs*gamma, ss/gamma
+    h = np.pi / (2*P)                # 空间网格步长，周期 2π/h = 4P
+    tau = L / (8*P**2)               # 源点展宽高斯 exp(-u²/(4τ))
+    jmax = int(np.ceil(P/h)) + W
+    Nu = 2*jmax + 1                  # 网格点 u_j = j·h, j = -jmax..jmax
+    Nf = 2*Nu                        # 过采样的FFT长度
+    U = Nf*h/4
+    sigma = L / (8*U**2)             # 频率域插值高斯 exp(-t²/(4σ))
+    dt = 2*np.pi / (h*Nf)
+    return {'u': u, 't': t, 'h': h, 'tau': tau, 'jmax': jmax, 'Nu': Nu, 'Nf': Nf, 'sigma': sigma, 'dt': dt}
+
+def _gauss_stencil(pos, step, width, W, offset):
+    """每个点附近 2W 个网格点的索引及高斯权重 exp(-(pos-j·step)²/width)"""
+    j = np.floor(pos/step).astype(np.int64)[:, np.newaxis] + np.arange(-W + 1, W + 1)
+    w = np.exp(-(pos[:, np.newaxis] - j*step)**2 / width)
+    return j + offset, w
+
+def _nufft3(x, y, c, s, t, eps=1e-6, chunk=4096):
+    '''
+    二维 type-3 非均匀FFT: f_m = Σ_n c_n·exp(-i(s_m·x_n + t_m·y_n))
+    源点 (x, y) 与目标频率 (s, t) 均为任意位置，复杂度 O((N+M)·W² + K·logK)
+    安装了 finufft 时直接调用，否则使用内置的高斯网格化实现（两次高斯展宽 + 一次FFT）
+    eps: 相对精度
+    '''
+    x, y, s, t = (np.asarray(a, dtype=np.float64).ravel() for a in (x, y, s, t))
+    c = np.asarray(c, dtype=np.complex128).ravel()
+    try:
+        import finufft
+        return finufft.nufft2d3(x, y, c, s, t, isign=-1, eps=eps)
+    except ImportError:
+        pass
+
+    L = np.log(1 / max(eps, 1e-15))
+    W = int(np.ceil(np.sqrt(2) * L / np.pi)) + 1
+    # 平移到中心，平移产生的相位分别乘到源点和结果上
+    xc, yc = (x.max() + x.min())/2, (y.max() + y.min())/2
+    sc, tc = (s.max() + s.min())/2, (t.max() + t.min())/2
+    c = c * np.exp(-1j*(sc*(x - xc) + tc*(y - yc)))
+    post = np.exp(-1j*(s*xc + t*yc))
+    ax = _nufft_axis(x - xc, s - sc, L, W)
+    ay = _nufft_axis(y - yc, t - tc, L, W)
+
+    # 1. 源点以高斯展宽到均匀网格 g (y 为第0维)
+    g = np.zeros(ay['Nu']*ax['Nu'], dtype=np.complex128)
+    for start in range(0, c.size, chunk):
+        sl = slice(start, start + chunk)
+        ix, wx = _gauss_stencil(ax['u'][sl], ax['h'], 4*ax['tau'], W, ax['jmax'])
+        iy, wy = _gauss_stencil(ay['u'][sl], ay['h'], 4*ay['tau'], W, ay['jmax'])
+        idx = (iy[:, :, np.newaxis]*ax['Nu'] + ix[:, np.newaxis, :]).ravel()
+        val = (c[sl, np.newaxis, np.newaxis] * wy[:, :, np.newaxis] * wx[:, np.newaxis, :]).ravel()
+        g += np.bincount(idx, val.real, g.size) + 1j*np.bincount(idx, val.imag, g.size)
+    g = g.reshape(ay['Nu'], ax['Nu'])
+
+    # 2. 除以频率域插值高斯的傅里叶变换，过采样FFT得到周期频谱的均匀采样
+    uy = np.arange(-ay['jmax'], ay['jmax'] + 1) * ay['h']
+    ux = np.arange(-ax['jmax'], ax['jmax'] + 1) * ax['h']
+    g = g * (np.exp(ay['sigma']*uy**2)[:, np.newaxis] * np.exp(ax['sigma']*ux**2)[np.newaxis, :]
+             / (4*np.pi*np.sqrt(ay['sigma']*ax['sigma'])))
+    G = np.fft.fft2(g, s=(ay['Nf'], ax['Nf']))
+    # 网格从 j=-jmax 开始，补上对应的相位
+    G *= (np.exp(2j*np.pi*np.arange(ay['Nf'])*ay['jmax']/ay['Nf'])[:, np.newaxis]
+          * np.exp(2j*np.pi*np.arange(ax['Nf'])*ax['jmax']/ax['Nf'])[np.newaxis, :])
+    G = G.ravel()
+
+    # 3. 在目标频率处以高斯插值，并除以源点展宽高斯的傅里叶变换
+    f = np.zeros(s.size, dtype=np.complex128)
+    for start in range(0, s.size, chunk):
+        sl = slice(start, start + chunk)
+        lx, wx = _gauss_stencil(ax['t'][sl], ax['dt'], 4*ax['sigma'], W, 0)
+        ly, wy = _gauss_stencil(ay['t'][sl], ay['dt'], 4*ay['sigma'], W, 0)
+        idx = (ly % ay['Nf'])[:, :, np.newaxis]*ax['Nf'] + (lx % ax['Nf'])[:, np.newaxis, :]
+        f[sl] = np.einsum('mij,mi,mj->m', G[idx], wy, wx)
+    scale = (ax['dt']*ay['dt'] * ax['h']*ay['h'] / (4*np.pi*np.sqrt(ax['tau']*ay['tau']))
+             * np.exp(ax['tau']*ax['t']**2 + ay['tau']*ay['t']**2))
+    return f * scale * post
+
+def _fraunhofer_propagate(kernel, lamb, x_near, y_near, E_nears, X_far, Y_far, Z_far, eps=1e-6, chunk=4096,
+                          aperture=None):
+    '''
+    Fraunhofer 近似下的传播（mode='nufft'）
+    以近场中心 (xc, yc) 为参考，r ≈ R - ((x-xc)·(X-xc) + (y-yc)·(Y-yc))/R，
+    于是 Σ E·K(r) ≈ K(R)·Σ E·exp(-ik((x-xc)·ux + (y-yc)·uy))，后者是近场点到远场方向的 type-3 NUFFT。
+    距离 R < 2D²/λ（D 为近场对角线长度）的远场点不满足 Fraunhofer 条件，退回直接求和。
+    E_nears: 近场列表（矢量核的 x/y 分量共用同一套几何）
+    aperture: 整个近场的范围 (x_min, x_max, y_min, y_max)，默认为 x_near、y_near 的范围；
+              分块计算时各块使用同一个参考中心和 Fraunhofer 判据，结果与整体计算相同
+    return: 与 E_nears 对应的远场列表
+    '''
+    func = _get_kernel(kernel).func
+    k = 2 * np.pi / lamb
+    x_near = np.asarray(x_near, dtype=np.float64)
+    y_near = np.asarray(y_near, dtype=np.float64)
+    if aperture is None:
+        aperture = (x_near.min(), x_near.max(), y_near.min(), y_near.max())
+    x_min, x_max, y_min, y_max = aperture
+    xc, yc = (x_max + x_min)/2, (y_max + y_min)/2
+    D = np.hypot(x_max - x_min, y_max - y_min)
+    shape = X_far.shape
+    Xf, Yf, Zf = X_far.ravel() - xc, Y_far.ravel() - yc, Z_far.ravel()
+    R = np.sqrt(Xf**2 + Yf**2 + Zf**2)
+    far = R >= 2*D**2/lamb
+    near = ~far
+    X_near, Y_near = np.meshgrid(x_near - xc, y_near - yc)
+
+    results = []
+    for E_near in E_nears:
+        E_near = np.asarray(E_near, dtype=np.complex128)
+        out = np.zeros(R.size, dtype=np.complex128)
+        if far.any():
+            S = _nufft3(X_near, Y_near, E_near, k*Xf[far]/R[far], k*Yf[far]/R[far], eps)
+            out[far] = func(Xf[far], Yf[far], Zf[far], R[far], k, lamb) * S
+        if near.any():
+            # 近区目标：直接求和（逐近场行，远场点分块）
+            idx = np.flatnonzero(near)
+            for start in range(0, idx.size, chunk):
+                m = idx[start:start + chunk]
+                for ii in range(len(y_near)):
+                    dx, dy = Xf[m] - X_near[ii][:, np.newaxis], Yf[m] - Y_near[ii][0]
+                    r = np.sqrt(dx**2 + dy**2 + Zf[m]**2)
+                    out[m] += E_near[ii] @ np.broadcast_to(func(dx, dy, Zf[m], r, k, lamb), r.shape)
+        results.append(out.reshape(shape))
+    return results
+
+# ================= 缩放窗口（chirp-z 变换，mode='zoom'） =================
+# 以远场窗口中心 (Xc, Yc) 为参考，u = x - Xc、U = X - Xc（v、V 同理），r0 为近场点到窗口中心的距离：
+#   r ≈ r0 - (u·U + v·V)/r0 + (U² + V²)/2r0（窗口偏移 U、V 的 Fresnel 展开，近场一侧精确）
+# 其中 1/r0 用按近场振幅加权的最小二乘常数 1/z1（线性项）、1/z2（二次项）代替，
+# 于是 Σ E·K(r) ≈ exp(ik(U²+V²)/2z2) · Σ [E·K(r0)]·exp(-ik(u·U + v·V)/z1)。近场和远场窗口等间距时求和可分离，
+# 每个方向都是一次 chirp-z 变换（Bluestein 算法：乘 chirp 后做 FFT 卷积）。窗口的位置和采样间隔可以任意选取
+# （如焦点附近远小于近场步长的采样），每个 z 平面 O(N log N)；窗口中心处与直接求和相同，误差随窗口增大而增大。
+
+# 窗口边缘处被忽略的相位（1/r0 与常数之差及展开的高阶项）的估计值超过该值（弧度）时给出警告
+ZOOM_PHASE_TOL = 0.5
+
+def _fft_length(n):
+    '''不小于 n 的 2^a·3^b·5^c（FFT 较快的长度）'''
+    best = 1 << max(int(n - 1).bit_length(), 0)
+    p5 = 1
+    while p5 < best:
+        p35 = p5
+        while p35 < best:
+            p = p35
+            while p < n:
+                p *= 2
+            best = min(best, p)
+            p35 *= 3
+        p5 *= 5
+    return best
+
+def _uniform_axis(coords, name):
+    '''等间距坐标的 (起点, 步长)，单点时步长为 0'''
+    coords = np.atleast_1d(np.asarray(coords, dtype=np.float64))
+    if coords.size == 1:
+        return coords[0], 0.0
+    step = (coords[-1] - coords[0]) / (coords.size - 1)
+    if step == 0 or np.max(np.abs(np.diff(coords) - step)) > 1e-6 * abs(step):
+        raise ValueError(f"mode='zoom' 需要等间距的 {name}（其他情况请使用 'numba' 等直接求和模式）")
+    return coords[0], step
+
+def _chirp_z(a, axis, x0, dx, X0, dX, M, beta):
+    '''
+    沿 axis 计算 Σ_j a_j·exp(-iβ·x_j·X_m)，x_j = x0 + j·dx，X_m = X0 + m·dX（m < M）
+    Bluestein：x_j·X_m 的交叉项 j·m = (j² + m² - (m-j)²)/2，求和变为与 chirp 的卷积，用长度 ≥ N+M-1 的 FFT 计算
+    '''
+    a = np.moveaxis(a, axis, -1)
+    N = a.shape[-1]
+    w = beta * dx * dX
+    j, m = np.arange(N), np.arange(M)
+    u = a * np.exp(-1j * (beta*dx*X0*j + w*j**2/2))
+    t = np.arange(-(N - 1), M)
+    L = _fft_length(N + M - 1)
+    conv = np.fft.ifft(np.fft.fft(u, L) * np.fft.fft(np.exp(0.5j * w * t**2), L))[..., N - 1:N - 1 + M]
+    out = conv * np.exp(-1j * (w*m**2/2 + beta*x0*(X0 + m*dX)))
+    return np.moveaxis(out, -1, axis)
+
+def _zoom_propagate(kernel, lamb, x_near, y_near, E_nears, X_far, Y_far, Z_far, eps=None):
+    '''
+    用 chirp-z 变换计算矩形远场窗口（mode='zoom'）
+    近场和远场窗口的 x、y 都须等间距（间距任意），z 可以是任意多个平面
+    E_nears: 近场列表；eps 未使用（与 'nufft' 的接口一致）
+    return: 与 E_nears 对应的远场列表
+    '''
+    func = _get_kernel(kernel).func
+    k = 2 * np.pi / lamb
+    x_far, y_far, z_far = X_far[:, 0, 0], Y_far[0, :, 0], Z_far[0, 0, :]
+    Xc, Yc = (x_far.max() + x_far.min())/2, (y_far.max() + y_far.min())/2
+    u0, du = _uniform_axis(x_near - Xc, 'x_near')
+    v0, dv = _uniform_axis(y_near - Yc, 'y_near')
+    U0, dU = _uniform_axis(x_far - Xc, 'x_far')
+    V0, dV = _uniform_axis(y_far - Yc, 'y_far')
+    if np.any(z_far == 0):
+        raise ValueError("mode='zoom' 不能计算 z = 0 的平面")
+    nx, ny, Mx, My = len(x_near), len(y_near), len(x_far), len(y_far)
+    rho_w = np.hypot(x_far.max() - Xc, y_far.max() - Yc)
+    u, v = x_near - Xc, y_near - Yc
+    U, V = np.meshgrid(x_far - Xc, y_far - Yc, indexing='ij')
+    F = np.stack([np.asarray(E, dtype=np.complex128) for E in E_nears])
+    # 先变换的方向 FFT 行数为未变换方向的近场点数，选总代价较小的顺序
+    Lx, Ly = _fft_length(nx + Mx - 1), _fft_length(ny + My - 1)
+    x_first = ny*Lx*np.log2(Lx) + Mx*Ly*np.log2(Ly) <= nx*Ly*np.log2(Ly) + My*Lx*np.log2(Lx)
+    du_grid, dv_grid = np.meshgrid(-u, -v)
+    rho2 = du_grid**2 + dv_grid**2
+    weight = np.abs(F).sum(axis=0)
+    lit = weight > 0
+    if not lit.any():
+        weight, lit = np.ones_like(weight), np.ones_like(lit)
+
+    results = np.zeros((len(F), Mx, My, len(z_far)), dtype=np.complex128)
+    worst = 0.0
+    for iz, z in enumerate(z_far):
+        r0 = np.sqrt(rho2 + z**2)
+        # 线性项按 Σ w·ρ²·(1/r0 - 1/z1)² 最小、二次项按 Σ w·(1/r0 - 1/z2)² 最小选取常数
+        inv1 = np.sum(weight*rho2/r0) / np.sum(weight*rho2) if np.sum(weight*rho2) > 0 else 1/abs(z)
+        inv2 = np.sum(weight/r0) / np.sum(weight)
+        # 窗口边缘处的残余相位：线性项、二次项的常数近似误差加上展开的下一阶 (u·U)²/2r0³
+        residual = rho_w * (np.sqrt(rho2)*np.abs(1/r0 - inv1))[lit].max() \
+            + rho_w**2/2 * np.abs(1/r0 - inv2)[lit].max() + rho_w**2 * rho2[lit].max() / (2*abs(z)**3)
+        worst = max(worst, k * residual)
+        inv1, inv2 = np.copysign(inv1, z), np.copysign(inv2, z)
+        beta = k * inv1
+        G = F * func(du_grid, dv_grid, z, r0, k, lamb)
+        if x_first:
+            G = _chirp_z(_chirp_z(G, 2, u0, du, U0, dU, Mx, beta), 1, v0, dv, V0, dV, My, beta)
+        else:
+            G = _chirp_z(_chirp_z(G, 1, v0, dv, V0, dV, My, beta), 2, u0, du, U0, dU, Mx, beta)
+        results[:, :, :, iz] = np.exp(0.5j*k*inv2*(U**2 + V**2)) * np.swapaxes(G, 1, 2)
+    if worst > ZOOM_PHASE_TOL:
+        print(f"警告：窗口边缘的相位误差估计 {worst:.2g} rad（> {ZOOM_PHASE_TOL}），"
+              f"请缩小窗口、分成多个窗口计算，或使用 'numba' 等直接求和模式")
+    return list(results)
+
+# ================= 自动选择计算模式（mode='auto'） =================
+# 各计算模式的代价模型（可按本机实测修改）：
+#   pair_ns : 每个 近场点×远场点 组合的耗时（纳秒，单核，标量核）
+#   fixed_s : 固定开销（秒），numba 为每个核首次调用的编译时间（之后复用），threaded 为进程池启动
+#   near_s  : 每个近场点（common）或每行近场（threaded）的调度开销（秒）
+#   temp    : 每个远场点的临时数组字节数（每个计算线程一份；numba 只在按近场行并行时每个线程一份部分和）
+#   pair_bytes : vectorized 模式每个组合的峰值字节数（每块最多 VECTOR_TILE 个组合）
+#   point_ns : nufft 每个点、zoom 每个 FFT 点（乘 log2 长度）的耗时
+# get_propagation_stats() 记录每次调用的实测 ns_per_pair，可据此校准
+BACKEND_COSTS = {
+    'common':     {'pair_ns': 70.0,  'fixed_s': 0.0, 'near_s': 2e-5, 'temp': 100},
+    'threaded':   {'pair_ns': 70.0,  'fixed_s': 1.0, 'near_s': 1e-3, 'temp': 150},
+    'vectorized': {'pair_ns': 70.0,  'fixed_s': 0.0, 'near_s': 0.0,  'temp': 0, 'pair_bytes': 80},
+    'numba':      {'pair_ns': 30.0,  'fixed_s': 2.0, 'near_s': 0.0,  'temp': 16},
+    'nufft':      {'pair_ns': 70.0,  'fixed_s': 0.0, 'near_s': 0.0,  'temp': 100, 'point_ns': 1000.0},
+    'zoom':       {'pair_ns': 0.0,   'fixed_s': 0.0, 'near_s': 0.0,  'temp': 64,  'point_ns': 5.0},
+}
+_MODE_ALIASES = {'c': 'common', 't': 'threaded', 'v': 'vectorized', 'n': 'numba', 'f': 'nufft', 'z': 'zoom'}
+_PROPAGATION_STATS = []
+_MAX_PROPAGATION_STATS = 1000
+
+def _available_memory():
+    '''可用物理内存（字节），无法获取时返回 None'''
+    try:
+        with open('/proc/meminfo') as f:
+            for line in f:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    if platform.system() == 'Windows':
+        import ctypes
+        class MEMORYSTATUSEX(ctypes.Structure):
+            _fields_ = [('dwLength', ctypes.c_ulong), ('dwMemoryLoad', ctypes.c_ulong),
+                        ('ullTotalPhys', ctypes.c_ulonglong), ('ullAvailPhys', ctypes.c_ulonglong),
+                        ('ullTotalPageFile', ctypes.c_ulonglong), ('ullAvailPageFile', ctypes.c_ulonglong),
+                        ('ullTotalVirtual', ctypes.c_ulonglong), ('ullAvailVirtual', ctypes.c_ulonglong),
+                        ('ullAvailExtendedVirtual', ctypes.c_ulonglong)]
+        stat = MEMORYSTATUSEX()
+        stat.dwLength = ctypes.sizeof(stat)
+        if ctypes.windll.kernel32.GlobalMemoryStatusEx(ctypes.byref(stat)):
+            return int(stat.ullAvailPhys)
+    try:
+        return os.sysconf('SC_AVPHYS_PAGES') * os.sysconf('SC_PAGE_SIZE')
+    except (ValueError, OSError, AttributeError):
+        return None
+
+def _available_cores():
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+def plan_propagation(lamb, x_near, y_near, x_far, y_far, z_far, kernel='Kirchhoff', dtype='complex128',
+                     quadrature=None, memory=None, cores=None, memory_fraction=0.8, verbose=True):
     '''
+    估算各计算模式的代价并选出最快且内存放得下的模式（不做实际计算，mode='auto' 即调用此函数）
+    lamb, x_near, y_near, x_far, y_far, z_far: 与 Kirchhoff 相同
+    kernel: 'Kirchhoff' / 'RorySommerfeld_Scalar' / 'RorySommerfeld_Vector'，或 register_kernel 注册的核
+    dtype: 近场数据类型
+    memory: 可用内存（字节），默认自动检测
+    cores: 可用CPU核数，默认自动检测
+    memory_fraction: 最多使用可用内存的比例
+    verbose: 是否打印估算表
+
+    return: dict
+        'mode': 选中的计算模式（只在精确的直接求和模式中选择，'nufft'、'zoom' 为近似方法，只给出估算）
+        'pairs', 'flops': 近场点×远场点 组合数及浮点运算次数
+        'memory', 'cores', 'budget': 检测到的可用内存、核数及内存预算
+        'backends': {模式: {'available', 'reason', 'time', 'memory', 'fits'}}
+    '''
+    _numpy()
+    kernel = _get_kernel(kernel)
+    cost = {'flops': kernel.flops, 'weight': kernel.weight, 'fields': kernel.fields}
+    x_near = np.atleast_1d(np.asarray(x_near, dtype=np.float64))
+    y_near = np.atleast_1d(np.asarray(y_near, dtype=np.float64))
+    x_far, y_far, z_far = (np.atleast_1d(np.asarray(a, dtype=np.float64)) for a in (x_far, y_far, z_far))
+    nx, ny = len(x_near), len(y_near)
+    N = nx * ny
+    M = len(x_far) * len(y_far) * len(z_far)
+    pairs = N * M
+    fields = cost['fields']
+    # 求和之外的固定内存：远场网格、输出、近场（及求积权重）
+    outputs = 4 if kernel.name == 'RorySommerfeld_Vector' else fields
+    base = 24*M + 16*outputs*M + N*np.dtype(dtype).itemsize*fields + (8*N if quadrature else 0)
+    extra_time = 0.0
+    if quadrature == 'filon':
+        # 边界修正：周长上的点逐个远场点直接求和
+        extra_time = 2*(nx + ny) * M * fields * BACKEND_COSTS['common']['pair_ns'] * 2e-9
+        base += 2*(nx + ny) * min(M, 4096) * 100
+
+    memory = _available_memory() if memory is None else memory
+    cores = _available_cores() if cores is None else max(int(cores), 1)
+    budget = memory * memory_fraction if memory is not None else None
+
+    installed = {name: importlib.util.find_spec(name) is not None for name in ('numba', 'joblib', 'tqdm', 'finufft')}
+    backends = {}
+    def add(mode, time_s, mem, available=True, reason=''):
+        time_s += extra_time
+        backends[mode] = {'available': available, 'reason': reason, 'time': time_s, 'memory': int(mem),
+                          'fits': budget is None or mem <= budget}
+
+    w = cost['weight'] * 1e-9
+    c = BACKEND_COSTS['common']
+    add('common', c['fixed_s'] + N*c['near_s'] + pairs*c['pair_ns']*w, base + c['temp']*fields*M,
+        installed['tqdm'], '' if installed['tqdm'] else '需要 tqdm')
+    c = BACKEND_COSTS['threaded']
+    # joblib 进程各持有一份远场网格，父进程保存每行近场的结果
+    add('threaded', c['fixed_s'] + ny*c['near_s'] + pairs*c['pair_ns']*w/cores,
+        base + cores*(24 + c['temp']*fields)*M + ny*16*outputs*M,
+        installed['joblib'] and installed['tqdm'], '' if installed['joblib'] else '需要 joblib')
+    c = BACKEND_COSTS['vectorized']
+    add('vectorized', c['fixed_s'] + pairs*c['pair_ns']*w, base + min(pairs, VECTOR_TILE)*c['pair_bytes'])
+    c = BACKEND_COSTS['numba']
+    # 远场点很少时按近场行并行，每个线程一份部分和；核已编译过时没有编译开销
+    compile_s = 0.0 if kernel.compiled else c['fixed_s']
+    add('numba', compile_s + pairs*c['pair_ns']*w/cores, base + (cores*c['temp']*fields*M if M < 4*cores else 0),
+        installed['numba'], '' if installed['numba'] else '需要 numba')
+    # nufft：R < 2D²/λ 的远场点直接求和，其余点做一次非均匀FFT
+    c = BACKEND_COSTS['nufft']
+    xc, yc = (x_near.max() + x_near.min())/2, (y_near.max() + y_near.min())/2
+    D = np.hypot(x_near.max() - x_near.min(), y_near.max() - y_near.min())
+    X, Y, Z = np.meshgrid(x_far - xc, y_far - yc, z_far, indexing='ij')
+    M_near = int(np.count_nonzero(np.sqrt(X**2 + Y**2 + Z**2) < 2*D**2/lamb))
+    add('nufft', fields*((N + M - M_near)*c['point_ns']*1e-9 + N*M_near*c['pair_ns']*1e-9),
+        base + fields*c['temp']*(N + M) + 48*nx*min(M_near, 4096),
+        reason='Fraunhofer 近似，不参与自动选择')
+    # zoom：每个 z 平面两次 chirp-z 变换，近场和远场窗口须等间距
+    c = BACKEND_COSTS['zoom']
+    try:
+        for coords, name in ((x_near, 'x_near'), (y_near, 'y_near'), (x_far, 'x_far'), (y_far, 'y_far')):
+            _uniform_axis(coords, name)
+        zoom_ok, zoom_reason = True, 'Fresnel 近似，不参与自动选择'
+    except ValueError:
+        zoom_ok, zoom_reason = False, '需要等间距的近场和远场窗口'
+    Mx, My = len(x_far), len(y_far)
+    Lx, Ly = _fft_length(nx + Mx - 1), _fft_length(ny + My - 1)
+    add('zoom', fields*len(z_far)*(ny*Lx*np.log2(Lx) + Mx*Ly*np.log2(Ly))*c['point_ns']*1e-9,
+        base + fields*c['temp']*(ny*Lx + Mx*Ly), zoom_ok, zoom_reason)
+
+    candidates = [m for m in ('numba', 'threaded', 'vectorized', 'common') if backends[m]['available']]
+    if not candidates:
+        raise RuntimeError('没有可用的计算模式(请安装 tqdm)')
+    fitting = [m for m in candidates if backends[m]['fits']]
+    if fitting:
+        mode = min(fitting, key=lambda m: backends[m]['time'])
+    else:
+        mode = min(candidates, key=lambda m: backends[m]['memory'])
+        print(f'警告：所有计算模式的预计内存都超过预算 {budget/2**30:.1f} GB，选择内存最小的 {mode}')
+
+    plan = {'mode': mode, 'kernel': kernel.name, 'pairs': pairs, 'flops': pairs*cost['flops'],
+            'near_points': N, 'far_points': M, 'memory': memory, 'cores': cores, 'budget': budget,
+            'installed': installed, 'backends': backends}
+    if verbose:
+        mem_text = f'{memory/2**30:.1f} GB' if memory is not None else '未知'
+        print(f'{kernel.name}: {N} 近场点 × {M} 远场点 = {pairs:.3g} 组合, {plan["flops"]:.3g} FLOP, '
+              f'{cores} 核, 可用内存 {mem_text}')
+        print(f'{"模式":<12}{"预计耗时(s)":>12}{"峰值内存(MB)":>14}  说明')
+        for name, b in backends.items():
+            note = b['reason'] if not b['available'] or name in ('nufft', 'zoom') else ('' if b['fits'] else '内存不足')
+            mark = '*' if name == mode else ' '
+            print(f'{mark}{name:<11}{b["time"]:>12.3g}{b["memory"]/2**20:>14.1f}  {note}')
+    return plan
+
+def _resolve_mode(mode, kernel, lamb, x_near, y_near, x_far, y_far, z_far, dtype, quadrature):
+    '''mode='auto' 时做计划并返回 (mode, plan)，否则原样返回'''
+    if mode != 'auto':
+        return mode, None
+    plan = plan_propagation(lamb, x_near, y_near, x_far, y_far, z_far, kernel, dtype, quadrature, verbose=False)
+    print(f"Auto mode: {plan['mode']} (预计 {plan['backends'][plan['mode']]['time']:.3g} s)")
+    return plan['mode'], plan
+
+def _record_propagation(kernel, requested, mode, plan, near_points, far_points, elapsed):
+    '''记录一次传播调用，供 get_propagation_stats() 校准代价模型'''
+    mode = _MODE_ALIASES.get(mode, mode)
+    pairs = near_points * far_points
+    record = {'kernel': kernel, 'requested': requested, 'mode': mode, 'pairs': pairs,
+              'near_points': near_points, 'far_points': far_points, 'elapsed': elapsed,
+              'ns_per_pair': elapsed / pairs * 1e9 if pairs else 0.0,
+              'estimated_time': None, 'estimated_memory': None}
+    if plan is not None:
+        record['estimated_time'] = plan['backends'][mode]['time']
+        record['estimated_memory'] = plan['backends'][mode]['memory']
+        record['cores'] = plan['cores']
+    _PROPAGATION_STATS.append(record)
+    del _PROPAGATION_STATS[:-_MAX_PROPAGATION_STATS]
+
+def get_propagation_stats(clear=False):
+    '''
+    返回最近的传播调用记录（最多保留1000条）
+    每条记录: kernel, requested(传入的mode), mode(实际使用的模式), pairs, elapsed, ns_per_pair，
+    以及 mode='auto' 时的 estimated_time, estimated_memory, cores
+    clear: 返回后清空记录
+    '''
+    stats = [dict(r) for r in _PROPAGATION_STATS]
+    if clear:
+        _PROPAGATION_STATS.clear()
+    return stats
+
+# ================= 检查点与断点续算（checkpoint / resume 参数） =================
+# 远场网格按 (x_far, y_far) 分成固定的块，逐块计算；每隔 checkpoint_interval 秒把已完成的块
+# 写入 npz（先写临时文件再 os.replace，保证文件总是完整的）。分块方式、计算模式只由输入决定，
+# 续算时从文件中读取，所以续算结果与不中断的（带检查点的）计算逐位相同。
+
+def _far_tiles(shape, max_tiles):
+    '''把远场网格沿 x_far、y_far 分成不超过 max_tiles 块，return: [(sx, sy), ...]'''
+    nx, ny = shape[0], shape[1]
+    tx = max(1, min(nx, max_tiles))
+    ty = max(1, min(ny, max_tiles // tx))
+    def split(n, parts):
+        bounds = [round(i * n / parts) for i in range(parts + 1)]
+        return [slice(a, b) for a, b in zip(bounds[:-1], bounds[1:]) if b > a]
+    return list(itertools.product(split(nx, tx), split(ny, ty)))
+
+def _fingerprint(*arrays):
+    '''输入数据的摘要，防止用不同的输入续算'''
+    import hashlib
+    h = hashlib.sha1()
+    for a in arrays:
+        if a is None:
+            h.update(b'None')
+            continue
+        a = np.ascontiguousarray(a)
+        h.update(str((a.dtype.str, a.shape)).encode())
+        h.update(a.tobytes())
+    return h.hexdigest()
+
+def _save_checkpoint(path, meta, done, outputs):
+    '''原子写入：先写同目录下的临时文件，再替换目标文件'''
+    tmp = f'{path}.tmp{os.getpid()}'
+    with open(tmp, 'wb') as f:
+        np.savez(f, meta=np.array(json.dumps(meta)), done=done, **outputs)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+def _load_checkpoint(path):
+    with np.load(path, allow_pickle=False) as data:
+        meta = json.loads(str(data['meta']))
+        done = data['done'].copy()
+        outputs = {name: data[name].copy() for name in data.files if name not in ('meta', 'done')}
+    return meta, done, outputs
+
+def _run_checkpointed(kernel, lamb, x_near, y_near, near_fields, x_far, y_far, z_far, mode, eps,
+                      quadrature, checkpoint, resume, interval, max_tiles=64, names=None, symmetry=None, derive=None):
+    '''
+    带检查点的逐块计算（每块直接调用 _propagate_fields，模式信息和 get_propagation_stats() 记录对整个调用只有一次）
+    kernel: 核名称或 PropagationKernel
+    near_fields: 近场字典（按函数参数顺序），须为数组（分块读取的近场每块都要重新读取整个近场，不支持）
+    checkpoint: 检查点文件路径（写入）
+    resume: 续算的检查点文件路径（不存在时从头开始）；未指定 checkpoint 时继续写入该文件
+    names: 结果名称，默认 ['E_far']，与各近场的远场（及 derive 的结果）对应
+    symmetry: 镜像对称参数（计入输入摘要）
+    derive: 由各近场的远场块求出其余结果（如矢量核的 z 分量），见 _propagate_into
+    return: 结果字典 {名称: 远场}
+    '''
+    kernel = _get_kernel(kernel)
+    if any(_is_streamed(E) for E in near_fields.values()):
+        raise ValueError('checkpoint/resume 需要完整的近场数组，不支持分块读取的近场（可改用 out 逐块写入远场）')
+    path = checkpoint or resume
+    x_far, y_far, z_far = (np.atleast_1d(np.asarray(a)) for a in (x_far, y_far, z_far))
+    shape = (len(x_far), len(y_far), len(z_far))
+    near_fields = {name: np.asarray(E) for name, E in near_fields.items()}
+    fingerprint = _fingerprint(np.asarray(x_near), np.asarray(y_near), *near_fields.values(),
+                               x_far, y_far, z_far, np.array([lamb, eps], dtype=np.float64),
+                               np.array(str(quadrature)), *([np.array(str(symmetry))] if symmetry is not None else []))
+    tiles = _far_tiles(shape, max_tiles)
+    names = names or ['E_far']
+
+    requested, plan = mode, None
+    if resume is not None and os.path.exists(resume):
+        meta, done, outputs = _load_checkpoint(resume)
+        if meta['kernel'] != kernel.name or meta['fingerprint'] != fingerprint or len(done) != len(tiles):
+            raise ValueError(f'检查点 {resume} 与当前输入不一致，无法续算')
+        mode = meta['mode']
+        print(f'从检查点 {resume} 续算：已完成 {int(done.sum())}/{len(tiles)} 块，模式 {mode}')
+    else:
+        if resume is None and os.path.exists(checkpoint):
+            raise FileExistsError(f'检查点文件已存在: {checkpoint}（继续计算请使用 resume={checkpoint!r}）')
+        # 'auto' 在整体问题上只决定一次并写入检查点，续算时沿用同一模式
+        mode, plan = _resolve_mode(mode, kernel.name, lamb, x_near, y_near, x_far, y_far, z_far,
+                                   next(iter(near_fields.values())).dtype, quadrature)
+        meta = {'kernel': kernel.name, 'fingerprint': fingerprint, 'mode': mode, 'shape': list(shape),
+                'tiles': len(tiles)}
+        done = np.zeros(len(tiles), dtype=bool)
+        outputs = {name: np.zeros(shape, dtype=np.complex128) for name in names}
+    name = _MODE_ALIASES.get(mode, mode)
+    if name not in _MODE_MESSAGES:
+        raise ValueError('Invalid mode(请检查输入的mode参数)')
+    print(_MODE_MESSAGES[name])
+
+    t_start = time.perf_counter()
+    last_save = t_start
+    saves = 0
+    unsaved = False
+    far_points = 0
+    for i, (sx, sy) in enumerate(tiles):
+        if done[i]:
+            continue
+        results = _propagate_fields(kernel, lamb, x_near, y_near, list(near_fields.values()), x_far[sx], y_far[sy],
+                                    z_far, mode, eps, quadrature, symmetry, quiet=True)
+        if derive is not None:
+            results = results + derive(results)
+        for result_name, value in zip(names, results):
+            outputs[result_name][sx, sy] = value
+        done[i] = True
+        unsaved = True
+        far_points += len(x_far[sx]) * len(y_far[sy]) * len(z_far)
+        if time.perf_counter() - last_save >= interval:
+            _save_checkpoint(path, meta, done, outputs)
+            last_save = time.perf_counter()
+            saves += 1
+            unsaved = False
+    if unsaved or not os.path.exists(path):
+        _save_checkpoint(path, meta, done, outputs)
+        saves += 1
+    if far_points:
+        _record_propagation(kernel.name, requested, mode, plan, len(x_near)*len(y_near), far_points,
+                            time.perf_counter() - t_start)
+    print(f'计算完成，检查点已保存 {saves} 次: {int(done.sum())}/{len(tiles)} 块 -> {path}')
+    return outputs
+
+# ================= 传播引擎：可插拔的逐点核 =================
+# 核函数 func(dx, dy, z, r, k, lamb) 给出一个近场点对一个远场点的传播系数（dx, dy, z 为远场点相对近场点的位移，
+# r 为距离），远场 = Σ 近场 × 系数。同一个核函数既被 numba 编译进标量循环（'numba'），也直接作用于数组
+# （'common' / 'threaded' / 'vectorized' / 'nufft' 及 Filon 修正），所以只能使用 np.* 函数和算术运算，
+# 不能对数值做 if 判断（需要时用 np.where）。内置的三个核与 Kirchhoff 等函数共用同一套计算模式。
+
+def _kirchhoff_kernel(dx, dy, z, r, k, lamb):
+    return 1/(2j*lamb) / r * np.exp(1j*k*r) * (1 + z/r)
+
+def _rs_scalar_kernel(dx, dy, z, r, k, lamb):
+    return 1/(1j*lamb) / r * np.exp(1j*k*r) * (z/r)
+
+def _rs_vector_kernel(dx, dy, z, r, k, lamb):
+    """x/y 分量共用的系数，z 分量为 x/y 分量之和的相反数"""
+    return -1/(2*np.pi) * z / (r**2) * (1j*k - 1/r) * np.exp(1j*k*r)
+
+class PropagationKernel:
+    '''
+    逐点核及其编译结果（每个核只编译一次，之后所有调用复用）
+    name: 名称（用于计算记录和检查点）
+    func: 核函数 func(dx, dy, z, r, k, lamb)
+    flops, weight: 每个 近场点×远场点 组合的浮点运算次数与相对耗时（plan_propagation 的代价模型）
+    fields: 共用该核的近场个数（代价模型，矢量核为 2）
+    mirror: 核对 dx、dy 的镜像不变（如只通过 r 依赖 dx、dy），symmetry 参数需要
+    '''
+    def __init__(self, name, func, flops=70, weight=1.0, fields=1, mirror=False):
+        self.name = name
+        self.func = func
+        self.flops = flops
+        self.weight = weight
+        self.fields = fields
+        self.mirror = mirror
+        self._pair = None
+        self._drivers = {}
+
+    def __repr__(self):
+        return f'PropagationKernel({self.name!r})'
+
+    @property
+    def compiled(self):
+        return bool(self._drivers)
+
+    def numba_driver(self, kind):
+        '''
+        numba 求和循环（首次调用时编译）
+        kind: 'far' 按远场点并行，每个线程写自己的远场点；'rows' 按近场行分组并行（远场点很少时），每组一份部分和
+        '''
+        if kind in self._drivers:
+            return self._drivers[kind]
+        import numba as nb
+        if self._pair is None:
+            self._pair = nb.njit(fastmath=True)(self.func)
+        pair = self._pair
+
+        if kind == 'far':
+            @nb.njit(parallel=True, fastmath=True)
+            def run(x_near, y_near, F, Xf, Yf, Zf, k, lamb, out):
+                nf, ny, nx = F.shape
+                for m in nb.prange(Xf.size):
+                    z = Zf[m]
+                    for ii in range(ny):
+                        dy = Yf[m] - y_near[ii]
+                        for jj in range(nx):
+                            dx = Xf[m] - x_near[jj]
+                            r = np.sqrt(dx*dx + dy*dy + z*z)
+                            g = pair(dx, dy, z, r, k, lamb)
+                            for f in range(nf):
+                                out[f, m] += F[f, ii, jj] * g
+        else:
+            @nb.njit(parallel=True, fastmath=True)
+            def run(x_near, y_near, F, Xf, Yf, Zf, k, lamb, out):
+                parts = out.shape[0]
+                nf, ny, nx = F.shape
+                for p in nb.prange(parts):
+                    for ii in range(p*ny // parts, (p + 1)*ny // parts):
+                        for m in range(Xf.size):
+                            z = Zf[m]
+                            dy = Yf[m] - y_near[ii]
+                            for jj in range(nx):
+                                dx = Xf[m] - x_near[jj]
+                                r = np.sqrt(dx*dx + dy*dy + z*z)
+                                g = pair(dx, dy, z, r, k, lamb)
+                                for f in range(nf):
+                                    out[p, f, m] += F[f, ii, jj] * g
+        self._drivers[kind] = run
+        return run
+
+_KERNELS = {}
+
+def register_kernel(name, func, flops=70, weight=1.0, fields=1, mirror=False):
+    '''
+    注册逐点核，之后可用 propagate(name, ...) 在所有计算模式下调用
+    name: 名称
+    func: 核函数 func(dx, dy, z, r, k, lamb)，只能使用 np.* 函数和算术运算
+    flops, weight, fields: plan_propagation 的代价模型参数，见 PropagationKernel
+    mirror: 核满足 func(-dx, dy, ...) == func(dx, -dy, ...) == func(dx, dy, ...) 时设为 True，才能使用 symmetry 参数
+
+    return: PropagationKernel
+    '''
+    kernel = PropagationKernel(name, func, flops, weight, fields, mirror)
+    _KERNELS[name] = kernel
+    return kernel
+
+def _get_kernel(kernel):
+    '''按名称、PropagationKernel 或核函数取得已注册的核（未注册的核函数按函数名自动注册）'''
+    if isinstance(kernel, PropagationKernel):
+        return kernel
+    if callable(kernel):
+        for registered in _KERNELS.values():
+            if registered.func is kernel:
+                return registered
+        name = getattr(kernel, '__name__', 'kernel')
+        if name in _KERNELS:
+            name = f'{name}_{len(_KERNELS)}'
+        return register_kernel(name, kernel)
+    if kernel not in _KERNELS:
+        raise ValueError(f'Invalid kernel(可选 {tuple(_KERNELS)})')
+    return _KERNELS[kernel]
+
+register_kernel('Kirchhoff', _kirchhoff_kernel, mirror=True)
+register_kernel('RorySommerfeld_Scalar', _rs_scalar_kernel, mirror=True)
+register_kernel('RorySommerfeld_Vector', _rs_vector_kernel, flops=110, weight=1.2, fields=2, mirror=True)
+
+# vectorized 模式每块的 近场点×远场点 组合数（每个组合约 pair_bytes 字节临时内存）
+VECTOR_TILE = 1 << 20
+
+_MODE_MESSAGES = {
+    'common': 'Using normal mode...',
+    'threaded': 'Using joblib threaded mode...',
+    'vectorized': 'Using vectorized mode...',
+    'numba': 'Using numba mode...(numba mode has no progress bar)',
+    'nufft': 'Using NUFFT (Fraunhofer) mode...',
+    'zoom': 'Using chirp-z zoom (Fresnel) mode...',
+}
+
+# 近似方法：对整个近场列表一次计算，接口为 (kernel, lamb, x_near, y_near, E_nears, X_far, Y_far, Z_far, eps)
+_FIELD_MODES = {'nufft': _fraunhofer_propagate, 'zoom': _zoom_propagate}
+
+def _backend_common(kernel, k, lamb, x_near, y_near, F, Xf, Yf, Zf):
+    '''普通循环：逐个近场点对整个远场数组求和'''
     from tqdm import tqdm
+    out = np.zeros((len(F), Xf.size), dtype=np.complex128)
+    for ii in tqdm(range(len(y_near))):
+        dy = Yf - y_near[ii]
+        for jj in range(len(x_near)):
+            dx = Xf - x_near[jj]
+            r = np.sqrt(dx**2 + dy**2 + Zf**2)
+            g = kernel.func(dx, dy, Zf, r, k, lamb)
+            for f in range(len(F)):
+                out[f] += F[f, ii, jj] * g
+    return out
+
+def _backend_threaded(kernel, k, lamb, x_near, y_near, F, Xf, Yf, Zf):
+    '''joblib 进程池：每行近场一个任务'''
+    from tqdm import tqdm
+    from joblib import Parallel, delayed
+    func = kernel.func
+    def compute_row(ii):
+        """计算单行的远场贡献"""
+        _numpy()   # 子进程中核函数所在模块的 np 尚未绑定
+        row = np.zeros((len(F), Xf.size), dtype=np.complex128)
+        dy = Yf - y_near[ii]
+        for jj in range(len(x_near)):
+            dx = Xf - x_near[jj]
+            r = np.sqrt(dx**2 + dy**2 + Zf**2)
+            g = func(dx, dy, Zf, r, k, lamb)
+            for f in range(len(F)):
+                row[f] += F[f, ii, jj] * g
+        return row
+
+    results = Parallel(n_jobs=-1)(delayed(compute_row)(ii) for ii in tqdm(range(len(y_near))))
+    out = np.zeros((len(F), Xf.size), dtype=np.complex128)
+    for row in results:
+        out += row
+    return out
+
+def _backend_vectorized(kernel, k, lamb, x_near, y_near, F, Xf, Yf, Zf, tile=None):
+    '''分块矢量化：每块 近场点×远场点 的系数矩阵与近场做矩阵乘法，临时内存不超过 tile 个组合'''
+    tile = tile or VECTOR_TILE
+    X_near, Y_near = np.meshgrid(x_near, y_near)
+    xn, yn = X_near.ravel(), Y_near.ravel()
+    Fn = F.reshape(len(F), -1)
+    far_chunk = min(Xf.size, tile)
+    near_chunk = max(1, tile // far_chunk)
+    out = np.zeros((len(F), Xf.size), dtype=np.complex128)
+    for m0 in range(0, Xf.size, far_chunk):
+        ms = slice(m0, m0 + far_chunk)
+        for n0 in range(0, xn.size, near_chunk):
+            ns = slice(n0, n0 + near_chunk)
+            dx = Xf[ms] - xn[ns, np.newaxis]
+            dy = Yf[ms] - yn[ns, np.newaxis]
+            z = Zf[ms]
+            r = np.sqrt(dx**2 + dy**2 + z**2)
+            G = np.broadcast_to(kernel.func(dx, dy, z, r, k, lamb), r.shape)
+            out[:, ms] += Fn[:, ns] @ G
+    return out
 
-    # 确保远场坐标为一维数组
-    x_far = np.asarray(x_far)
-    y_far = np.asarray(y_far)
-    z_far = np.asarray(z_far)
-    if x_far.ndim == 0: x_far = x_far[np.newaxis]
-    if y_far.ndim == 0: y_far = y_far[np.newaxis]
-    if z_far.ndim == 0: z_far = z_far[np.newaxis]
+def _backend_numba(kernel, k, lamb, x_near, y_near, F, Xf, Yf, Zf):
+    '''numba 并行循环：远场点足够多时按远场点并行（无需归约），否则按近场行分组'''
+    import numba as nb
+    threads = nb.get_num_threads()
+    if Xf.size >= 4 * threads:
+        out = np.zeros((len(F), Xf.size), dtype=np.complex128)
+        kernel.numba_driver('far')(x_near, y_near, F, Xf, Yf, Zf, k, lamb, out)
+        return out
+    parts = max(1, min(threads, len(y_near)))
+    partial = np.zeros((parts, len(F), Xf.size), dtype=np.complex128)
+    kernel.numba_driver('rows')(x_near, y_near, F, Xf, Yf, Zf, k, lamb, partial)
+    return partial.sum(axis=0)
 
+_BACKENDS = {
+    'common': _backend_common,
+    'threaded': _backend_threaded,
+    'vectorized': _backend_vectorized,
+    'numba': _backend_numba,
+}
+
+def _is_streamed(E):
+    '''分块读取的近场（如 FieldStore.field() 的视图）：有 shape、dtype 和 iter_blocks()'''
+    return hasattr(E, 'iter_blocks')
+
+def _edge_band(E, width=2):
+    '''只读取分块近场靠近边界的 width 行/列，其余为 0（Filon 修正只用到边界点及其朝内的相邻点）'''
+    ny, nx = E.shape
+    band = np.zeros((ny, nx), dtype=np.complex128)
+    w_y, w_x = min(width, ny), min(width, nx)
+    band[:w_y] = E[0:w_y, 0:nx]
+    band[ny - w_y:] = E[ny - w_y:ny, 0:nx]
+    band[:, :w_x] = E[0:ny, 0:w_x]
+    band[:, nx - w_x:] = E[0:ny, nx - w_x:nx]
+    return band
+
+def _propagate_streamed(kernel, name, lamb, x_near, y_near, E_raw, W, X_far, Y_far, Z_far, eps):
+    '''
+    分块近场：按存储的块逐块读取，各块对远场的贡献相加（衍射积分对近场是线性的），近场不需要整体载入内存
+    同时传入的普通数组按相同的块切片
+    'nufft' 的参考中心和 Fraunhofer 判据取整个近场的范围，结果与整体计算相同；
+    'zoom' 的近似常数按各块的近场拟合，结果在该模式的近似误差范围内与块的划分有关
+    '''
     k = 2 * np.pi / lamb
+    aperture = (x_near.min(), x_near.max(), y_near.min(), y_near.max())
+    lead = next(E for E in E_raw if _is_streamed(E))
+    results = [np.zeros(X_far.shape, dtype=np.complex128) for _ in E_raw]
+    Xf, Yf, Zf = X_far.ravel(), Y_far.ravel(), Z_far.ravel()
+    for (rs, cs), block in lead.iter_blocks():
+        blocks = [block if E is lead else np.asarray(E[rs, cs]) for E in E_raw]
+        F = np.stack([b if W is None else b * W[rs, cs] for b in blocks]).astype(np.complex128)
+        if name == 'nufft':
+            parts = _fraunhofer_propagate(kernel, lamb, x_near[cs], y_near[rs], list(F), X_far, Y_far, Z_far, eps,
+                                          aperture=aperture)
+        elif name in _FIELD_MODES:
+            parts = _FIELD_MODES[name](kernel, lamb, x_near[cs], y_near[rs], list(F), X_far, Y_far, Z_far, eps)
+        else:
+            out = _BACKENDS[name](kernel, float(k), float(lamb), x_near[cs], y_near[rs], F, Xf, Yf, Zf)
+            parts = [o.reshape(X_far.shape) for o in out]
+        for total, part in zip(results, parts):
+            total += part
+    return results
+
+def _propagate_fields(kernel, lamb, x_near, y_near, E_nears, x_far, y_far, z_far, mode, eps, quadrature,
+                      symmetry=None, quiet=False):
+    '''
+    所有传播函数共用的计算流程：选择模式、求积权重、按模式求和、Filon 修正、记录耗时
+    E_nears: 共用同一个核的近场列表（数组，或分块读取的近场，见 _propagate_streamed）
+    symmetry: 镜像对称，见 _propagate_symmetric
+    quiet: 逐块计算时使用，不打印模式、不写入 get_propagation_stats()（由调用方对整个调用打印和记录一次）
+    return: 与 E_nears 对应的远场列表，形状 (len(x_far), len(y_far), len(z_far))
+    '''
+    if symmetry is not None:
+        return _propagate_symmetric(kernel, lamb, x_near, y_near, E_nears, x_far, y_far, z_far, mode, eps,
+                                    quadrature, symmetry, quiet)
+    kernel = _get_kernel(kernel)
+    t_start = time.perf_counter()
+    requested = mode
+    E_raw = [E if _is_streamed(E) else np.asarray(E) for E in E_nears]
+    mode, plan = _resolve_mode(mode, kernel.name, lamb, x_near, y_near, x_far, y_far, z_far,
+                               E_raw[0].dtype, quadrature)
+    name = _MODE_ALIASES.get(mode, mode)
+    if name not in _MODE_MESSAGES:
+        raise ValueError('Invalid mode(请检查输入的mode参数)')
+
+    k = 2 * np.pi / lamb
+    x_near = np.ascontiguousarray(x_near, dtype=np.float64)
+    y_near = np.ascontiguousarray(y_near, dtype=np.float64)
     # 生成远场网格（使用 'ij' 索引）
     X_far, Y_far, Z_far = np.meshgrid(x_far, y_far, z_far, indexing='ij')
-    E_far = np.zeros_like(X_far, dtype=np.complex128)
-    if mode == 'common' or mode == 'c':
-        print('Using normal mode...')
-        # 直接积分计算
-        E_far = np.zeros_like(X_far, dtype=complex)
-        for ii in tqdm(range(len(y_near))):
-            for jj in range(len(x_near)):
-                def E(r1, r2, x, y, z):
-                    r = np.sqrt((x - r1)**2 + (y - r2)**2 + z**2)
-                    return (1/(2j*lamb) * E_near[ii,jj]/r * 
-                        np.exp(1j*k*r) * (1 + z/r))
-                
-                E_far += E(x_near[jj], y_near[ii], X_far, Y_far, Z_far)
-
-    elif mode == 'threaded' or mode == 't':
-        print('Using joblib threaded mode...')
-        from joblib import Parallel, delayed
-        # 使用joblib多线程实现
-        def compute_row(ii):
-            """计算单行的远场贡献"""
-            row_result = np.zeros_like(X_far, dtype=np.complex128)
-            for jj in range(len(x_near)):
-                r = np.sqrt((X_far - x_near[jj])**2 + 
-                            (Y_far - y_near[ii])**2 + 
-                            Z_far**2)
-                row_result += (1/(2j*lamb) * E_near[ii,jj]/r * 
-                                np.exp(1j*k*r) * (1 + Z_far/r))
-            return row_result
-        
-        # 并行执行计算
-        results = Parallel(n_jobs=-1)(
-            delayed(compute_row)(ii) 
-            for ii in tqdm(range(len(y_near)))
-        )
-        
-        # 合并结果
-        for row_result in results:
-            E_far += row_result
-
-    elif mode == 'vectorized' or mode == 'v':
-        print('Using vectorized mode...')
-        # 生成近场网格
-        X_near, Y_near = np.meshgrid(x_near, y_near, indexing='ij')
-
-        # 计算距离
-        dx = X_far[np.newaxis, :, :, np.newaxis] - X_near[:, :, np.newaxis, np.newaxis]
-        dy = Y_far[np.newaxis, :, :, np.newaxis] - Y_near[:, :, np.newaxis, np.newaxis]
-        dz = Z_far[np.newaxis, np.newaxis, :, :]  # 形状为 (1,1,len(y_far),len(z_far))
-        r = np.sqrt(dx**2 + dy**2 + dz**2)
-
-        # 计算标量因子
-        factor = (1/(2j*lamb)) * E_near[:, :, np.newaxis, np.newaxis] / r * np.exp(1j*k*r) * (1 + dz/r)
-        
-        # 累加所有近场点贡献
-        E_far = np.sum(factor, axis=(0, 1))
-    
-    elif mode == 'numba' or mode == 'n':
-        print('Using numba mode...(numba mode has no progress bar)')
-        # 使用numba加速循环
-        # @jit(nopython=True, fastmath=True)  # 更高精度
-        # @jit(nopython=True, parallel=True)  # 并行加速
-        import numba as nb
-        # Numba 加速的积分内核（不含 tqdm）
-        # 使用 Numba 并行加速的积分内核
-        @nb.njit(parallel=True, fastmath=True)
-        def compute_row_parallel(y_len, x_len, x_near, y_near, E_near, X_far, Y_far, Z_far, lamb, k, E_far):
-            for ii in nb.prange(y_len):  # prange 启用多线程
-                for jj in range(x_len):
-                    # 原始积分计算逻辑
-                    r = np.sqrt((X_far - x_near[jj])**2 + 
-                                (Y_far - y_near[ii])**2 + 
-                                Z_far**2)
-                    E_far += (1/(2j*lamb) * E_near[ii,jj]/r * 
-                            np.exp(1j*k*r) * (1 + Z_far/r))
-            return E_far
-        
-        # 调用 Numba 并行函数
-        E_far = compute_row_parallel(len(y_near), len(x_near), x_near, y_near, E_near, X_far, Y_far, Z_far, lamb, k, E_far)
+    for E in E_raw:
+        if tuple(E.shape) != (len(y_near), len(x_near)):
+            raise ValueError(f'近场形状 {tuple(E.shape)} 与坐标不一致，应为 (len(y_near), len(x_near)) = '
+                             f'({len(y_near)}, {len(x_near)})')
+    # 求积权重预先乘到近场上，所有计算模式共用
+    W = _quadrature_weights(quadrature, x_near, y_near)
+
+    if not quiet:
+        print(_MODE_MESSAGES[name])
+    if any(_is_streamed(E) for E in E_raw):
+        results = _propagate_streamed(kernel, name, lamb, x_near, y_near, E_raw, W, X_far, Y_far, Z_far, eps)
+        if quadrature == 'filon':
+            E_raw = [_edge_band(E) if _is_streamed(E) else E for E in E_raw]
+    else:
+        F = np.stack([E if W is None else E * W for E in E_raw]).astype(np.complex128)
+        if name in _FIELD_MODES:
+            results = _FIELD_MODES[name](kernel, lamb, x_near, y_near, list(F), X_far, Y_far, Z_far, eps)
+        else:
+            Xf, Yf, Zf = X_far.ravel(), Y_far.ravel(), Z_far.ravel()
+            out = _BACKENDS[name](kernel, float(k), float(lamb), x_near, y_near, F, Xf, Yf, Zf)
+            results = [o.reshape(X_far.shape) for o in out]
+
+    if quadrature == 'filon':
+        results = [E_far + _filon_correction(kernel, lamb, x_near, y_near, E, W, X_far, Y_far, Z_far)
+                   for E_far, E in zip(results, E_raw)]
+    if not quiet:
+        _record_propagation(kernel.name, requested, mode, plan, len(x_near)*len(y_near), X_far.size,
+                            time.perf_counter() - t_start)
+    return results
 
+# ================= 镜像对称（symmetry 参数） =================
+# 近场关于网格中线 x = c 对称或反对称（E(2c - x) = ±E(x)）且核对镜像不变时，
+# 远场 E_far(X) = A(X) ± A(2c - X)，A 为只对一半近场求和的结果（对称轴上的点权重 1/2）。
+# 远场网格也关于 c 对称时 A 只需在原网格上计算，每个对称方向省去一半的 近场点×远场点 组合；
+# 镜像点不在远场网格上时追加计算，结果仍然正确。
+
+SYMMETRY_TOL = 1e-6
+_PARITY = {None: 0, 'even': 1, 'odd': -1}
+
+def _mirror_center(coords, tol=SYMMETRY_TOL):
+    '''坐标关于首尾中点对称（容差 tol × 步长）时返回中点，否则返回 None'''
+    coords = np.atleast_1d(np.asarray(coords, dtype=np.float64))
+    if coords.size < 2:
+        return None
+    c = (coords[0] + coords[-1]) / 2
+    pitch = abs(coords[-1] - coords[0]) / (coords.size - 1)
+    if pitch == 0 or np.max(np.abs(coords + coords[::-1] - 2*c)) > tol * pitch:
+        return None
+    return c
+
+def detect_symmetry(x_near, y_near, E_near, tol=SYMMETRY_TOL):
+    '''
+    检测近场关于网格中线的镜像对称性
+    tol: 相对容差，||E ∓ E镜像|| <= tol·||E|| 时认为对称/反对称；网格坐标的对称容差为 tol × 步长
+
+    return: (x 方向, y 方向)，各为 'even'（对称）、'odd'（反对称）或 None，可直接作为 symmetry 参数
+    '''
+    _numpy()
+    E = np.asarray(E_near)
+    norm = np.linalg.norm(E)
+    result = []
+    for coords, axis in ((x_near, 1), (y_near, 0)):
+        parity = None
+        if _mirror_center(coords, tol) is not None:
+            flipped = np.flip(E, axis)
+            if np.linalg.norm(E - flipped) <= tol * norm:
+                parity = 'even'
+            elif np.linalg.norm(E + flipped) <= tol * norm:
+                parity = 'odd'
+        result.append(parity)
+    return tuple(result)
+
+def _parse_symmetry(symmetry, x_near, y_near, fields):
+    '''symmetry 参数 -> 每个近场的 (x 方向符号, y 方向符号)，符号为 1/-1，0 表示不对称'''
+    if isinstance(symmetry, str):
+        if symmetry != 'auto':
+            raise ValueError("Invalid symmetry(可选 'auto'、(x 方向, y 方向) 或每个近场一组)")
+        specs = [detect_symmetry(x_near, y_near, E) for E in fields]
+    elif len(symmetry) and isinstance(symmetry[0], (tuple, list)):
+        specs = [tuple(spec) for spec in symmetry]
     else:
+        specs = [tuple(symmetry)] * len(fields)
+    if len(specs) != len(fields) or any(len(spec) != 2 for spec in specs):
+        raise ValueError(f'symmetry 应为 (x 方向, y 方向) 或 {len(fields)} 组 (x 方向, y 方向)')
+    for spec in specs:
+        for parity in spec:
+            if parity not in _PARITY:
+                raise ValueError(f"Invalid symmetry {parity!r}(可选 'even'、'odd'、None)")
+    return [(_PARITY[sx], _PARITY[sy]) for sx, sy in specs]
+
+def _mirror_index(coords, c, tol=SYMMETRY_TOL):
+    '''
+    远场坐标的镜像 2c - x 在坐标中的位置，不在网格上的镜像点追加到末尾
+    return: (扩展后的坐标, 各点镜像的下标)
+    '''
+    coords = np.asarray(coords, dtype=np.float64)
+    n = coords.size
+    target = 2*c - coords
+    scale = np.ptp(coords) / (n - 1) if n > 1 else max(abs(coords[0]), abs(c))
+    order = np.argsort(coords, kind='stable')
+    ordered = coords[order]
+    pos = np.clip(np.searchsorted(ordered, target), 1, max(n - 1, 1)) if n > 1 else np.zeros(n, dtype=np.int64)
+    if n > 1:
+        pos = np.where(np.abs(ordered[pos - 1] - target) <= np.abs(ordered[pos] - target), pos - 1, pos)
+    match = np.abs(ordered[pos] - target) <= tol * scale
+    index = np.where(match, order[pos], -1)
+    index[~match] = n + np.arange(np.count_nonzero(~match))
+    return np.concatenate([coords, target[~match]]), index
+
+def _propagate_symmetric(kernel, lamb, x_near, y_near, E_nears, x_far, y_far, z_far, mode, eps, quadrature, symmetry,
+                         quiet=False):
+    '''
+    利用镜像对称：近场折叠到一半（一个象限），各点权重合并，只在不重复的远场点上求和，再按奇偶性镜像叠加
+    symmetry: 'auto'（detect_symmetry 自动检测）、(x 方向, y 方向) 或每个近场一组；
+              只有所有近场在某方向都（反）对称时才折叠该方向。折叠时近场取对称部分 (E ± E镜像)/2
+    '''
+    kernel = _get_kernel(kernel)
+    if any(_is_streamed(E) for E in E_nears):
+        raise ValueError('symmetry 需要完整的近场数组，不支持分块读取的近场')
+    E_raw = [np.asarray(E) for E in E_nears]
+    x_near = np.ascontiguousarray(x_near, dtype=np.float64)
+    y_near = np.ascontiguousarray(y_near, dtype=np.float64)
+    x_far, y_far, z_far = _far_axes(x_far, y_far, z_far)
+    parities = _parse_symmetry(symmetry, x_near, y_near, E_raw)
+    # 求积权重先乘到近场上，折叠后的近场不再使用求积规则
+    W = _quadrature_weights(quadrature, x_near, y_near)
+    folds = []
+    for axis, coords in enumerate((x_near, y_near)):
+        signs = [p[axis] for p in parities]
+        center = _mirror_center(coords) if all(signs) else None
+        if all(signs) and center is None:
+            raise ValueError(f'{"xy"[axis]}_near 不关于中点对称，不能在该方向使用 symmetry')
+        if all(signs) and not kernel.mirror:
+            raise ValueError(f'核 {kernel.name} 未声明镜像不变（register_kernel(..., mirror=True)），不能使用 symmetry')
+        # 权重不对称时（如点数为偶数的 simpson）该方向不折叠，保证结果不变
+        if center is not None and W is not None and not np.allclose(W, np.flip(W, 1 - axis), rtol=1e-12, atol=0):
+            center = None
+        folds.append((center, np.array(signs)) if center is not None else None)
+    if folds == [None, None]:
+        return _propagate_fields(kernel, lamb, x_near, y_near, E_raw, x_far, y_far, z_far, mode, eps, quadrature,
+                                 quiet=quiet)
+
+    for E in E_raw:
+        if E.shape != (len(y_near), len(x_near)):
+            raise ValueError(f'近场形状 {E.shape} 与坐标不一致，应为 (len(y_near), len(x_near)) = '
+                             f'({len(y_near)}, {len(x_near)})')
+    F = np.stack([E if W is None else E * W for E in E_raw]).astype(np.complex128)
+    xs, ys, far = x_near, y_near, [x_far, y_far]
+    mirror = [None, None]
+    for axis, fold in enumerate(folds):
+        if fold is None:
+            continue
+        center, signs = fold
+        n = F.shape[2 - axis]
+        keep = np.arange(n // 2, n)
+        partner = n - 1 - keep
+        weight = np.where(keep == partner, 0.5, 1.0)
+        s = signs.reshape(-1, 1, 1)
+        if axis == 0:
+            F = (F[:, :, keep] + s * F[:, :, partner]) / 2 * weight
+            xs = x_near[keep]
+        else:
+            F = (F[:, keep, :] + s * F[:, partner, :]) / 2 * weight[:, np.newaxis]
+            ys = y_near[keep]
+        far[axis], mirror[axis] = _mirror_index(far[axis], center)
+
+    A = _propagate_fields(kernel, lamb, xs, ys, list(F), far[0], far[1], z_far, mode, eps, None, quiet=quiet)
+    nx, ny = len(x_far), len(y_far)
+    results = []
+    for f, part in enumerate(A):
+        E_far = part[:nx, :ny].copy()
+        sx = folds[0][1][f] if folds[0] else 0
+        sy = folds[1][1][f] if folds[1] else 0
+        if sx:
+            E_far += sx * part[mirror[0], :ny]
+        if sy:
+            E_far += sy * part[:nx][:, mirror[1]]
+        if sx and sy:
+            E_far += sx * sy * part[mirror[0]][:, mirror[1]]
+        results.append(E_far)
+    if quadrature == 'filon':
+        X_far, Y_far, Z_far = np.meshgrid(x_far, y_far, z_far, indexing='ij')
+        results = [E_far + _filon_correction(kernel, lamb, x_near, y_near, E, W, X_far, Y_far, Z_far)
+                   for E_far, E in zip(results, E_raw)]
+    return results
+
+# out 参数：远场按块计算并写入，每块约 OUTPUT_TILE 个远场点
+OUTPUT_TILE = 1 << 18
+
+def _output_tiles(shape, chunks, tile_points):
+    '''沿 x_far、y_far 分块，块边界与 out 的存储块（chunks）对齐，避免写入时读-改-写'''
+    nx, ny, nz = shape
+    bx, by = (min(chunks[0], nx), min(chunks[1], ny)) if chunks else (1, 1)
+    while by < ny and 2*bx*by*nz <= tile_points:
+        by *= 2
+    while bx < nx and 2*bx*by*nz <= tile_points:
+        bx *= 2
+    return [(slice(x0, min(x0 + bx, nx)), slice(y0, min(y0 + by, ny)))
+            for x0 in range(0, nx, bx) for y0 in range(0, ny, by)]
+
+def _check_out(checkpoint, resume):
+    if checkpoint is not None or resume is not None:
+        raise ValueError('out 不能与 checkpoint/resume 同时使用')
+
+def _propagate_into(outs, kernel, lamb, x_near, y_near, fields, x_far, y_far, z_far, mode, eps, quadrature,
+                    symmetry=None, derive=None):
+    '''
+    把远场逐块写入 outs（FieldStore、np.memmap 等支持 out[sx, sy, :] = 值 的对象），内存中只保留一块远场
+    derive: 由各近场的远场块求出其余写入目标的值（如矢量核的 z 分量），写入 outs 中排在后面的目标
+    return: outs
+    '''
+    shape = (len(x_far), len(y_far), len(z_far))
+    for out in outs:
+        if tuple(out.shape) != shape:
+            raise ValueError(f'out 的形状 {tuple(out.shape)} 应为 (len(x_far), len(y_far), len(z_far)) = {shape}')
+    # 'auto' 在整体问题上只决定一次，各块沿用同一模式；模式信息和 get_propagation_stats() 记录对整个调用只有一次
+    kernel = _get_kernel(kernel)
+    requested = mode
+    mode, plan = _resolve_mode(mode, kernel.name, lamb, x_near, y_near, x_far, y_far, z_far,
+                               fields[0].dtype if _is_streamed(fields[0]) else np.asarray(fields[0]).dtype, quadrature)
+    name = _MODE_ALIASES.get(mode, mode)
+    if name not in _MODE_MESSAGES:
         raise ValueError('Invalid mode(请检查输入的mode参数)')
-    return E_far
+    print(_MODE_MESSAGES[name])
+    t_start = time.perf_counter()
+    for sx, sy in _output_tiles(shape, getattr(outs[0], 'chunks', None), OUTPUT_TILE):
+        results = _propagate_fields(kernel, lamb, x_near, y_near, fields, x_far[sx], y_far[sy], z_far,
+                                    mode, eps, quadrature, symmetry, quiet=True)
+        if derive is not None:
+            results = results + derive(results)
+        for out, value in zip(outs, results):
+            out[sx, sy, :] = value
+    for out in outs:
+        if hasattr(out, 'flush'):
+            out.flush()
+    _record_propagation(kernel.name, requested, mode, plan, len(x_near)*len(y_near), int(np.prod(shape)),
+                        time.perf_counter() - t_start)
+    return outs
+
+class _ComponentOut:
+    '''带分量维度的 out（形状 (3, nx, ny, nz)）中的一个分量，供 _propagate_into 逐块写入 store[index, sx, sy, :]'''
+    def __init__(self, store, index):
+        self.store = store
+        self.index = index
+        self.shape = tuple(store.shape[1:])
+        chunks = getattr(store, 'chunks', None)
+        self.chunks = tuple(chunks[1:]) if chunks else None
+
+    def __setitem__(self, key, value):
+        self.store[(self.index,) + key] = value
+
+def _vector_outs(out):
+    '''RorySommerfeld_Vector 的 out：(out_x, out_y, out_z) 或第一维为 3 个分量的单个目标'''
+    if isinstance(out, (list, tuple)):
+        if len(out) != 3:
+            raise ValueError(f'out 应为 (out_x, out_y, out_z) 三个目标，实际为 {len(out)} 个')
+        return list(out)
+    if len(out.shape) != 4 or out.shape[0] != 3:
+        raise ValueError(f'out 的形状 {tuple(out.shape)} 应为 (3, len(x_far), len(y_far), len(z_far))')
+    return [_ComponentOut(out, i) for i in range(3)]
+
+def _far_axes(x_far, y_far, z_far):
+    '''确保远场坐标为一维数组'''
+    return tuple(np.atleast_1d(np.asarray(a)) for a in (x_far, y_far, z_far))
+
+def propagate(kernel, lamb, x_near, y_near, E_near, x_far, y_far, z_far, mode='numba', eps=1e-6, quadrature=None,
+              checkpoint=None, resume=None, checkpoint_interval=60.0, out=None, symmetry=None):
+    '''
+    用任意逐点核计算远场，所有计算模式（包括 'auto'、求积规则、检查点）与 Kirchhoff 相同
+    kernel: register_kernel 注册的名称或返回值，或核函数 func(dx, dy, z, r, k, lamb)（自动注册）
+    E_near: 近场二维数组 [y, x]（或 FieldStore.field() 等分块读取的近场），或共用同一个核的多个近场组成的列表
+    out: 远场写入的目标（E_near 为列表时为同样长度的列表），见 Kirchhoff
+    symmetry: 镜像对称，见 Kirchhoff；E_near 为列表时也可以每个近场一组，核需要以 mirror=True 注册
+    其余参数与 Kirchhoff 相同；'nufft'、'zoom' 模式假设核为 慢变振幅 × exp(ikr)
+
+    return: 远场 np.ndarray(len(x_far), len(y_far), len(z_far))，E_near 为列表时返回列表
 
-def RorySommerfeld_Scalar(lamb, x_near, y_near, E_near, x_far, y_far, z_far, mode='numba'):
+    例：倾斜平面的 Fresnel-Kirchhoff 倾斜因子
+        def tilted(dx, dy, z, r, k, lamb):
+            return 1/(2j*lamb) / r * np.exp(1j*k*r) * (np.cos(0.1) + (z*np.cos(0.1) + dx*np.sin(0.1))/r)
+        E_far = propagate(tilted, lamb, x_near, y_near, E_near, x_far, y_far, z_far)
+    '''
+    _numpy()
+    kernel = _get_kernel(kernel)
+    single = not isinstance(E_near, (list, tuple))
+    fields = [E_near] if single else list(E_near)
+    x_far, y_far, z_far = _far_axes(x_far, y_far, z_far)
+    if out is not None:
+        _check_out(checkpoint, resume)
+        outs = _propagate_into([out] if single else list(out), kernel, lamb, x_near, y_near, fields,
+                               x_far, y_far, z_far, mode, eps, quadrature, symmetry)
+        return outs[0] if single else outs
+    if checkpoint is not None or resume is not None:
+        names = ['E_far'] if single else [f'E_far_{i}' for i in range(len(fields))]
+        out = _run_checkpointed(kernel, lamb, x_near, y_near,
+                                {f'E_near_{i}': E for i, E in enumerate(fields)}, x_far, y_far, z_far,
+                                mode, eps, quadrature, checkpoint, resume, checkpoint_interval, names=names,
+                                symmetry=symmetry)
+        results = [out[name] for name in names]
+    else:
+        results = _propagate_fields(kernel, lamb, x_near, y_near, fields, x_far, y_far, z_far, mode, eps, quadrature,
+                                    symmetry)
+    return results[0] if single else results
+
+def Kirchhoff(lamb, x_near, y_near, E_near, x_far, y_far, z_far, mode='numba', eps=1e-6, quadrature=None,
+              checkpoint=None, resume=None, checkpoint_interval=60.0, out=None, symmetry=None):
     '''
     lamb: 波长
     x_near, y_near: 近场位置数据，x_near和y_near应当是一维ndarry数组
-    E_near: 近场的电场数据，E_near应当是二维ndarry数组
+    E_near: 近场的电场数据，E_near应当是二维ndarry数组；也可以是 FieldStore.field() 等分块读取的近场（逐块读取、流式计算，
+        结果与直接传入数组相同；'zoom' 模式的近似常数按各块拟合，结果在该模式的近似误差内与块的划分有关）
     x_far, y_far, z_far: 远场的位置数据，应当是一维数据或者数值
     mode: 计算模式
         'common'('c')，   : 普通循环计算模式，兼容所有平台，最稳定，但速度最慢
         'threaded'('t')   : 多线程计算模式，能够吃满CPU资源，测试仅windows下可用，需要joblib库
-        'vectorized'('v') : 矢量化计算模式，计算小数据非常快，但大数据会容易爆内存(目前还没写好)
+        'vectorized'('v') : 矢量化计算模式，分块计算（每块 VECTOR_TILE 个 近场点×远场点 组合），计算小数据非常快
         'numba'('n')      : numba计算模式，计算速度非常快，兼容windows和linux，需要numba库，**推荐使用**
+        'nufft'('f')      : Fraunhofer远场模式，近场/远场位置可以任意非均匀，用非均匀FFT计算，复杂度O((N+M)log(N+M))，
+                            距离小于2D²/λ的远场点自动退回直接求和；安装finufft库时自动使用
+        'zoom'('z')       : 缩放窗口模式，Fresnel近似下用chirp-z变换计算矩形远场窗口，窗口位置和采样间隔任意
+                            （如焦点附近远小于近场步长的采样），每个z平面O(N log N)；近场和远场窗口的x、y须等间距
+        'auto'            : 按 plan_propagation() 的估算自动选择内存放得下的最快模式（不会选择 'nufft'、'zoom'），
+                            选择结果记录在 get_propagation_stats() 中
+    eps: 'nufft'模式的相对精度
+    checkpoint: 检查点文件路径（.npz），远场按块计算，每隔 checkpoint_interval 秒保存已完成的块（近场须为数组，不支持分块读取的近场）
+    resume: 从该检查点文件续算（文件不存在时从头开始并写入该文件），结果与不中断的计算逐位相同
+    checkpoint_interval: 保存检查点的间隔（秒）
+    quadrature: 求积规则，None(直接对采样点求和)/'trapezoid'/'simpson'/'filon'
+        使用求积规则时结果乘了面元（即衍射积分本身），相同精度下所需的近场采样点更少：
+        'simpson' 适合平缓变化的近场；'filon' 修正孔径边缘的振荡误差，适合边缘处场不为零、目标方向角度较大的情况
+    out: 远场写入的目标，形状 (len(x_far), len(y_far), len(z_far))，如 FieldStore.create(...) 或 np.memmap；
+        远场按块（与 out 的存储块对齐）计算并写入，内存中只保留一块，返回 out
+    symmetry: 镜像对称，None（不使用）/ 'auto'（按 detect_symmetry 自动检测）/ (x 方向, y 方向)，各为 'even'、'odd' 或 None
+        近场关于网格中线对称（'even'）或反对称（'odd'）时只对一半（两个方向都对称时为四分之一）近场求和，
+        远场网格也关于该中线对称时每个方向节省一半计算量，结果与不使用时相同（近场取对称部分）
 
     return: 远场电场数据np.ndarray(len(x_far),len(y_far),len(z_far))
     '''
-    from tqdm import tqdm
-
-    # 确保远场坐标为一维数组
-    x_far = np.asarray(x_far)
-    y_far = np.asarray(y_far)
-    z_far = np.asarray(z_far)
-    if x_far.ndim == 0: x_far = x_far[np.newaxis]
-    if y_far.ndim == 0: y_far = y_far[np.newaxis]
-    if z_far.ndim == 0: z_far = z_far[np.newaxis]
+    _numpy()
+    x_far, y_far, z_far = _far_axes(x_far, y_far, z_far)
+    if out is not None:
+        _check_out(checkpoint, resume)
+        return _propagate_into([out], 'Kirchhoff', lamb, x_near, y_near, [E_near], x_far, y_far, z_far,
+                               mode, eps, quadrature, symmetry)[0]
+    if checkpoint is not None or resume is not None:
+        result = _run_checkpointed('Kirchhoff', lamb, x_near, y_near, {'E_near': E_near}, x_far, y_far, z_far,
+                                   mode, eps, quadrature, checkpoint, resume, checkpoint_interval, symmetry=symmetry)
+        return result['E_far']
+    E_far, = _propagate_fields('Kirchhoff', lamb, x_near, y_near, [E_near], x_far, y_far, z_far, mode, eps, quadrature,
+                               symmetry)
+    return E_far
 
-    k = 2 * np.pi / lamb
-    # 生成远场网格（使用 'ij' 索引）
-    X_far, Y_far, Z_far = np.meshgrid(x_far, y_far, z_far, indexing='ij')
-    E_far = np.zeros_like(X_far, dtype=np.complex128)
-    if mode == 'common' or mode == 'c':
-        print('Using normal mode...')
-        # 直接积分计算
-        E_far = np.zeros_like(X_far, dtype=complex)
-        for ii in tqdm(range(len(y_near))):
-            for jj in range(len(x_near)):
-                def E(r1, r2, x, y, z):
-                    r = np.sqrt((x - r1)**2 + (y - r2)**2 + z**2)
-                    return (1/(1j*lamb) * E_near[ii,jj]/r * 
-                        np.exp(1j*k*r) * (z/r))
-                
-                E_far += E(x_near[jj], y_near[ii], X_far, Y_far, Z_far)
-
-    elif mode == 'threaded' or mode == 't':
-        print('Using joblib threaded mode...')
-        from joblib import Parallel, delayed
-        # 使用joblib多线程实现
-        def compute_row(ii):
-            """计算单行的远场贡献"""
-            row_result = np.zeros_like(X_far, dtype=np.complex128)
-            for jj in range(len(x_near)):
-                r = np.sqrt((X_far - x_near[jj])**2 + 
-                            (Y_far - y_near[ii])**2 + 
-                            Z_far**2)
-                row_result += (1/(1j*lamb) * E_near[ii,jj]/r * 
-                                np.exp(1j*k*r) * (Z_far/r))
-            return row_result
-        
-        # 并行执行计算
-        results = Parallel(n_jobs=-1)(
-            delayed(compute_row)(ii) 
-            for ii in tqdm(range(len(y_near)))
-        )
-        
-        # 合并结果
-        for row_result in results:
-            E_far += row_result
-
-    elif mode == 'vectorized' or mode == 'v':
-        print('Using vectorized mode...')
-        # 生成近场网格
-        X_near, Y_near = np.meshgrid(x_near, y_near, indexing='ij')
-
-        # 计算距离
-        dx = X_far[np.newaxis, :, :, np.newaxis] - X_near[:, :, np.newaxis, np.newaxis]
-        dy = Y_far[np.newaxis, :, :, np.newaxis] - Y_near[:, :, np.newaxis, np.newaxis]
-        dz = Z_far[np.newaxis, np.newaxis, :, :]  # 形状为 (1,1,len(y_far),len(z_far))
-        r = np.sqrt(dx**2 + dy**2 + dz**2)
-
-        # 计算标量因子
-        factor = (1/(2j*lamb)) * E_near[:, :, np.newaxis, np.newaxis] / r * np.exp(1j*k*r) * (1 + dz/r)
-        
-        # 累加所有近场点贡献
-        E_far = np.sum(factor, axis=(0, 1))
-    
-    elif mode == 'numba' or mode == 'n':
-        print('Using numba mode...(numba mode has no progress bar)')
-        # 使用numba加速循环
-        # @jit(nopython=True, fastmath=True)  # 更高精度
-        # @jit(nopython=True, parallel=True)  # 并行加速
-        import numba as nb
-        # Numba 加速的积分内核（不含 tqdm）
-        # 使用 Numba 并行加速的积分内核
-        @nb.njit(parallel=True, fastmath=True)
-        def compute_row_parallel(y_len, x_len, x_near, y_near, E_near, X_far, Y_far, Z_far, lamb, k, E_far):
-            for ii in nb.prange(y_len):  # prange 启用多线程
-                for jj in range(x_len):
-                    # 原始积分计算逻辑
-                    r = np.sqrt((X_far - x_near[jj])**2 + 
-                                (Y_far - y_near[ii])**2 + 
-                                Z_far**2)
-                    E_far += (1/(1j*lamb) * E_near[ii,jj]/r * 
-                            np.exp(1j*k*r) * (Z_far/r))
-            return E_far
-        
-        # 调用 Numba 并行函数
-        E_far = compute_row_parallel(len(y_near), len(x_near), x_near, y_near, E_near, X_far, Y_far, Z_far, lamb, k, E_far)
+def RorySommerfeld_Scalar(lamb, x_near, y_near, E_near, x_far, y_far, z_far, mode='numba', eps=1e-6, quadrature=None,
+                          checkpoint=None, resume=None, checkpoint_interval=60.0, out=None, symmetry=None):
+    '''
+    lamb: 波长
+    x_near, y_near: 近场位置数据，x_near和y_near应当是一维ndarry数组
+    E_near: 近场的电场数据，E_near应当是二维ndarry数组；也可以是 FieldStore.field() 等分块读取的近场（逐块读取、流式计算，
+        结果与直接传入数组相同；'zoom' 模式的近似常数按各块拟合，结果在该模式的近似误差内与块的划分有关）
+    x_far, y_far, z_far: 远场的位置数据，应当是一维数据或者数值
+    mode: 计算模式
+        'common'('c')，   : 普通循环计算模式，兼容所有平台，最稳定，但速度最慢
+        'threaded'('t')   : 多线程计算模式，能够吃满CPU资源，测试仅windows下可用，需要joblib库
+        'vectorized'('v') : 矢量化计算模式，分块计算（每块 VECTOR_TILE 个 近场点×远场点 组合），计算小数据非常快
+        'numba'('n')      : numba计算模式，计算速度非常快，兼容windows和linux，需要numba库，**推荐使用**
+        'nufft'('f')      : Fraunhofer远场模式，近场/远场位置可以任意非均匀，用非均匀FFT计算，复杂度O((N+M)log(N+M))，
+                            距离小于2D²/λ的远场点自动退回直接求和；安装finufft库时自动使用
+        'zoom'('z')       : 缩放窗口模式，Fresnel近似下用chirp-z变换计算矩形远场窗口，窗口位置和采样间隔任意
+                            （如焦点附近远小于近场步长的采样），每个z平面O(N log N)；近场和远场窗口的x、y须等间距
+        'auto'            : 按 plan_propagation() 的估算自动选择内存放得下的最快模式（不会选择 'nufft'、'zoom'），
+                            选择结果记录在 get_propagation_stats() 中
+    eps: 'nufft'模式的相对精度
+    checkpoint: 检查点文件路径（.npz），远场按块计算，每隔 checkpoint_interval 秒保存已完成的块（近场须为数组，不支持分块读取的近场）
+    resume: 从该检查点文件续算（文件不存在时从头开始并写入该文件），结果与不中断的计算逐位相同
+    checkpoint_interval: 保存检查点的间隔（秒）
+    quadrature: 求积规则，None(直接对采样点求和)/'trapezoid'/'simpson'/'filon'
+        使用求积规则时结果乘了面元（即衍射积分本身），相同精度下所需的近场采样点更少：
+        'simpson' 适合平缓变化的近场；'filon' 修正孔径边缘的振荡误差，适合边缘处场不为零、目标方向角度较大的情况
+    out: 远场写入的目标，形状 (len(x_far), len(y_far), len(z_far))，如 FieldStore.create(...) 或 np.memmap；
+        远场按块（与 out 的存储块对齐）计算并写入，内存中只保留一块，返回 out
+    symmetry: 镜像对称，None（不使用）/ 'auto'（按 detect_symmetry 自动检测）/ (x 方向, y 方向)，各为 'even'、'odd' 或 None
+        近场关于网格中线对称（'even'）或反对称（'odd'）时只对一半（两个方向都对称时为四分之一）近场求和，
+        远场网格也关于该中线对称时每个方向节省一半计算量，结果与不使用时相同（近场取对称部分）
 
-    else:
-        raise ValueError('Invalid mode(请检查输入的mode参数)')
+    return: 远场电场数据np.ndarray(len(x_far),len(y_far),len(z_far))
+    '''
+    _numpy()
+    x_far, y_far, z_far = _far_axes(x_far, y_far, z_far)
+    if out is not None:
+        _check_out(checkpoint, resume)
+        return _propagate_into([out], 'RorySommerfeld_Scalar', lamb, x_near, y_near, [E_near], x_far, y_far, z_far,
+                               mode, eps, quadrature, symmetry)[0]
+    if checkpoint is not None or resume is not None:
+        result = _run_checkpointed('RorySommerfeld_Scalar', lamb, x_near, y_near, {'E_near': E_near}, x_far, y_far, z_far,
+                                   mode, eps, quadrature, checkpoint, resume, checkpoint_interval, symmetry=symmetry)
+        return result['E_far']
+    E_far, = _propagate_fields('RorySommerfeld_Scalar', lamb, x_near, y_near, [E_near], x_far, y_far, z_far, mode, eps, quadrature,
+                               symmetry)
     return E_far
 
-def RorySommerfeld_Vector(lamb, x_near, y_near, E_near_x, E_near_y, x_far, y_far, z_far, mode='numba'):
+def RorySommerfeld_Vector(lamb, x_near, y_near, E_near_x, E_near_y, x_far, y_far, z_far, mode='numba', eps=1e-6, quadrature=None,
+                          checkpoint=None, resume=None, checkpoint_interval=60.0, symmetry=None, out=None):
     '''
     lamb: 波长
     x_near, y_near: 近场位置数据，x_near和y_near应当是一维ndarry数组
-    E_near_x, E_near_y: 近场的电场数据的xy分量，E_near_x和E_near_y应当是二维ndarry数组
+    E_near_x, E_near_y: 近场的电场数据的xy分量，E_near_x和E_near_y应当是二维ndarry数组（或分块读取的近场，见 Kirchhoff）
     x_far, y_far, z_far: 远场的位置数据，应当是一维数据或者数值
     mode: 计算模式
         'common'('c')，   : 普通循环计算模式，兼容所有平台，最稳定，但速度最慢
         'threaded'('t')   : 多线程计算模式，能够吃满CPU资源，测试仅windows下可用，需要joblib库
-        'vectorized'('v') : 矢量化计算模式，计算小数据非常快，但大数据会容易爆内存(目前还没写好)
+        'vectorized'('v') : 矢量化计算模式，分块计算（每块 VECTOR_TILE 个 近场点×远场点 组合），计算小数据非常快
         'numba'('n')      : numba计算模式，计算速度非常快，兼容windows和linux，需要numba库，**推荐使用**
+        'nufft'('f')      : Fraunhofer远场模式，近场/远场位置可以任意非均匀，用非均匀FFT计算，复杂度O((N+M)log(N+M))，
+                            距离小于2D²/λ的远场点自动退回直接求和；安装finufft库时自动使用
+        'zoom'('z')       : 缩放窗口模式，Fresnel近似下用chirp-z变换计算矩形远场窗口，窗口位置和采样间隔任意
+                            （如焦点附近远小于近场步长的采样），每个z平面O(N log N)；近场和远场窗口的x、y须等间距
+        'auto'            : 按 plan_propagation() 的估算自动选择内存放得下的最快模式（不会选择 'nufft'、'zoom'），
+                            选择结果记录在 get_propagation_stats() 中
+    eps: 'nufft'模式的相对精度
+    checkpoint: 检查点文件路径（.npz），远场按块计算，每隔 checkpoint_interval 秒保存已完成的块（近场须为数组，不支持分块读取的近场）
+    resume: 从该检查点文件续算（文件不存在时从头开始并写入该文件），结果与不中断的计算逐位相同
+    checkpoint_interval: 保存检查点的间隔（秒）
+    quadrature: 求积规则，None(直接对采样点求和)/'trapezoid'/'simpson'/'filon'
+        使用求积规则时结果乘了面元（即衍射积分本身），相同精度下所需的近场采样点更少：
+        'simpson' 适合平缓变化的近场；'filon' 修正孔径边缘的振荡误差，适合边缘处场不为零、目标方向角度较大的情况
+    symmetry: 镜像对称，None（不使用）/ 'auto'（按 detect_symmetry 自动检测）/ (x 方向, y 方向)，各为 'even'、'odd' 或 None；
+        也可以是 [(E_near_x 的 x 方向, y 方向), (E_near_y 的 x 方向, y 方向)]（如 x 偏振透镜：[('even', 'even'), ('odd', 'odd')]）
+        近场关于网格中线对称（'even'）或反对称（'odd'）时只对一半（两个方向都对称时为四分之一）近场求和，
+        远场网格也关于该中线对称时每个方向节省一半计算量，结果与不使用时相同（近场取对称部分）
+    out: 远场三个分量写入的目标，(out_x, out_y, out_z) 各为 (len(x_far), len(y_far), len(z_far))，
+        或形状 (3, len(x_far), len(y_far), len(z_far)) 的单个目标（如 FieldStore.create(..., dims=('component', 'x', 'y', 'z'))）；
+        与 Kirchhoff 的 out 相同按块计算并写入，不计算总体电场强度，返回 out
 
-    return: 远场电场数据
+    return: 远场电场数据 (E_far, E_far_x, E_far_y, E_far_z)，E_far 为总体电场强度（模值）
     '''
-    from tqdm import tqdm
+    _numpy()
+    x_far, y_far, z_far = _far_axes(x_far, y_far, z_far)
+    if out is not None:
+        _check_out(checkpoint, resume)
+        _propagate_into(_vector_outs(out), 'RorySommerfeld_Vector', lamb, x_near, y_near, [E_near_x, E_near_y],
+                        x_far, y_far, z_far, mode, eps, quadrature, symmetry,
+                        derive=lambda results: [-(results[0] + results[1])])
+        if not isinstance(out, (list, tuple)) and hasattr(out, 'flush'):
+            out.flush()
+        return out
+    if checkpoint is not None or resume is not None:
+        out = _run_checkpointed('RorySommerfeld_Vector', lamb, x_near, y_near,
+                                {'E_near_x': E_near_x, 'E_near_y': E_near_y}, x_far, y_far, z_far, mode, eps, quadrature, checkpoint, resume, checkpoint_interval,
+                                names=['E_far_x', 'E_far_y', 'E_far_z'], symmetry=symmetry,
+                                derive=lambda results: [-(results[0] + results[1])])
+        E_far = np.sqrt(np.abs(out['E_far_x'])**2 + np.abs(out['E_far_y'])**2 + np.abs(out['E_far_z'])**2)
+        return E_far, out['E_far_x'], out['E_far_y'], out['E_far_z']
+    E_far_x, E_far_y = _propagate_fields('RorySommerfeld_Vector', lamb, x_near, y_near, [E_near_x, E_near_y],
+                                         x_far, y_far, z_far, mode, eps, quadrature, symmetry)
+    E_far_z = -(E_far_x + E_far_y)
 
-    # 确保远场坐标为一维数组
-    x_far = np.asarray(x_far)
-    y_far = np.asarray(y_far)
-    z_far = np.asarray(z_far)
-    if x_far.ndim == 0: x_far = x_far[np.newaxis]
-    if y_far.ndim == 0: y_far = y_far[np.newaxis]
-    if z_far.ndim == 0: z_far = z_far[np.newaxis]
+    # 计算总体电场强度（模值）
+    E_far = np.sqrt(np.abs(E_far_x)**2 + np.abs(E_far_y)**2 + np.abs(E_far_z)**2)
+    return E_far, E_far_x, E_far_y, E_far_z
 
-    k = 2 * np.pi / lamb
-    # 生成远场网格（使用 'ij' 索引）
-    X_far, Y_far, Z_far = np.meshgrid(x_far, y_far, z_far, indexing='ij')
-    E_far_x = np.zeros_like(X_far, dtype=np.complex128)
-    E_far_y = np.zeros_like(Y_far, dtype=np.complex128)
-    E_far_z = np.zeros_like(Z_far, dtype=np.complex128)
-
-
-    if mode == 'common' or mode == 'c':
-        print('Using normal mode...')
-        # 直接积分计算
-        for ii in tqdm(range(len(y_near))):
-            for jj in range(len(x_near)):
-                r = np.sqrt((X_far - x_near[jj])**2 + 
-                            (Y_far - y_near[ii])**2 + 
-                            Z_far**2)
-                exp_term = np.exp(1j*k*r)
-                common_factor = (-1/(2*np.pi) * Z_far / (r**2) * (1j*k - 1/r))
-                
-                E_far_x += E_near_x[ii,jj] * exp_term * common_factor
 
-                E_far_y += E_near_y[ii,jj] * exp_term * common_factor
-                
-                z_common_factor = (1/(2*np.pi) * Z_far / (r**2) * (1j*k - 1/r))
-                E_far_z += ((E_near_x[ii,jj] + E_near_y[ii,jj]) * exp_term * z_common_factor)
-
-    elif mode == 'vectorized' or mode == 'v':
-        print('Using vectorized mode...')
-        # 生成近场网格
-        X_near, Y_near = np.meshgrid(x_near, y_near, indexing='ij')
-
-        # 计算距离
-        dx = X_far[np.newaxis, :, :, np.newaxis] - X_near[:, :, np.newaxis, np.newaxis]
-        dy = Y_far[np.newaxis, :, :, np.newaxis] - Y_near[:, :, np.newaxis, np.newaxis]
-        dz = Z_far[np.newaxis, np.newaxis, :, :]  # 形状为 (1,1,len(y_far),len(z_far))
-        r = np.sqrt(dx**2 + dy**2 + dz**2)
-
-        # 计算x分量
-        factor_x = (-1/(2*np.pi) * E_near_x[:, :, np.newaxis, np.newaxis] * 
-                    np.exp(1j*k*r) * dz / (r**2) * (1j*k - 1/r))
-        
-        # 计算y分量
-        factor_y = (-1/(2*np.pi) * E_near_y[:, :, np.newaxis, np.newaxis] * 
-                    np.exp(1j*k*r) * dz / (r**2) * (1j*k - 1/r))
-        
-        # 计算z分量
-        factor_z = (1/(2*np.pi) * E_near_x[:, :, np.newaxis, np.newaxis] * 
-                    np.exp(1j*k*r) * dz / (r**2) * (1j*k - 1/r)) + \
-                (1/(2*np.pi) * E_near_y[:, :, np.newaxis, np.newaxis] * 
-                    np.exp(1j*k*r) * dz / (r**2) * (1j*k - 1/r))
-        
-        # 累加所有近场点贡献
-        E_far_x = np.sum(factor_x, axis=(0, 1))
-        E_far_y = np.sum(factor_y, axis=(0, 1))
-        E_far_z = np.sum(factor_z, axis=(0, 1))
-
-    elif mode == 'threaded' or mode == 't':
-        print('Using joblib threaded mode...')
-        from joblib import Parallel, delayed
-        
-        # 使用joblib多线程实现
-        def compute_row(ii):
-            """计算单行的远场贡献"""
-            row_x = np.zeros_like(X_far, dtype=np.complex128)
-            row_y = np.zeros_like(Y_far, dtype=np.complex128)
-            row_z = np.zeros_like(Z_far, dtype=np.complex128)
-            
-            for jj in range(len(x_near)):
-                r = np.sqrt((X_far - x_near[jj])**2 + 
-                            (Y_far - y_near[ii])**2 + 
-                            Z_far**2)
-                exp_term = np.exp(1j*k*r)
-                common_factor = (-1/(2*np.pi) * Z_far / (r**2) * (1j*k - 1/r))
-                
-                # 计算x分量
-                row_x += E_near_x[ii,jj] * exp_term * common_factor
+def _payload_size(obj):
+    """估算参数/返回值的字节数"""
+    if obj is None:
+        return 0
+    if hasattr(obj, 'nbytes'):
+        return int(obj.nbytes)
+    if isinstance(obj, (bytes, bytearray)):
+        return len(obj)
+    if isinstance(obj, str):
+        return len(obj.encode('utf-8'))
+    if isinstance(obj, (bool, int, float, complex)):
+        return 8 if not isinstance(obj, complex) else 16
+    if isinstance(obj, dict):
+        return sum(_payload_size(k) + _payload_size(v) for k, v in obj.items())
+    if isinstance(obj, (list, tuple, set)):
+        return sum(_payload_size(v) for v in obj)
+    return sys.getsizeof(obj)
 
-                # 计算y分量
-                row_y += E_near_y[ii,jj] * exp_term * common_factor
+class CallTracer:
+    """
+    会话调用追踪器：记录每次转发调用的方法名、耗时、参数/返回值字节数和会话id
 
-                # 计算z分量
-                z_common_factor = (1/(2*np.pi) * Z_far / (r**2) * (1j*k - 1/r))
-                row_z += (E_near_x[ii,jj] + E_near_y[ii,jj]) * exp_term * z_common_factor
-            
-            return row_x, row_y, row_z
-        
-        # 并行执行计算
-        results = Parallel(n_jobs=-1)(
-            delayed(compute_row)(ii) 
-            for ii in tqdm(range(len(y_near)), desc="Processing rows")
-        )
-        
-        # 合并结果
-        for row_x, row_y, row_z in results:
-            E_far_x += row_x
-            E_far_y += row_y
-            E_far_z += row_z
-
-    elif mode == 'numba' or mode == 'n':
-        print('Using numba mode...(numba mode has no progress bar)')
-        import numba as nb
-        
-        # Numba 加速的积分内核
-        @nb.njit(parallel=True, fastmath=True)
-        def compute_row_parallel(y_len, x_len, x_near, y_near, E_near_x, E_near_y, 
-                                X_far, Y_far, Z_far, k, E_far_x, E_far_y, E_far_z):
-            for ii in nb.prange(y_len):  # prange 启用多线程
-                for jj in range(x_len):
-                    # 计算距离
-                    r = np.sqrt((X_far - x_near[jj])**2 + 
-                                (Y_far - y_near[ii])**2 + 
-                                Z_far**2)
-                    exp_term = np.exp(1j*k*r)
-                    common_factor = (-1/(2*np.pi) * Z_far / (r**2) * (1j*k - 1/r))
-                    
-                    # 计算x分量
-                    E_far_x += (E_near_x[ii,jj] * exp_term * common_factor)
-                    
-                    # 计算y分量
-                    E_far_y += (E_near_y[ii,jj] * exp_term * common_factor)
-                    
-                    # 计算z分量
-                    z_common_factor = (1/(2*np.pi) * Z_far / (r**2) * (1j*k - 1/r))
-                    E_far_z += ((E_near_x[ii,jj] + E_near_y[ii,jj]) * exp_term * z_common_factor)
-            return E_far_x, E_far_y, E_far_z
-        
-        # 调用 Numba 并行函数
-        E_far_x, E_far_y, E_far_z = compute_row_parallel(
-            len(y_near), len(x_near), x_near, y_near, 
-            E_near_x, E_near_y, X_far, Y_far, Z_far, k, 
-            E_far_x, E_far_y, E_far_z
-        )
-    # 计算总体电场强度（模值）
-    E_far = np.sqrt(np.abs(E_far_x)**2 + np.abs(E_far_y)**2 + np.abs(E_far_z)**2)
-    return E_far, E_far_x, E_far_y, E_far_z
+    示例:
+        tracer = CallTracer()
+        fdtd = LumAPI(tracer=tracer).FDTD()
+        ...
+        tracer.report()
+        tracer.to_chrome_trace('trace.json')  # 用 chrome://tracing 或 Perfetto 打开
+    """
+    def __init__(self):
+        self.records = []   # (session_id, method, start, wall, arg_bytes, ret_bytes)
+        self._t0 = time.perf_counter()
+
+    def clear(self):
+        # 原地清空：已包装的方法持有同一个列表
+        self.records.clear()
+
+    def wrap(self, func, name, session_id):
+        """返回记录耗时的包装函数（抛出异常的调用也记录，返回值字节数记为0）"""
+        records = self.records
+        def traced(*args, **kwargs):
+            result = None
+            start = time.perf_counter()
+            try:
+                result = func(*args, **kwargs)
+                return result
+            finally:
+                wall = time.perf_counter() - start
+                records.append((session_id, name, start, wall,
+                                _payload_size(args) + _payload_size(kwargs), _payload_size(result)))
+        traced.__name__ = name
+        traced.__wrapped__ = func
+        return traced
+
+    def summary(self):
+        """按方法统计：{method: {count, total, mean, max, arg_bytes, ret_bytes}}，按总耗时降序"""
+        stats = {}
+        for session_id, name, start, wall, arg_bytes, ret_bytes in self.records:
+            s = stats.setdefault(name, {'count': 0, 'total': 0.0, 'max': 0.0, 'arg_bytes': 0, 'ret_bytes': 0})
+            s['count'] += 1
+            s['total'] += wall
+            s['max'] = max(s['max'], wall)
+            s['arg_bytes'] += arg_bytes
+            s['ret_bytes'] += ret_bytes
+        for s in stats.values():
+            s['mean'] = s['total'] / s['count']
+        return dict(sorted(stats.items(), key=lambda item: -item[1]['total']))
+
+    def histogram(self, edges=(1e-5, 1e-4, 1e-3, 1e-2, 1e-1, 1, 10)):
+        """按方法统计耗时直方图：{method: [各区间调用次数]}，区间为 (-inf,e0), [e0,e1), ..., [en,inf)"""
+        hist = {}
+        for record in self.records:
+            counts = hist.setdefault(record[1], [0] * (len(edges) + 1))
+            counts[bisect.bisect_right(edges, record[3])] += 1
+        return hist
 
+    def top(self, n=10):
+        """耗时最长的n次调用"""
+        return sorted(self.records, key=lambda r: -r[3])[:n]
+
+    def to_chrome_trace(self, path=None):
+        """导出为Chrome trace事件格式，path不为空时写入文件"""
+        events = []
+        for session_id, name, start, wall, arg_bytes, ret_bytes in self.records:
+            events.append({
+                'name': name, 'ph': 'X', 'pid': os.getpid(), 'tid': session_id,
+                'ts': (start - self._t0) * 1e6, 'dur': wall * 1e6,
+                'args': {'arg_bytes': arg_bytes, 'ret_bytes': ret_bytes},
+            })
+        trace = {'traceEvents': events, 'displayTimeUnit': 'ms'}
+        if path:
+            with open(path, 'w') as f:
+                json.dump(trace, f)
+        return trace
+
+    def report(self, n=10):
+        """打印按方法汇总的统计和最慢的n次调用"""
+        print(f"{'method':<24}{'count':>8}{'total(s)':>12}{'mean(ms)':>12}{'max(ms)':>12}{'args(B)':>12}{'ret(B)':>12}")
+        for name, s in self.summary().items():
+            print(f"{name:<24}{s['count']:>8}{s['total']:>12.4f}{s['mean']*1e3:>12.3f}"
+                  f"{s['max']*1e3:>12.3f}{s['arg_bytes']:>12}{s['ret_bytes']:>12}")
+        print(f"\n最慢的 {n} 次调用:")
+        for session_id, name, start, wall, arg_bytes, ret_bytes in self.top(n):
+            print(f"  [会话{session_id}] {name}: {wall*1e3:.3f} ms")
+
+
+# config.json读取缓存，键为路径，文件修改时间变化时重新读取
+_CONFIG_CACHE = {}
+
+def load_config(config_path=CONFIG_PATH):
+    """读取配置文件，返回字典"""
+    mtime = os.path.getmtime(config_path)
+    cached = _CONFIG_CACHE.get(config_path)
+    if cached and cached[0] == mtime:
+        return dict(cached[1])
+    with open(config_path, 'r') as f:
+        config = json.load(f)
+    _CONFIG_CACHE[config_path] = (mtime, config)
+    return dict(config)
 
 class LumAPI:
-    def __init__(self, lumerical_path='', version='', config_path=CONFIG_PATH):
+    def __init__(self, lumerical_path='', version='', config_path=CONFIG_PATH, tracer=None):
         self.config_path = config_path
+        self.tracer = tracer  # CallTracer对象，不为空时记录由此创建的会话的所有调用
         
         # 如果没有提供路径，尝试从配置文件加载
         if not lumerical_path:
             try:
-                with open(self.config_path, 'r') as f:
-                    config = json.load(f)
+                config = load_config(self.config_path)
                 lumerical_path = config.get('lumerical_path')
                 version = config.get('version')
                 
@@ -518,21 +1695,56 @@ class LumAPI:
         self.version = version
 
     def FDTD(self, filename=None, key = None, hide = False, serverArgs = {}, remoteArgs = {}, **kwargs):
+        kwargs.setdefault('tracer', self.tracer)
         return FDTD(self.lumapi, filename, key, hide, serverArgs, remoteArgs, **kwargs)
     
     def MODE(self, filename=None, key = None, hide = False, serverArgs = {}, remoteArgs = {}, **kwargs):
+        kwargs.setdefault('tracer', self.tracer)
         return MODE(self.lumapi, filename, key, hide, serverArgs, remoteArgs, **kwargs)
     
     def DEVICE(self, filename=None, key = None, hide = False, serverArgs = {}, remoteArgs = {}, **kwargs):
-        return MODE(self.lumapi, filename, key, hide, serverArgs, remoteArgs, **kwargs)
+        kwargs.setdefault('tracer', self.tracer)
+        return DEVICE(self.lumapi, filename, key, hide, serverArgs, remoteArgs, **kwargs)
     
     def INTERCONNECT(self, filename=None, key = None, hide = False, serverArgs = {}, remoteArgs = {}, **kwargs):
-        return MODE(self.lumapi, filename, key, hide, serverArgs, remoteArgs, **kwargs)
+        kwargs.setdefault('tracer', self.tracer)
+        return INTERCONNECT(self.lumapi, filename, key, hide, serverArgs, remoteArgs, **kwargs)
     
-class FDTD():
-    def __init__(self, lumapi, filename=None, key = None, hide = False, serverArgs = {}, remoteArgs = {}, **kwargs):
+_session_ids = itertools.count()
+
+class _Session():
+    """
+    会话包装基类：将属性访问转发给厂商会话对象
+
+    首次访问某个方法后，会把绑定方法缓存到实例字典中，之后的访问不再经过 __getattr__；
+    设置了tracer时缓存的是记录耗时的包装函数。
+    """
+    def _init_session(self, tracer):
+        self.session_id = next(_session_ids)
+        self.tracer = tracer
+        self._cached = []
+
+    def _forward(self, target, name):
+        attr = getattr(target, name)
+        if callable(attr):
+            if self.tracer is not None:
+                attr = self.tracer.wrap(attr, name, self.session_id)
+            self.__dict__[name] = attr
+            self._cached.append(name)
+        return attr
+
+    def set_tracer(self, tracer):
+        """开启(传入CallTracer)或关闭(传入None)调用追踪"""
+        for name in self._cached:
+            self.__dict__.pop(name, None)
+        self._cached = []
+        self.tracer = tracer
+
+class FDTD(_Session):
+    def __init__(self, lumapi, filename=None, key = None, hide = False, serverArgs = {}, remoteArgs = {}, tracer=None, **kwargs):
         self.lumapi = lumapi
         self.filename = filename
+        self._init_session(tracer)
         
         self.fdtd = lumapi.FDTD(filename, key, hide, serverArgs, remoteArgs, **kwargs)
 
@@ -540,12 +1752,15 @@ class FDTD():
         '''
         将原本函数转发回去
         '''
-        return getattr(self.fdtd, name)
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return self._forward(self.fdtd, name)
     
-class MODE():
-    def __init__(self, lumapi, filename=None, key = None, hide = False, serverArgs = {}, remoteArgs = {}, **kwargs):
+class MODE(_Session):
+    def __init__(self, lumapi, filename=None, key = None, hide = False, serverArgs = {}, remoteArgs = {}, tracer=None, **kwargs):
         self.lumapi = lumapi
         self.filename = filename
+        self._init_session(tracer)
         
         if not filename:
             self.mode = lumapi.MODE()
@@ -556,12 +1771,15 @@ class MODE():
         '''
         将原本函数转发回去
         '''
-        return getattr(self.mode, name)
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return self._forward(self.mode, name)
     
-class DEVICE():
-    def __init__(self, lumapi, filename=None, key = None, hide = False, serverArgs = {}, remoteArgs = {}, **kwargs):
+class DEVICE(_Session):
+    def __init__(self, lumapi, filename=None, key = None, hide = False, serverArgs = {}, remoteArgs = {}, tracer=None, **kwargs):
         self.lumapi = lumapi
         self.filename = filename
+        self._init_session(tracer)
         
         if not filename:
             self.device = lumapi.DEVICE()
@@ -572,12 +1790,15 @@ class DEVICE():
         '''
         将原本函数转发回去
         '''
-        return getattr(self.device, name)
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return self._forward(self.device, name)
     
-class INTERCONNECT():
-    def __init__(self, lumapi, filename=None, key = None, hide = False, serverArgs = {}, remoteArgs = {}, **kwargs):
+class INTERCONNECT(_Session):
+    def __init__(self, lumapi, filename=None, key = None, hide = False, serverArgs = {}, remoteArgs = {}, tracer=None, **kwargs):
         self.lumapi = lumapi
         self.filename = filename
+        self._init_session(tracer)
         
         self.interconnect = lumapi.INTERCONNECT(filename, key, hide, serverArgs, remoteArgs, **kwargs)
 
@@ -585,8 +1806,9 @@ class INTERCONNECT():
         '''
         将原本函数转发回去
         '''
-        return getattr(self.interconnect, name)
-
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return self._forward(self.interconnect, name)
 
 if __name__ == '__main__':
     um = 1e-6
@@ -0,0 +1,254 @@
+'''
+超表面单元（meta-atom）库：扫描结果的存储与向量化的相位 -> 几何查找
+
+单元扫描（如半径、高度 -> 透射系数 t）的结果保存为一张表，按 (波长, 相位) 排序后存盘，
+每个波长的行是连续的一段且相位升序，这张表本身就是按波长的索引。查找整张相位图时：
+    'nearest'     : 相位最接近的单元（有序相位上的二分查找，O(log N)）
+    'transmission': 相位误差不超过 tol 的单元中透射率最高的（二分确定相位窗口 + 稀疏表区间最大值，O(1)）
+两种方式都对整张相位图一次完成，不需要逐点循环。
+
+lib = MetaAtomLibrary()
+lib.add_sweep(wavelength, t, radius=r, height=h)       # t 为复透射系数
+lib.save('atoms.npz')
+sel = MetaAtomLibrary.load('atoms.npz').lookup(phi, 1.55e-6, strategy='transmission', tol=0.2)
+E_near = sel['transmission']                            # 由相位图直接得到近场
+'''
+import os
+import json
+
+import numpy as np
+
+STRATEGIES = ('nearest', 'transmission')
+TWO_PI = 2 * np.pi
+
+def _wrap(phase):
+    return np.mod(phase, TWO_PI)
+
+class _SparseArgmax:
+    '''稀疏表：O(n log n) 预处理后 O(1) 查询区间 [lo, hi) 内最大值的位置（向量化）'''
+    def __init__(self, values):
+        self.values = np.asarray(values, dtype=np.float64)
+        n = len(self.values)
+        self.table = [np.arange(n)]
+        step = 1
+        while 2*step <= n:
+            prev = self.table[-1]
+            a, b = prev[:n - 2*step + 1], prev[step:n - step + 1]
+            self.table.append(np.where(self.values[b] > self.values[a], b, a))
+            step *= 2
+
+    def query(self, lo, hi):
+        length = hi - lo
+        level = np.floor(np.log2(np.maximum(length, 1))).astype(np.int64)
+        out = np.empty(len(lo), dtype=np.int64)
+        for j in np.unique(level):
+            m = level == j
+            a = self.table[j][lo[m]]
+            b = self.table[j][hi[m] - (1 << j)]
+            out[m] = np.where(self.values[b] > self.values[a], b, a)
+        return out
+
+class MetaAtomLibrary:
+    '''
+    单元库：每行一个 (波长, 几何参数..., 复透射系数)
+    rtol: 判断两个波长相同的相对容差
+    '''
+    def __init__(self, rtol=1e-6):
+        self.rtol = rtol
+        self.wavelength = np.zeros(0)
+        self.transmission = np.zeros(0, dtype=np.complex128)
+        self.params = {}
+        self._index = None
+        self._cache = {}
+
+    # ================= 数据 =================
+    def add_sweep(self, wavelength, transmission, **params):
+        '''
+        添加扫描结果，所有参数广播到相同形状后展平
+        wavelength: 波长（米），数值或数组
+        transmission: 复透射系数 t = |t|·exp(i·φ)
+        params: 几何参数（如 radius=..., height=...），名称在整个库中保持一致
+        '''
+        if self.params and set(params) != set(self.params):
+            raise ValueError(f'几何参数与库中已有的不一致: {sorted(params)} != {sorted(self.params)}')
+        if not params:
+            raise ValueError('至少需要一个几何参数')
+        arrays = np.broadcast_arrays(np.asarray(wavelength, dtype=np.float64),
+                                     np.asarray(transmission, dtype=np.complex128),
+                                     *(np.asarray(v, dtype=np.float64) for v in params.values()))
+        wl, t, values = arrays[0].ravel(), arrays[1].ravel(), [a.ravel() for a in arrays[2:]]
+        self.wavelength = np.concatenate([self.wavelength, wl])
+        self.transmission = np.concatenate([self.transmission, t])
+        for name, v in zip(params, values):
+            self.params[name] = np.concatenate([self.params.get(name, np.zeros(0)), v])
+        self._index = None
+        self._cache = {}
+
+    def __len__(self):
+        return len(self.wavelength)
+
+    @property
+    def phase(self):
+        return _wrap(np.angle(self.transmission))
+
+    def _build_index(self):
+        '''按 (波长, 相位) 排序，return: 各波长的 (波长, 起始行, 结束行)'''
+        if self._index is not None:
+            return self._index
+        order = np.lexsort((self.phase, self.wavelength))
+        self.wavelength = self.wavelength[order]
+        self.transmission = self.transmission[order]
+        self.params = {name: v[order] for name, v in self.params.items()}
+        # 相对容差内的波长归为一组（以组内第一个波长为键）
+        wl = self.wavelength
+        new = np.r_[True, np.abs(np.diff(wl)) > self.rtol * np.abs(wl[1:])] if len(wl) else np.zeros(0, bool)
+        starts = np.flatnonzero(new)
+        ends = np.r_[starts[1:], len(wl)]
+        self._index = [(float(wl[a]), int(a), int(b)) for a, b in zip(starts, ends)]
+        if any(np.any(np.diff(self.phase[a:b]) < 0) for _, a, b in self._index):
+            # 波长在容差内但不完全相同时重新按组排序
+            group = np.repeat(np.arange(len(starts)), ends - starts)
+            order = np.lexsort((self.phase, group))
+            self.wavelength = self.wavelength[order]
+            self.transmission = self.transmission[order]
+            self.params = {name: v[order] for name, v in self.params.items()}
+        return self._index
+
+    @property
+    def wavelengths(self):
+        return np.array([wl for wl, _, _ in self._build_index()])
+
+    def _rows(self, wavelength):
+        for wl, a, b in self._build_index():
+            if abs(wl - wavelength) <= self.rtol * abs(wavelength):
+                return a, b
+        raise ValueError(f'库中没有波长 {wavelength:g} 的数据（已有: {self.wavelengths}）')
+
+    # ================= 存储 =================
+    def save(self, path):
+        '''保存为 npz（按波长、相位排好序，同时保存各波长的行范围）；先写临时文件再替换'''
+        index = self._build_index()
+        meta = {'params': list(self.params), 'rtol': self.rtol, 'index': index}
+        tmp = f'{path}.tmp{os.getpid()}'
+        with open(tmp, 'wb') as f:
+            np.savez(f, meta=np.array(json.dumps(meta)), wavelength=self.wavelength, transmission=self.transmission,
+                     **{f'param_{name}': v for name, v in self.params.items()})
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            meta = json.loads(str(data['meta']))
+            lib = cls(rtol=meta['rtol'])
+            lib.wavelength = data['wavelength'].copy()
+            lib.transmission = data['transmission'].copy()
+            lib.params = {name: data[f'param_{name}'].copy() for name in meta['params']}
+        lib._index = [tuple(item) for item in meta['index']]
+        return lib
+
+    # ================= 查找 =================
+    def _subset(self, wavelength, where):
+        '''某个波长（及筛选条件）下的行号，按相位升序'''
+        a, b = self._rows(wavelength)
+        rows = np.arange(a, b)
+        for name, value in (where or {}).items():
+            if name not in self.params:
+                raise ValueError(f'未知的几何参数: {name}')
+            v = self.params[name][rows]
+            rows = rows[np.isclose(v, value, rtol=1e-9, atol=0) if np.isscalar(value) else np.isin(v, value)]
+        if rows.size == 0:
+            raise ValueError(f'波长 {wavelength:g} 下没有满足条件 {where} 的单元')
+        return rows
+
+    def _searcher(self, wavelength, where):
+        key = (float(wavelength), json.dumps(where, sort_keys=True, default=str))
+        if key not in self._cache:
+            rows = self._subset(wavelength, where)
+            phase = self.phase[rows]
+            amp = np.abs(self.transmission[rows])
+            n = len(rows)
+            # 相位周期延拓三份，使 [φ-tol, φ+tol] 总是有序数组中的连续一段
+            ext_phase = np.concatenate([phase - TWO_PI, phase, phase + TWO_PI])
+            self._cache[key] = {'rows': rows, 'n': n, 'phase': ext_phase,
+                                'argmax': _SparseArgmax(np.tile(amp, 3))}
+        return self._cache[key]
+
+    def lookup(self, phase_map, wavelength, strategy='nearest', tol=0.1, where=None):
+        '''
+        为整张相位图查找单元
+        phase_map: 目标相位（弧度，任意形状，自动取模 2π）
+        wavelength: 波长（米），须为库中已有的波长
+        strategy: 'nearest' 相位最接近；'transmission' 相位误差 <= tol 的单元中透射率最高的
+                  （窗口内没有单元时退回相位最接近）
+        tol: 'transmission' 的相位容差（弧度，< π）
+        where: 几何参数筛选，如 {'height': 600e-9}
+
+        return: dict（数组形状与 phase_map 相同）
+            'index': 库中的行号
+            'transmission': 所选单元的复透射系数
+            'phase_error': 所选单元相位与目标相位之差（弧度，[-π, π)）
+            以及各几何参数
+        '''
+        if strategy not in STRATEGIES:
+            raise ValueError(f'Invalid strategy(可选 {STRATEGIES})')
+        if strategy == 'transmission' and not 0 <= tol < np.pi:
+            raise ValueError('tol 应在 [0, π) 内')
+        phase_map = np.asarray(phase_map, dtype=np.float64)
+        target = _wrap(phase_map).ravel()
+        s = self._searcher(wavelength, where)
+        ext, n = s['phase'], s['n']
+
+        # 相位最接近：在中间一份附近二分，比较左右两个邻居
+        pos = np.clip(np.searchsorted(ext, target), 1, len(ext) - 1)
+        left_closer = (target - ext[pos - 1]) <= (ext[pos] - target)
+        nearest = np.where(left_closer, pos - 1, pos)
+        if strategy == 'nearest':
+            pick = nearest
+        else:
+            lo = np.searchsorted(ext, target - tol, side='left')
+            hi = np.searchsorted(ext, target + tol, side='right')
+            pick = nearest.copy()
+            ok = hi > lo
+            if ok.any():
+                pick[ok] = s['argmax'].query(lo[ok], hi[ok])
+
+        rows = s['rows'][pick % n]
+        t = self.transmission[rows]
+        result = {'index': rows.reshape(phase_map.shape),
+                  'transmission': t.reshape(phase_map.shape),
+                  'phase_error': (np.mod(np.angle(t) - target + np.pi, TWO_PI) - np.pi).reshape(phase_map.shape)}
+        for name, v in self.params.items():
+            result[name] = v[rows].reshape(phase_map.shape)
+        return result
+
+    def near_field(self, phase_map, wavelength, E_inc=1.0, **kwargs):
+        '''
+        由目标相位图直接构造近场 E_near = E_inc · t(所选单元)，可直接传给 Kirchhoff 等函数
+        E_inc: 入射场（数值或与 phase_map 同形状的数组）
+        kwargs: 传给 lookup 的参数（strategy, tol, where）
+        return: (E_near, selection)
+        '''
+        selection = self.lookup(phase_map, wavelength, **kwargs)
+        return E_inc * selection['transmission'], selection
+
+    def to_layout(self, x_near, y_near, selection, mask=None, layer=1, datatype=0, layout=None):
+        '''
+        把查找结果写成柱子版图（lumapi.gds.PillarLayout），几何参数需包含 radius，或 width 与 length（可选 angle）
+        x_near, y_near: 格点坐标（一维，与 phase_map[y, x] 对应）
+        mask: 只放置 mask 为 True 的格点（如圆形孔径）
+        '''
+        from lumapi.gds import PillarLayout
+        layout = layout or PillarLayout()
+        X, Y = np.meshgrid(x_near, y_near)
+        keep = np.ones(X.shape, dtype=bool) if mask is None else np.asarray(mask, dtype=bool)
+        if 'height' in selection and np.unique(selection['height'][keep]).size > 1:
+            raise ValueError('所选单元的高度不唯一，同一图层只能有一个高度（可用 where={"height": ...} 筛选）')
+        if 'radius' in selection:
+            layout.add_pillars(X[keep], Y[keep], radius=selection['radius'][keep], layer=layer, datatype=datatype)
+        elif 'width' in selection and 'length' in selection:
+            angle = selection['angle'][keep] if 'angle' in selection else 0.0
+            layout.add_pillars(X[keep], Y[keep], width=selection['width'][keep], length=selection['length'][keep],
+                               angle=angle, layer=layer, datatype=datatype)
+        else:
+            raise ValueError('几何参数中需要 radius，或 width 与 length')
+        return layout
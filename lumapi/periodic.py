@@ -0,0 +1,165 @@
+'''
+周期结构（光栅、超表面超胞）的 Floquet 远场计算
+
+只需一个周期的近场：一次二维FFT得到各衍射级的振幅，再由衍射级合成远场，
+计算量与周期数无关，无需把单元近场平铺成巨大的 E_near 再做 Kirchhoff。
+
+采样约定：E_cell[p, q] 位于 r = origin + q/N1·a1 + p/N2·a2（行沿 a2，列沿 a1，
+与 E_near[y, x] 的约定一致；矩形晶格 a1=(Px,0), a2=(0,Py) 时即普通的网格）。
+
+注意：这里的结果是物理场（按面积分），而 Kirchhoff 等函数是对采样点直接求和、
+没有乘面元，两者相差一个采样面元 dA 的因子。
+'''
+import numpy as np
+
+def _reciprocal(a1, a2):
+    a1 = np.asarray(a1, dtype=np.float64)
+    a2 = np.asarray(a2, dtype=np.float64)
+    area = a1[0]*a2[1] - a1[1]*a2[0]
+    if area == 0:
+        raise ValueError('晶格矢量 a1, a2 不能共线')
+    b1 = 2*np.pi / area * np.array([a2[1], -a2[0]])
+    b2 = 2*np.pi / area * np.array([-a1[1], a1[0]])
+    return a1, a2, b1, b2, abs(area)
+
+def floquet_orders(lamb, E_cell, a1, a2, k_inc=(0, 0), origin=(0, 0)):
+    '''
+    计算一个周期近场的衍射级
+    lamb: 波长
+    E_cell: 一个周期的近场，二维数组 (N2, N1)
+    a1, a2: 晶格矢量 (x, y)
+    k_inc: 入射（Floquet）横向波矢 (kx, ky)，近场满足 E(r + a) = E(r)·exp(i k_inc·a)
+    origin: E_cell[0, 0] 的位置
+
+    return: dict
+        'm', 'n': 衍射级次 (一维数组，按 FFT 顺序)
+        'kx', 'ky', 'kz': 各级波矢分量（倏逝级的 kz 为正虚数）
+        'amplitude': 各级的复振幅 c，E(r, z) = Σ c·exp(i(kx·x + ky·y + kz·z))
+        'propagating': 是否为传输级
+        'efficiency': 各传输级的功率占全部传输功率的比例（倏逝级为0）
+    '''
+    E_cell = np.asarray(E_cell, dtype=np.complex128)
+    N2, N1 = E_cell.shape
+    a1, a2, b1, b2, _ = _reciprocal(a1, a2)
+    k = 2*np.pi / lamb
+    k_inc = np.asarray(k_inc, dtype=np.float64)
+    origin = np.asarray(origin, dtype=np.float64)
+
+    # 去掉 Floquet 相位后 E 严格周期，FFT 即为各级傅里叶系数
+    q, p = np.meshgrid(np.arange(N1), np.arange(N2))
+    X = origin[0] + q/N1*a1[0] + p/N2*a2[0]
+    Y = origin[1] + q/N1*a1[1] + p/N2*a2[1]
+    E_per = E_cell * np.exp(-1j*(k_inc[0]*X + k_inc[1]*Y))
+    coeff = np.fft.fft2(E_per) / (N1*N2)
+
+    n, m = np.meshgrid(np.round(np.fft.fftfreq(N2)*N2).astype(int),
+                       np.round(np.fft.fftfreq(N1)*N1).astype(int), indexing='ij')
+    m, n, coeff = m.ravel(), n.ravel(), coeff.ravel()
+    Gx = m*b1[0] + n*b2[0]
+    Gy = m*b1[1] + n*b2[1]
+    # FFT 以 origin 为相位参考，换算到坐标原点
+    coeff = coeff * np.exp(-1j*(Gx*origin[0] + Gy*origin[1]))
+    kx = k_inc[0] + Gx
+    ky = k_inc[1] + Gy
+    kz = np.sqrt((k**2 - kx**2 - ky**2).astype(np.complex128))
+    propagating = kx**2 + ky**2 < k**2
+
+    power = np.where(propagating, np.abs(coeff)**2 * kz.real, 0.0)
+    total = power.sum()
+    efficiency = power / total if total > 0 else power
+    return {'m': m, 'n': n, 'kx': kx, 'ky': ky, 'kz': kz, 'amplitude': coeff,
+            'propagating': propagating, 'efficiency': efficiency}
+
+def periodic_field(lamb, E_cell, a1, a2, x_far, y_far, z_far, k_inc=(0, 0), origin=(0, 0),
+                   evanescent=False, chunk=65536):
+    '''
+    无限周期阵列在 z>0 处的场（由衍射级合成，计算量与周期数无关）
+    x_far, y_far, z_far: 远场位置，与 Kirchhoff 相同（按 'ij' 网格组合）
+    evanescent: 是否包含倏逝级（远场一般可忽略）
+    return: np.ndarray(len(x_far), len(y_far), len(z_far))
+    '''
+    orders = floquet_orders(lamb, E_cell, a1, a2, k_inc, origin)
+    keep = np.ones_like(orders['propagating']) if evanescent else orders['propagating']
+    keep = keep & (orders['amplitude'] != 0)
+    c = orders['amplitude'][keep]
+    kx, ky, kz = orders['kx'][keep], orders['ky'][keep], orders['kz'][keep]
+
+    x_far = np.atleast_1d(np.asarray(x_far, dtype=np.float64))
+    y_far = np.atleast_1d(np.asarray(y_far, dtype=np.float64))
+    z_far = np.atleast_1d(np.asarray(z_far, dtype=np.float64))
+    X, Y, Z = (a.ravel() for a in np.meshgrid(x_far, y_far, z_far, indexing='ij'))
+    E_far = np.zeros(X.size, dtype=np.complex128)
+    for start in range(0, X.size, chunk):
+        sl = slice(start, start + chunk)
+        phase = np.outer(X[sl], kx) + np.outer(Y[sl], ky) + np.outer(Z[sl], kz)
+        E_far[sl] = np.exp(1j*phase) @ c
+    return E_far.reshape(len(x_far), len(y_far), len(z_far))
+
+def _dirichlet(psi, N):
+    '''Σ_{p=0}^{N-1} exp(-i·psi·(p - (N-1)/2)) = sin(N·psi/2) / sin(psi/2)'''
+    psi = np.asarray(psi, dtype=np.float64)
+    half = psi / 2
+    s = np.sin(half)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        af = np.sin(N*half) / s
+    # psi 为 2π 整数倍时取极限 N·cos(N·psi/2)/cos(psi/2) = ±N
+    singular = np.abs(s) < 1e-12
+    return np.where(singular, N * np.cos(N * half) / np.where(singular, np.cos(half), 1.0), af)
+
+def array_factor(kx, ky, a1, a2, n_periods, k_inc=(0, 0)):
+    '''
+    以原点为中心的 P×Q 有限阵列的阵因子
+    kx, ky: 观察方向的横向波矢
+    n_periods: (P, Q)，沿 a1、a2 的周期数
+    '''
+    a1 = np.asarray(a1, dtype=np.float64)
+    a2 = np.asarray(a2, dtype=np.float64)
+    P, Q = n_periods
+    dkx = np.asarray(kx) - k_inc[0]
+    dky = np.asarray(ky) - k_inc[1]
+    return _dirichlet(dkx*a1[0] + dky*a1[1], P) * _dirichlet(dkx*a2[0] + dky*a2[1], Q)
+
+def cell_spectrum(E_cell, a1, a2, kx, ky, origin=(0, 0), chunk=4096):
+    '''
+    单个周期近场的空间频谱 F(kx, ky) = ∫ E(r)·exp(-i(kx·x + ky·y)) dA（直接DFT，任意 kx, ky）
+    '''
+    E_cell = np.asarray(E_cell, dtype=np.complex128)
+    N2, N1 = E_cell.shape
+    a1, a2, _, _, area = _reciprocal(a1, a2)
+    origin = np.asarray(origin, dtype=np.float64)
+    q, p = np.meshgrid(np.arange(N1), np.arange(N2))
+    X = (origin[0] + q/N1*a1[0] + p/N2*a2[0]).ravel()
+    Y = (origin[1] + q/N1*a1[1] + p/N2*a2[1]).ravel()
+    E = E_cell.ravel() * (area / (N1*N2))
+    kx = np.asarray(kx, dtype=np.float64)
+    ky = np.asarray(ky, dtype=np.float64)
+    shape = np.broadcast(kx, ky).shape
+    kx, ky = np.broadcast_to(kx, shape).ravel(), np.broadcast_to(ky, shape).ravel()
+    F = np.zeros(kx.size, dtype=np.complex128)
+    for start in range(0, kx.size, chunk):
+        sl = slice(start, start + chunk)
+        F[sl] = np.exp(-1j*(np.outer(kx[sl], X) + np.outer(ky[sl], Y))) @ E
+    return F.reshape(shape)
+
+def finite_array_far_field(lamb, E_cell, a1, a2, n_periods, x_far, y_far, z_far, k_inc=(0, 0), origin=(0, 0)):
+    '''
+    有限周期阵列（P×Q 个周期，阵列中心在原点）的 Fraunhofer 远场 = 单元频谱 × 阵因子
+    第 (p, q) 个周期的近场为 E_cell·exp(i k_inc·R_pq)
+    n_periods: (P, Q)
+    origin: 中心周期（偶数个周期时为假想的中心周期）内 E_cell[0, 0] 的位置
+    x_far, y_far, z_far: 远场位置（按 'ij' 网格组合），应满足远场条件 z >> (阵列尺寸)²/λ
+    return: np.ndarray(len(x_far), len(y_far), len(z_far))
+    '''
+    k = 2*np.pi / lamb
+    x_far = np.atleast_1d(np.asarray(x_far, dtype=np.float64))
+    y_far = np.atleast_1d(np.asarray(y_far, dtype=np.float64))
+    z_far = np.atleast_1d(np.asarray(z_far, dtype=np.float64))
+    X, Y, Z = np.meshgrid(x_far, y_far, z_far, indexing='ij')
+    R = np.sqrt(X**2 + Y**2 + Z**2)
+    kx, ky = k*X/R, k*Y/R
+
+    # 各周期相对中心周期的平移为 (p-(P-1)/2)·a1 + (q-(Q-1)/2)·a2，阵因子已包含这部分相位
+    F = cell_spectrum(E_cell, a1, a2, kx, ky, origin)
+    AF = array_factor(kx, ky, a1, a2, n_periods, k_inc)
+    # Rayleigh-Sommerfeld 远场近似：E = -i·k·cosθ/(2π R)·exp(ikR)·F
+    return -1j*k*(Z/R) / (2*np.pi*R) * np.exp(1j*k*R) * F * AF
@@ -0,0 +1,339 @@
+'''
+批量远场计算流水线：读取 -> 计算 -> 写出 三个阶段并行重叠
+
+读取线程预取并解码近场文件，计算池（默认多进程）调用 Kirchhoff / RorySommerfeld_*，
+写出线程保存结果。阶段之间用有界队列连接：计算跟不上时读取线程阻塞，
+未写出的结果数也受 inflight 限制，内存占用有上界。结束时打印各阶段的利用率。
+
+    python lumapi_propagate.py "exports/*.npz" --lamb 1.55e-6 --x-far=-50e-6,50e-6,201 \
+        --y-far=-50e-6,50e-6,201 --z-far 100e-6 --out-dir far/
+
+近场文件（.npz，或需要 scipy 的 .mat）包含:
+    x_near (或 x), y_near (或 y): 近场坐标
+    E_near (或 E): 近场 [y, x]；RorySommerfeld_Vector 需要 E_near_x 与 E_near_y
+    可选 lamb (或 wavelength)、x_far、y_far、z_far，覆盖命令行参数
+输出文件（.npz）: E_far（矢量为 E_far_x/E_far_y/E_far_z）、x_far、y_far、z_far、lamb
+'''
+import os
+import sys
+import glob
+import json
+import time
+import queue
+import argparse
+import threading
+import concurrent.futures
+
+import numpy as np
+
+KERNELS = ('Kirchhoff', 'RorySommerfeld_Scalar', 'RorySommerfeld_Vector')
+_DONE = object()
+
+_ALIASES = {
+    'x_near': ('x_near', 'x'),
+    'y_near': ('y_near', 'y'),
+    'E_near': ('E_near', 'E'),
+    'E_near_x': ('E_near_x', 'Ex'),
+    'E_near_y': ('E_near_y', 'Ey'),
+    'lamb': ('lamb', 'lambda', 'wavelength'),
+    'x_far': ('x_far',),
+    'y_far': ('y_far',),
+    'z_far': ('z_far',),
+}
+
+# ================= 文件读写 =================
+def load_near_field(path):
+    '''读取近场文件，return: 按标准名称整理的数组字典'''
+    if path.lower().endswith('.mat'):
+        try:
+            from scipy.io import loadmat
+        except ImportError:
+            raise ImportError('读取 .mat 文件需要 scipy，请先安装 scipy 或导出为 .npz') from None
+        raw = {k: v for k, v in loadmat(path).items() if not k.startswith('__')}
+    else:
+        with np.load(path, allow_pickle=False) as data:
+            raw = {k: data[k] for k in data.files}
+    fields = {}
+    for name, keys in _ALIASES.items():
+        for key in keys:
+            if key in raw:
+                value = np.asarray(raw[key])
+                fields[name] = value if name.startswith('E_near') else value.ravel()
+                break
+    if 'lamb' in fields:
+        fields['lamb'] = float(fields['lamb'][0])
+    for name in ('x_near', 'y_near'):
+        if name not in fields:
+            raise KeyError(f'{path} 中缺少 {name}')
+    return fields
+
+def save_far_field(path, outputs):
+    '''保存结果（先写临时文件再替换，中断时不会留下不完整的输出）'''
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp = f'{path}.tmp{os.getpid()}_{threading.get_ident()}'
+    with open(tmp, 'wb') as f:
+        np.savez(f, **outputs)
+    os.replace(tmp, path)
+
+def expand_inputs(patterns=(), manifest=None):
+    '''
+    展开输入：patterns 为文件路径或通配符（支持 **），manifest 为清单文件
+    清单为 JSON 列表（元素为路径，或 {"input": ..., "output": ..., "lamb": ...}），或每行一个路径的文本
+    return: [{'input': 路径, 'output': 路径或 None, ...}, ...]
+    '''
+    entries = []
+    for pattern in patterns:
+        matched = sorted(glob.glob(pattern, recursive=True))
+        if not matched and not glob.has_magic(pattern):
+            matched = [pattern]
+        entries += [{'input': p} for p in matched]
+    if manifest:
+        base = os.path.dirname(os.path.abspath(manifest))
+        with open(manifest, 'r', encoding='utf-8') as f:
+            text = f.read()
+        try:
+            items = json.loads(text)
+        except ValueError:
+            items = [line.strip() for line in text.splitlines() if line.strip() and not line.startswith('#')]
+        for item in items:
+            entry = dict(item) if isinstance(item, dict) else {'input': item}
+            for key in ('input', 'output'):
+                if entry.get(key) and not os.path.isabs(entry[key]):
+                    entry[key] = os.path.join(base, entry[key])
+            entries.append(entry)
+    return entries
+
+def _output_path(entry, out_dir, suffix):
+    if entry.get('output'):
+        return entry['output']
+    stem = os.path.splitext(os.path.basename(entry['input']))[0]
+    return os.path.join(out_dir or os.path.dirname(os.path.abspath(entry['input'])), f'{stem}{suffix}.npz')
+
+# ================= 计算 =================
+def _propagate(job):
+    '''在计算池中运行，return: (结果字典, 计算耗时)'''
+    from lumapi import lumapi as core
+    t0 = time.perf_counter()
+    kernel, f = job['kernel'], job['fields']
+    params = {'mode': job['mode'], 'eps': job['eps'], 'quadrature': job['quadrature']}
+    far = (job['x_far'], job['y_far'], job['z_far'])
+    if kernel == 'RorySommerfeld_Vector':
+        _, Ex, Ey, Ez = core.RorySommerfeld_Vector(job['lamb'], f['x_near'], f['y_near'],
+                                                   f['E_near_x'], f['E_near_y'], *far, **params)
+        outputs = {'E_far_x': Ex, 'E_far_y': Ey, 'E_far_z': Ez}
+    else:
+        outputs = {'E_far': getattr(core, kernel)(job['lamb'], f['x_near'], f['y_near'], f['E_near'], *far, **params)}
+    outputs.update(x_far=job['x_far'], y_far=job['y_far'], z_far=job['z_far'], lamb=np.array(job['lamb']))
+    return outputs, time.perf_counter() - t0
+
+class _Stage:
+    '''一个阶段的统计：busy 为实际工作时间，blocked 为等待下游队列的时间'''
+    def __init__(self, name, threads):
+        self.name, self.threads = name, threads
+        self.busy = self.blocked = 0.0
+        self.items = 0
+        self.lock = threading.Lock()
+
+    def add(self, busy=0.0, blocked=0.0, items=0):
+        with self.lock:
+            self.busy += busy
+            self.blocked += blocked
+            self.items += items
+
+    def report(self, wall):
+        capacity = max(wall * self.threads, 1e-12)
+        return {'threads': self.threads, 'items': self.items, 'busy': self.busy, 'blocked': self.blocked,
+                'utilization': self.busy / capacity, 'blocked_fraction': self.blocked / capacity}
+
+# ================= 流水线 =================
+def run_pipeline(entries, out_dir=None, kernel='Kirchhoff', lamb=None, x_far=None, y_far=None, z_far=None,
+                 mode='auto', eps=1e-6, quadrature=None, readers=2, workers=1, writers=1, pool='process',
+                 prefetch=4, inflight=None, suffix='_far', overwrite=False, verbose=True):
+    '''
+    批量计算远场
+    entries: expand_inputs 的返回值（或路径列表）
+    lamb, x_far, y_far, z_far: 默认参数，近场文件中的同名字段优先
+    readers, workers, writers: 读取线程数、计算池大小、写出线程数
+    pool: 'process' 多进程计算池；'thread' 线程池（计算本身已多线程时，如 mode='numba'）
+    prefetch: 读取完成、等待计算的文件数上限
+    inflight: 已提交计算但尚未写出的文件数上限，默认 2 * workers
+    overwrite: 为 False 时跳过已存在的输出文件
+
+    return: dict，包含 files / skipped / failed（[(路径, 错误)]）/ wall / stages（各阶段统计）
+    '''
+    if kernel not in KERNELS:
+        raise ValueError(f'Invalid kernel(可选 {KERNELS})')
+    if pool not in ('process', 'thread'):
+        raise ValueError("pool 应为 'process' 或 'thread'")
+    entries = [e if isinstance(e, dict) else {'input': e} for e in entries]
+    inflight = inflight or 2 * workers
+
+    todo, skipped = queue.Queue(), []
+    for entry in entries:
+        entry = dict(entry, output=_output_path(entry, out_dir, suffix))
+        if not overwrite and os.path.exists(entry['output']):
+            skipped.append(entry['input'])
+        else:
+            todo.put(entry)
+    total = todo.qsize()
+
+    stages = {'read': _Stage('读取', readers), 'compute': _Stage('计算', workers), 'write': _Stage('写出', writers)}
+    loaded = queue.Queue(maxsize=prefetch)
+    finished = queue.Queue()
+    slots = threading.Semaphore(inflight)
+    failed, failed_lock = [], threading.Lock()
+    progress = [0]
+
+    def fail(entry, error):
+        with failed_lock:
+            failed.append((entry['input'], f'{type(error).__name__}: {error}'))
+            progress[0] += 1
+        if verbose:
+            print(f"[失败] {entry['input']}: {error}", flush=True)
+
+    def reader():
+        while True:
+            try:
+                entry = todo.get_nowait()
+            except queue.Empty:
+                return
+            t0 = time.perf_counter()
+            try:
+                fields = load_near_field(entry['input'])
+                job = {'kernel': kernel, 'mode': mode, 'eps': eps, 'quadrature': quadrature, 'fields': fields}
+                for name, default in (('lamb', lamb), ('x_far', x_far), ('y_far', y_far), ('z_far', z_far)):
+                    value = entry.get(name, fields.pop(name, default))
+                    if value is None:
+                        raise ValueError(f'未指定 {name}（命令行参数或文件中的 {name}）')
+                    job[name] = float(value) if name == 'lamb' else np.atleast_1d(np.asarray(value, dtype=np.float64))
+            except Exception as e:
+                stages['read'].add(busy=time.perf_counter() - t0)
+                fail(entry, e)
+                continue
+            t1 = time.perf_counter()
+            loaded.put((entry, job))
+            stages['read'].add(busy=t1 - t0, blocked=time.perf_counter() - t1, items=1)
+
+    def writer():
+        while True:
+            item = finished.get()
+            if item is _DONE:
+                return
+            entry, future = item
+            try:
+                outputs, seconds = future.result()
+                stages['compute'].add(busy=seconds, items=1)
+                t0 = time.perf_counter()
+                save_far_field(entry['output'], outputs)
+                stages['write'].add(busy=time.perf_counter() - t0, items=1)
+                with failed_lock:
+                    progress[0] += 1
+                if verbose:
+                    print(f"[完成 {progress[0]}/{total}] {entry['input']} -> {entry['output']} "
+                          f"(计算 {seconds:.2f}s)", flush=True)
+            except Exception as e:
+                fail(entry, e)
+            finally:
+                slots.release()
+
+    Executor = concurrent.futures.ProcessPoolExecutor if pool == 'process' else concurrent.futures.ThreadPoolExecutor
+    t_start = time.perf_counter()
+    reader_threads = [threading.Thread(target=reader, daemon=True) for _ in range(readers)]
+    writer_threads = [threading.Thread(target=writer, daemon=True) for _ in range(writers)]
+    for t in reader_threads + writer_threads:
+        t.start()
+    threading.Thread(target=lambda: ([t.join() for t in reader_threads], loaded.put(_DONE)), daemon=True).start()
+
+    with Executor(max_workers=workers) as executor:
+        while True:
+            item = loaded.get()
+            if item is _DONE:
+                break
+            slots.acquire()
+            entry, job = item
+            future = executor.submit(_propagate, job)
+            future.add_done_callback(lambda f, entry=entry: finished.put((entry, f)))
+        # 所有名额归还即所有结果都已写出
+        for _ in range(inflight):
+            slots.acquire()
+    for _ in writer_threads:
+        finished.put(_DONE)
+    for t in writer_threads:
+        t.join()
+    wall = time.perf_counter() - t_start
+
+    report = {'files': total - len(failed), 'skipped': skipped, 'failed': failed, 'wall': wall,
+              'stages': {key: stage.report(wall) for key, stage in stages.items()}}
+    if verbose:
+        print_report(report)
+    return report
+
+def print_report(report):
+    names = {'read': '读取', 'compute': '计算', 'write': '写出'}
+    print(f"\n完成 {report['files']} 个文件，跳过 {len(report['skipped'])} 个，失败 {len(report['failed'])} 个，"
+          f"总耗时 {report['wall']:.2f}s")
+    print(f"{'阶段':<6}{'并发':>6}{'文件数':>8}{'工作(s)':>10}{'利用率':>9}{'阻塞':>9}")
+    serial = 0.0
+    for key, s in report['stages'].items():
+        serial += s['busy']
+        print(f"{names[key]:<6}{s['threads']:>6}{s['items']:>8}{s['busy']:>10.2f}"
+              f"{s['utilization']:>9.1%}{s['blocked_fraction']:>9.1%}")
+    if report['wall'] > 0:
+        print(f"各阶段工作时间之和 {serial:.2f}s，重叠加速 {serial / report['wall']:.2f}x")
+    for path, error in report['failed']:
+        print(f"[失败] {path}: {error}")
+
+# ================= 命令行 =================
+def _axis(text):
+    '''
+    远场坐标参数：一个值为单点，逗号分隔的 start,stop,num 等价于 np.linspace
+    负数开头的值用 = 连接，如 --x-far=-50e-6,50e-6,201（否则会被当成选项）
+    '''
+    try:
+        values = [float(v) for v in text.split(',')]
+    except ValueError:
+        raise argparse.ArgumentTypeError(f'无法解析坐标 {text!r}')
+    if len(values) == 1:
+        return np.array(values, dtype=np.float64)
+    if len(values) == 3 and values[2] == int(values[2]) and values[2] >= 1:
+        return np.linspace(values[0], values[1], int(values[2]))
+    raise argparse.ArgumentTypeError(f'坐标应为一个值或 start,stop,num 三个值，实际为 {text!r}')
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='lumapi-propagate: 批量近场 -> 远场计算（读取/计算/写出流水线）')
+    parser.add_argument('inputs', nargs='*', help='近场文件或通配符（如 "exports/**/*.npz"）')
+    parser.add_argument('--manifest', help='清单文件（JSON 列表或每行一个路径）')
+    parser.add_argument('--kernel', default='Kirchhoff', choices=KERNELS)
+    parser.add_argument('--lamb', type=float, help='波长（米），文件中有 lamb 时以文件为准')
+    parser.add_argument('--x-far', type=_axis, help='远场 x：一个值，或 start,stop,num（负数开头时写成 --x-far=-1e-5,1e-5,101）')
+    parser.add_argument('--y-far', type=_axis, help='远场 y：一个值，或 start,stop,num（负数开头时写成 --y-far=-1e-5,1e-5,101）')
+    parser.add_argument('--z-far', type=_axis, help='远场 z：一个值，或 start,stop,num（负数开头时写成 --z-far=-1e-5,1e-5,101）')
+    parser.add_argument('--mode', default='auto', help="计算模式（默认 'auto'）")
+    parser.add_argument('--eps', type=float, default=1e-6)
+    parser.add_argument('--quadrature', default=None)
+    parser.add_argument('--out-dir', help='输出目录（默认与输入文件相同）')
+    parser.add_argument('--suffix', default='_far', help='输出文件名后缀')
+    parser.add_argument('--readers', type=int, default=2, help='读取线程数')
+    parser.add_argument('--workers', type=int, default=1, help='计算池大小')
+    parser.add_argument('--writers', type=int, default=1, help='写出线程数')
+    parser.add_argument('--pool', default='process', choices=('process', 'thread'))
+    parser.add_argument('--prefetch', type=int, default=4, help='预取文件数上限')
+    parser.add_argument('--overwrite', action='store_true', help='覆盖已存在的输出')
+    parser.add_argument('--json', help='将统计结果保存为 JSON')
+    args = parser.parse_args(argv)
+
+    entries = expand_inputs(args.inputs, args.manifest)
+    if not entries:
+        parser.error('没有找到输入文件')
+    report = run_pipeline(entries, out_dir=args.out_dir, kernel=args.kernel, lamb=args.lamb,
+                          x_far=args.x_far, y_far=args.y_far, z_far=args.z_far,
+                          mode=args.mode, eps=args.eps, quadrature=args.quadrature, readers=args.readers,
+                          workers=args.workers, writers=args.writers, pool=args.pool, prefetch=args.prefetch,
+                          suffix=args.suffix, overwrite=args.overwrite)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=4, ensure_ascii=False)
+    sys.exit(1 if report['failed'] else 0)
+
+if __name__ == '__main__':
+    main()
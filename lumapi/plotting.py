@@ -0,0 +1,230 @@
+'''
+大场数据的分级显示（level of detail）
+
+对千万像素级的光强图直接 imshow 时，matplotlib 每次重绘都要重采样整张图，比传播计算本身还慢。
+FieldPyramid 预先把光强逐级 2×2 抽取（保留最大值 / 最小值 / 平均值）得到金字塔，
+LODImage 只渲染与屏幕像素数匹配的那一级中可见的部分，缩放/平移时自动切换到更精细的级别。
+颜色映射（可选对数光强）用 NumPy 查表完成，交给 matplotlib 的是 uint8 RGB 图像。
+
+from lumapi.plotting import imshow_lod
+fig, ax = plt.subplots()
+img = imshow_lod(ax, np.abs(E_far[0]).T**2, extent=[y0, y1, z0, z1], cmap=create_cmap('red'), log=True)
+fig.colorbar(img.mappable, ax=ax)
+'''
+import time
+
+import numpy as np
+
+REDUCTIONS = ('max', 'min', 'mean')
+
+def _reduce2x2(data, reduce):
+    '''2×2 块抽取，奇数边长时复制边缘补齐'''
+    ny, nx = data.shape
+    if ny % 2 or nx % 2:
+        data = np.pad(data, ((0, ny % 2), (0, nx % 2)), mode='edge')
+    a, b, c, d = data[0::2, 0::2], data[0::2, 1::2], data[1::2, 0::2], data[1::2, 1::2]
+    if reduce == 'max':
+        return np.maximum(np.maximum(a, b), np.maximum(c, d))
+    if reduce == 'min':
+        return np.minimum(np.minimum(a, b), np.minimum(c, d))
+    return ((a + b) + (c + d)) * 0.25
+
+class FieldPyramid:
+    '''
+    光强金字塔：levels[0] 为原始数据，levels[i] 每个像素对应原始数据 2^i × 2^i 的块
+    data: 二维实数组（光强）；复数组按 |E|² 处理
+    reduce: 'max' 保留峰值（默认，焦点等亮点在缩小时不会消失）/ 'min' / 'mean' 保留总能量分布
+    min_size: 最粗一级的边长下限
+    dtype: 金字塔的存储类型，默认 float32（只用于显示）
+    '''
+    def __init__(self, data, reduce='max', min_size=64, dtype=np.float32):
+        if reduce not in REDUCTIONS:
+            raise ValueError(f'Invalid reduce(可选 {REDUCTIONS})')
+        data = np.asarray(data)
+        if data.ndim != 2:
+            raise ValueError(f'需要二维数组，得到形状 {data.shape}')
+        if np.iscomplexobj(data):
+            data = np.abs(data)**2
+        t0 = time.perf_counter()
+        self.reduce = reduce
+        self.shape = data.shape
+        self.levels = [np.ascontiguousarray(data, dtype=dtype)]
+        while min(self.levels[-1].shape) > 2 * min_size:
+            self.levels.append(_reduce2x2(self.levels[-1], reduce))
+        # 全局范围取自原始数据，保证各级别颜色一致
+        self.vmin = float(np.nanmin(self.levels[0]))
+        self.vmax = float(np.nanmax(self.levels[0]))
+        self.build_time = time.perf_counter() - t0
+
+    def __len__(self):
+        return len(self.levels)
+
+    def level_for(self, rows, cols, height_px, width_px):
+        '''可见区域为 rows × cols 个原始像素、屏幕上为 height_px × width_px 时应渲染的级别（每个屏幕像素至少一个数据像素）'''
+        ratio = min(rows / max(height_px, 1), cols / max(width_px, 1))
+        if ratio <= 1:
+            return 0
+        return int(min(np.floor(np.log2(ratio)), len(self.levels) - 1))
+
+    def crop(self, level, r0, r1, c0, c1):
+        '''
+        取第 level 级中覆盖原始像素 [r0, r1) × [c0, c1) 的部分
+        return: (图像, (实际覆盖的原始像素 r0, r1, c0, c1))
+        '''
+        s = 2**level
+        image = self.levels[level]
+        i0, i1 = max(int(r0) // s, 0), min(-(-int(np.ceil(r1)) // s), image.shape[0])
+        j0, j1 = max(int(c0) // s, 0), min(-(-int(np.ceil(c1)) // s), image.shape[1])
+        i1, j1 = max(i1, i0 + 1), max(j1, j0 + 1)
+        covered = (i0 * s, min(i1 * s, self.shape[0]), j0 * s, min(j1 * s, self.shape[1]))
+        return image[i0:i1, j0:j1], covered
+
+def colorize(values, cmap='inferno', vmin=None, vmax=None, log=False, db_range=40.0, lut_size=1024):
+    '''
+    向量化的颜色映射：NumPy 查表得到 uint8 RGBA 图像
+    log: 显示 10·log10(I / vmax)（dB），下限为 -db_range
+    return: (rgba, norm_vmin, norm_vmax)，后两者为颜色条使用的范围
+    '''
+    import matplotlib
+    cmap = matplotlib.colormaps[cmap] if isinstance(cmap, str) else cmap
+    values = np.asarray(values, dtype=np.float32)
+    vmax = float(np.nanmax(values)) if vmax is None else vmax
+    if log:
+        ref = vmax if vmax > 0 else 1.0
+        with np.errstate(divide='ignore', invalid='ignore'):
+            values = 10 * np.log10(np.maximum(values, 0) / ref)
+        lo, hi = -db_range, 0.0
+    else:
+        lo = float(np.nanmin(values)) if vmin is None else vmin
+        hi = vmax
+    lut = (cmap(np.linspace(0, 1, lut_size)) * 255).round().astype(np.uint8)
+    scale = (lut_size - 1) / (hi - lo) if hi > lo else 0.0
+    index = np.nan_to_num((values - lo) * scale, nan=0.0, neginf=0.0, posinf=lut_size - 1)
+    index = np.clip(index, 0, lut_size - 1).astype(np.intp)
+    return lut[index], lo, hi
+
+class LODImage:
+    '''
+    在坐标轴上显示 FieldPyramid，缩放/平移/改变窗口大小时按屏幕像素重新选择级别并裁剪可见部分
+    ax: matplotlib 坐标轴
+    extent: (left, right, bottom, top)，与 imshow 相同，默认为像素坐标
+    origin: 'lower' 或 'upper'，与 imshow 相同
+    cmap, log, db_range, vmin, vmax: 颜色映射参数，见 colorize；rgb=False 时交给 matplotlib 做颜色映射
+    oversample: 每个屏幕像素对应的数据像素数下限（>1 时显示更清晰但更慢）
+    '''
+    def __init__(self, ax, pyramid, extent=None, origin='upper', cmap='inferno', log=False, db_range=40.0,
+                 vmin=None, vmax=None, rgb=True, aspect='auto', oversample=1.0, interpolation='nearest'):
+        from matplotlib.cm import ScalarMappable
+        from matplotlib.colors import Normalize
+        self.ax = ax
+        self.pyramid = pyramid
+        ny, nx = pyramid.shape
+        self.extent = tuple(extent) if extent is not None else (-0.5, nx - 0.5, ny - 0.5, -0.5) \
+            if origin == 'upper' else (-0.5, nx - 0.5, -0.5, ny - 0.5)
+        self.origin = origin
+        self.cmap, self.log, self.db_range, self.rgb = cmap, log, db_range, rgb
+        self.vmin = pyramid.vmin if vmin is None else vmin
+        self.vmax = pyramid.vmax if vmax is None else vmax
+        self.oversample = oversample
+        self.level = None
+        self.inside = True
+        self.render_time = 0.0
+        self.renders = 0
+        self._busy = False
+
+        image, extent, lo, hi = self._render()
+        kwargs = {} if rgb else {'cmap': cmap, 'vmin': lo, 'vmax': hi}
+        self.image = ax.imshow(image, extent=extent, origin=origin, aspect=aspect, interpolation=interpolation,
+                               **kwargs)
+        left, right, bottom, top = self.extent
+        ax.set_xlim(left, right)
+        ax.set_ylim(bottom, top)
+        ax.set_autoscale_on(False)
+        # 颜色条使用的映射（rgb=True 时图像本身没有数值）
+        self.mappable = self.image if not rgb else ScalarMappable(Normalize(lo, hi), cmap)
+        self._cids = [ax.callbacks.connect('xlim_changed', self._on_change),
+                      ax.callbacks.connect('ylim_changed', self._on_change),
+                      ax.figure.canvas.mpl_connect('resize_event', self._on_change)]
+
+    def _visible(self):
+        '''
+        可见区域对应的原始像素范围 (r0, r1, c0, c1)、屏幕像素大小，以及坐标范围是否与数据相交
+        范围总是落在数据内且至少一个像素（平移到数据外时取最近的边缘像素，图像由调用方隐藏）
+        '''
+        ny, nx = self.pyramid.shape
+        left, right, bottom, top = self.extent
+        if not hasattr(self, 'image'):
+            x0, x1, y0, y1 = left, right, bottom, top
+        else:
+            (x0, x1), (y0, y1) = self.ax.get_xlim(), self.ax.get_ylim()
+        # 坐标 -> 列号 / 行号（行号按 origin 方向）
+        cols = sorted(((x - left) / (right - left) * nx for x in (x0, x1)))
+        rows = sorted(((y - bottom) / (top - bottom) * ny for y in (y0, y1)))
+        if self.origin == 'upper':
+            rows = sorted(ny - r for r in rows)
+        inside = cols[1] > 0 and cols[0] < nx and rows[1] > 0 and rows[0] < ny
+        c0, r0 = min(max(cols[0], 0), nx - 1), min(max(rows[0], 0), ny - 1)
+        c1, r1 = min(max(cols[1], c0 + 1), nx), min(max(rows[1], r0 + 1), ny)
+        bbox = self.ax.get_window_extent()
+        return (r0, r1, c0, c1), bbox.height * self.oversample, bbox.width * self.oversample, inside
+
+    def _render(self):
+        t0 = time.perf_counter()
+        (r0, r1, c0, c1), height_px, width_px, self.inside = self._visible()
+        self.level = self.pyramid.level_for(r1 - r0, c1 - c0, height_px, width_px)
+        data, (R0, R1, C0, C1) = self.pyramid.crop(self.level, r0, r1, c0, c1)
+        ny, nx = self.pyramid.shape
+        left, right, bottom, top = self.extent
+        x = lambda c: left + (right - left) * c / nx
+        if self.origin == 'upper':
+            y = lambda r: top + (bottom - top) * r / ny
+            extent = (x(C0), x(C1), y(R1), y(R0))
+        else:
+            y = lambda r: bottom + (top - bottom) * r / ny
+            extent = (x(C0), x(C1), y(R0), y(R1))
+        if self.rgb:
+            image, lo, hi = colorize(data, self.cmap, self.vmin, self.vmax, self.log, self.db_range)
+        elif self.log:
+            with np.errstate(divide='ignore', invalid='ignore'):
+                image = np.maximum(10 * np.log10(np.maximum(data, 0) / self.vmax), -self.db_range)
+            lo, hi = -self.db_range, 0.0
+        else:
+            image, lo, hi = data, self.vmin, self.vmax
+        self.render_time += time.perf_counter() - t0
+        self.renders += 1
+        return image, extent, lo, hi
+
+    def _on_change(self, *args):
+        if self._busy or not hasattr(self, 'image'):
+            return
+        self._busy = True
+        try:
+            image, extent, _, _ = self._render()
+            self.image.set_data(image)
+            self.image.set_extent(extent)
+            self.image.set_visible(self.inside)
+            self.ax.figure.canvas.draw_idle()
+        finally:
+            self._busy = False
+
+    def refresh(self):
+        '''手动刷新（修改坐标范围后立即重新渲染）'''
+        self._on_change()
+
+    def disconnect(self):
+        for cid in self._cids[:2]:
+            self.ax.callbacks.disconnect(cid)
+        self.ax.figure.canvas.mpl_disconnect(self._cids[2])
+
+def imshow_lod(ax, data, extent=None, origin='upper', reduce='max', cmap='inferno', log=False, db_range=40.0,
+               vmin=None, vmax=None, rgb=True, aspect='auto', **kwargs):
+    '''
+    imshow 的分级显示版本：data 为二维光强（复数按 |E|²），其余参数与 imshow 相同
+    reduce: 'max' / 'min' / 'mean'，见 FieldPyramid
+    log: 显示对数光强（dB，相对最大值，下限 -db_range）
+    data 也可以是已建好的 FieldPyramid（同一数据多次显示时复用）
+    return: LODImage（.image 为 AxesImage，.mappable 用于 colorbar，.level 为当前级别）
+    '''
+    pyramid = data if isinstance(data, FieldPyramid) else FieldPyramid(data, reduce)
+    return LODImage(ax, pyramid, extent=extent, origin=origin, cmap=cmap, log=log, db_range=db_range,
+                    vmin=vmin, vmax=vmax, rgb=rgb, aspect=aspect, **kwargs)
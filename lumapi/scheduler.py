@@ -0,0 +1,298 @@
+import os
+import sys
+import time
+import glob
+import re
+import shutil
+import platform
+import subprocess
+
+from lumapi.lumapi import CONFIG_PATH, load_config
+
+# 作业状态
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+# 各平台下求解引擎可执行文件的候选名称（按优先级排列）
+ENGINE_NAMES = {
+    'Windows': ['fdtd-engine-msmpi.exe', 'fdtd-engine.exe'],
+    'Linux': ['fdtd-engine-ompi-lcl', 'fdtd-engine-mpich2nem', 'fdtd-engine-impi-lcl', 'fdtd-engine'],
+}
+
+def configured_install(config_path=CONFIG_PATH):
+    """读取config.json，返回(lumerical_path, version)"""
+    config = load_config(config_path)
+    lumerical_path = config.get('lumerical_path')
+    if not lumerical_path:
+        raise ValueError("配置文件中缺少lumerical_path字段")
+    return lumerical_path, config.get('version')
+
+def find_engine(lumerical_path, version):
+    """在Lumerical安装目录下查找FDTD求解引擎，返回(engine, mpiexec)，未找到时为None"""
+    base = os.path.join(lumerical_path, version)
+    names = ENGINE_NAMES.get(platform.system(), ENGINE_NAMES['Linux'])
+    bin_dirs = [os.path.join(base, "bin"), os.path.join(base, "Lumerical", "bin")]
+
+    engine = None
+    for bin_dir in bin_dirs:
+        for name in names:
+            path = os.path.join(bin_dir, name)
+            if os.path.exists(path):
+                engine = path
+                break
+        if engine:
+            break
+
+    # mpiexec：优先使用安装目录自带的版本，其次使用PATH中的版本
+    mpiexec = None
+    exe = "mpiexec.exe" if platform.system() == "Windows" else "mpiexec"
+    candidates = [os.path.join(d, exe) for d in bin_dirs]
+    candidates += glob.glob(os.path.join(base, "mpich2", "*", "bin", exe))
+    candidates += glob.glob(os.path.join(base, "Lumerical", "mpich2", "*", "bin", exe))
+    for path in candidates:
+        if os.path.exists(path):
+            mpiexec = path
+            break
+    if not mpiexec:
+        mpiexec = shutil.which(exe)
+    return engine, mpiexec
+
+
+class EngineJob:
+    '''
+    单个求解作业
+    fsp: 待计算的.fsp文件路径
+    cores: 分配的核数（None时由调度器自动分配）
+    state: 'queued' / 'running' / 'done' / 'failed'
+    '''
+    def __init__(self, job_id, fsp, cores=None):
+        self.id = job_id
+        self.fsp = os.path.abspath(fsp)
+        self.cores = cores
+        self.processes = 1
+        self.threads = 1
+        self.state = QUEUED
+        self.command = None
+        self.returncode = None
+        self.start_time = None
+        self.end_time = None
+        self.log_path = None
+        self.outputs = []
+        self._process = None
+        self._log_file = None
+
+    @property
+    def elapsed(self):
+        if self.start_time is None:
+            return 0.0
+        return (self.end_time or time.time()) - self.start_time
+
+    def __repr__(self):
+        return f"EngineJob({self.id}, {os.path.basename(self.fsp)}, {self.state}, cores={self.cores})"
+
+
+class EngineScheduler:
+    '''
+    直接调用求解引擎的作业调度器，不启动CAE图形界面进程
+
+    fsp文件以子进程方式交给求解引擎计算，调度器按核数分配并发作业，
+    跟踪排队/运行/完成状态，并在作业完成后收集输出文件。
+
+    lumerical_path, version: Lumerical安装路径和版本，默认从config.json读取
+    total_cores: 可用于计算的总核数，默认为os.cpu_count()
+    min_cores: 自动分配时每个作业的最少核数
+    use_mpi: True时按MPI进程数分配核（需要mpiexec），False时按引擎线程数分配
+    engine, mpiexec: 手动指定引擎/mpiexec可执行文件（指定engine时可不配置Lumerical路径）
+    output_dir: 作业完成后将输出文件复制到该目录（每个作业一个子目录），None则不复制
+    '''
+    def __init__(self, lumerical_path='', version='', total_cores=None, min_cores=1,
+                 use_mpi=False, engine=None, mpiexec=None, output_dir=None,
+                 config_path=CONFIG_PATH, poll_interval=0.2):
+        if not engine:
+            if not lumerical_path:
+                lumerical_path, version = configured_install(config_path)
+            found_engine, found_mpiexec = find_engine(lumerical_path, version)
+            if not found_engine:
+                raise ValueError(f"错误：未找到求解引擎，请检查路径{lumerical_path}和版本{version}")
+            engine = found_engine
+            mpiexec = mpiexec or found_mpiexec
+        if use_mpi and not mpiexec:
+            raise ValueError("错误：use_mpi=True 但未找到 mpiexec")
+
+        self.engine = engine
+        self.mpiexec = mpiexec
+        self.use_mpi = use_mpi
+        self.total_cores = total_cores or os.cpu_count() or 1
+        self.min_cores = max(1, min(min_cores, self.total_cores))
+        self.output_dir = output_dir
+        self.poll_interval = poll_interval
+        self.jobs = []
+
+    # ================= 作业管理 =================
+    def submit(self, fsp, cores=None):
+        """提交一个fsp文件，返回EngineJob"""
+        if not os.path.exists(fsp):
+            raise FileNotFoundError(f"未找到文件: {fsp}")
+        if cores is not None:
+            cores = max(1, min(int(cores), self.total_cores))
+        job = EngineJob(len(self.jobs), fsp, cores)
+        self.jobs.append(job)
+        return job
+
+    def submit_many(self, fsp_files, cores=None):
+        return [self.submit(f, cores) for f in fsp_files]
+
+    def jobs_in(self, state):
+        return [job for job in self.jobs if job.state == state]
+
+    @property
+    def used_cores(self):
+        return sum(job.cores for job in self.jobs_in(RUNNING))
+
+    def status(self):
+        """返回各状态的作业数量"""
+        counts = {QUEUED: 0, RUNNING: 0, DONE: 0, FAILED: 0}
+        for job in self.jobs:
+            counts[job.state] += 1
+        return counts
+
+    # ================= 核数分配 =================
+    def _allocate(self, job, free, n_queued):
+        """为作业分配核数，返回0表示当前空闲核数不足"""
+        if job.cores is not None:
+            return job.cores if job.cores <= free else 0
+        if free < self.min_cores:
+            return 0
+        # 将空闲核平均分给尽可能多的排队作业，使机器尽量满载
+        slots = max(1, min(n_queued, free // self.min_cores))
+        return free // slots
+
+    def build_command(self, job):
+        if self.use_mpi:
+            job.processes, job.threads = job.cores, 1
+            return [self.mpiexec, '-n', str(job.processes), self.engine, '-t', '1', job.fsp]
+        job.processes, job.threads = 1, job.cores
+        return [self.engine, '-t', str(job.threads), job.fsp]
+
+    def _start(self, job):
+        job.command = self.build_command(job)
+        job.log_path = os.path.splitext(job.fsp)[0] + '_engine.log'
+        job._log_file = open(job.log_path, 'w')
+        job.start_time = time.time()
+        try:
+            job._process = subprocess.Popen(job.command, cwd=os.path.dirname(job.fsp),
+                                            stdout=job._log_file, stderr=subprocess.STDOUT)
+        except Exception as e:
+            job._log_file.write(f"启动失败: {e}\n")
+            self._finish(job, -1)
+            return
+        job.state = RUNNING
+
+    def _finish(self, job, returncode):
+        job.returncode = returncode
+        job.end_time = time.time()
+        if job._log_file:
+            job._log_file.close()
+            job._log_file = None
+        job._process = None
+        job.state = DONE if returncode == 0 else FAILED
+        job.outputs = self.collect_outputs(job)
+
+    def collect_outputs(self, job):
+        """收集作业生成或更新的文件（fsp本身、引擎日志，且在作业开始后修改过）"""
+        stem = os.path.splitext(os.path.basename(job.fsp))[0]
+        folder = os.path.dirname(job.fsp)
+        pattern = re.compile(re.escape(stem) + r'(\.[^.]+|_p\d+\.log|_engine\.log)$')
+        outputs = []
+        for name in sorted(os.listdir(folder)):
+            path = os.path.join(folder, name)
+            if not pattern.match(name) or not os.path.isfile(path):
+                continue
+            if os.path.getmtime(path) >= job.start_time - 1:
+                outputs.append(path)
+        if self.output_dir and outputs:
+            job_dir = os.path.join(self.output_dir, f"{job.id:04d}_{stem}")
+            os.makedirs(job_dir, exist_ok=True)
+            copied = []
+            for path in outputs:
+                dst = os.path.join(job_dir, os.path.basename(path))
+                shutil.copy2(path, dst)
+                copied.append(dst)
+            outputs = copied
+        return outputs
+
+    # ================= 调度循环 =================
+    def step(self):
+        """轮询一次：回收已结束的作业，并按空闲核数启动排队作业"""
+        for job in self.jobs_in(RUNNING):
+            returncode = job._process.poll()
+            if returncode is not None:
+                self._finish(job, returncode)
+
+        queued = self.jobs_in(QUEUED)
+        free = self.total_cores - self.used_cores
+        for i, job in enumerate(queued):
+            cores = self._allocate(job, free, len(queued) - i)
+            if not cores:
+                # 固定核数的作业放不下时，尝试后面的作业，避免空闲核浪费
+                if job.cores is not None:
+                    continue
+                break
+            job.cores = cores
+            self._start(job)
+            free -= cores if job.state == RUNNING else 0
+        return self.status()
+
+    def run(self, callback=None, timeout=None):
+        '''
+        运行所有排队作业直至全部结束
+        callback: 每次状态变化时调用callback(scheduler)
+        timeout: 超时时间(秒)，超时后终止仍在运行的作业
+        return: 全部作业列表
+        '''
+        t0 = time.time()
+        last = None
+        while True:
+            status = self.step()
+            if status != last:
+                last = status
+                if callback:
+                    callback(self)
+                else:
+                    print(f"[调度] 排队 {status[QUEUED]} | 运行 {status[RUNNING]} | "
+                          f"完成 {status[DONE]} | 失败 {status[FAILED]}")
+            if not status[QUEUED] and not status[RUNNING]:
+                break
+            if timeout is not None and time.time() - t0 > timeout:
+                self.cancel()
+                break
+            time.sleep(self.poll_interval)
+        return self.jobs
+
+    def cancel(self):
+        """终止运行中的作业，并将排队作业标记为失败"""
+        for job in self.jobs_in(RUNNING):
+            job._process.terminate()
+            try:
+                job._process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                job._process.kill()
+                job._process.wait()
+            self._finish(job, job._process.returncode if job._process else -1)
+        for job in self.jobs_in(QUEUED):
+            job.state = FAILED
+
+
+def run_fsp_files(fsp_files, **kwargs):
+    """便捷函数：用求解引擎批量计算fsp文件，返回作业列表"""
+    scheduler = EngineScheduler(**kwargs)
+    scheduler.submit_many(fsp_files)
+    return scheduler.run()
+
+
+if __name__ == '__main__':
+    jobs = run_fsp_files(sys.argv[1:])
+    for job in jobs:
+        print(job, f"{job.elapsed:.1f}s", job.outputs)
@@ -0,0 +1,10 @@
+'''
+lumapi-propagate：批量近场 -> 远场计算（读取/计算/写出流水线），见 lumapi.pipeline
+
+    python lumapi_propagate.py "exports/*.npz" --lamb 1.55e-6 --x-far=-50e-6,50e-6,201 \
+        --y-far=-50e-6,50e-6,201 --z-far 100e-6 --out-dir far/
+'''
+from lumapi.pipeline import main
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,9 @@
+'''
+lumapi-worker：远场分块计算节点，配合 lumapi.distributed.DistributedPropagator 使用
+
+    python lumapi_worker.py --host 0.0.0.0 --port 5757
+'''
+from lumapi.distributed import main
+
+if __name__ == '__main__':
+    main()
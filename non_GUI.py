@@ -1,11 +1,13 @@
 import json
 import os
 import importlib.util
-import re
 import platform
 import sys
 import shutil
-import subprocess
+
+from discovery import discover, detect_version, get_lumapi_path
+import pyenvs
+from pyenvs import discover_interpreters, probe_interpreters, install_to_envs
 
 # --- 路径处理逻辑 ---
 if getattr(sys, 'frozen', False):
@@ -29,58 +31,9 @@ if not os.path.exists(INIT_PATH):
     except: pass
 # ---------------------------
 
-def get_lumapi_path(lumerical_root, version):
-    base_path = os.path.join(lumerical_root, version)
-    ansys_path = os.path.join(base_path, "Lumerical", "api", "python", "lumapi.py")
-    if os.path.exists(ansys_path): return ansys_path
-    standalone_path = os.path.join(base_path, "api", "python", "lumapi.py")
-    if os.path.exists(standalone_path): return standalone_path
-    return standalone_path
-
-def detect_version(lumerical_root):
-    try:
-        if not os.path.exists(lumerical_root): return None
-        for item in os.listdir(lumerical_root):
-            item_path = os.path.join(lumerical_root, item)
-            if os.path.isdir(item_path) and re.match(r'^v\d{3}$', item):
-                if os.path.exists(get_lumapi_path(lumerical_root, item)):
-                    return item
-        return None
-    except: return None
-
 def detect_common_paths():
     print("正在扫描 Lumerical 路径...", end="", flush=True)
-    common_paths = []
-    if platform.system() == "Windows":
-        import string
-        from ctypes import windll
-        drives = []
-        bitmask = windll.kernel32.GetLogicalDrives()
-        for letter in string.ascii_uppercase:
-            if bitmask & 1: drives.append(letter + ":\\")
-            bitmask >>= 1
-        for drive in drives:
-            paths = [
-                os.path.join(drive, "Program Files", "Lumerical"),
-                os.path.join(drive, "Program Files (x86)", "Lumerical"),
-                os.path.join(drive, "Lumerical"),
-                os.path.join(drive, "Program Files", "Ansys Inc"),
-                os.path.join(drive, "Program Files (x86)", "Ansys Inc")
-            ]
-            for p in paths:
-                if os.path.exists(p):
-                    v = detect_version(p)
-                    if v: common_paths.append((p, v))
-    elif platform.system() == "Linux":
-        paths = [
-            "/opt/lumerical", "/usr/local/lumerical",
-            "/usr/ansys_inc", "/opt/ansys_inc",
-            os.path.expanduser("~/Ansys/ansys_inc"), os.path.expanduser("~/ansys_inc")
-        ]
-        for p in paths:
-            if os.path.exists(p):
-                v = detect_version(p)
-                if v: common_paths.append((p, v))
+    common_paths = discover()
     print(" 完成。")
     return common_paths
 
@@ -128,39 +81,28 @@ def save_config(lumerical_path, version):
 def detect_python_interpreters():
     """扫描本地 Python 环境"""
     print("正在扫描 Python 环境...", end="", flush=True)
-    interpreters = set()
-    
-    # 扫描 PATH
-    paths = os.environ.get("PATH", "").split(os.pathsep)
-    for p in paths:
-        exe = "python.exe" if platform.system() == "Windows" else "python3"
-        full = os.path.join(p, exe)
-        if os.path.exists(full) and os.access(full, os.X_OK):
-            interpreters.add(full)
-            
-    # 常见目录
-    if platform.system() == "Windows":
-        user_profile = os.environ.get("USERPROFILE", "")
-        roots = [os.path.join(user_profile, "anaconda3"), "C:\\ProgramData\\Anaconda3"]
-        for r in roots:
-            if os.path.exists(os.path.join(r, "python.exe")):
-                interpreters.add(os.path.join(r, "python.exe"))
-    
-    interpreters.add(sys.executable)
+    interpreters = discover_interpreters()
     print(" 完成。")
-    return sorted(list(interpreters))
+    return interpreters
 
 def get_site_packages(python_exe):
-    try:
-        cmd = [python_exe, "-c", "import sysconfig; print(sysconfig.get_paths()['purelib'])"]
-        if platform.system() == "Windows":
-             startupinfo = subprocess.STARTUPINFO()
-             startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
-             result = subprocess.check_output(cmd, startupinfo=startupinfo, encoding='utf-8')
+    return pyenvs.get_site_packages(python_exe)
+
+def parse_selection(text, count):
+    """解析多选输入，如 "1,3,5-7" 或 "all"，返回从0开始的索引列表"""
+    text = text.strip().lower()
+    if text in ("all", "a", "*"):
+        return list(range(count))
+    selected = []
+    for part in text.replace("，", ",").split(","):
+        part = part.strip()
+        if not part: continue
+        if "-" in part:
+            lo, hi = part.split("-", 1)
+            selected += range(int(lo) - 1, int(hi))
         else:
-             result = subprocess.check_output(cmd, encoding='utf-8')
-        return result.strip()
-    except: return None
+            selected.append(int(part) - 1)
+    return sorted(set(i for i in selected if 0 <= i < count))
 
 def install_to_python_env():
     # 1. 检查配置是否就绪
@@ -168,59 +110,53 @@ def install_to_python_env():
         print("[错误] 必须先配置 Lumerical 路径才能执行此操作。")
         return
 
-    # 2. 选择 Python 环境
+    # 2. 选择 Python 环境（并发查询各环境的版本和库路径）
     interpreters = detect_python_interpreters()
-    print("\n请选择目标 Python 环境:")
+    print("正在查询 Python 环境信息...", end="", flush=True)
+    infos = probe_interpreters(interpreters)
+    print(" 完成。")
+    print("\n请选择目标 Python 环境（可多选，如 1,3,5-7 或 all）:")
     for i, path in enumerate(interpreters):
-        print(f"{i+1}. {path}")
+        info = infos.get(path)
+        print(f"{i+1}. {path} " + (f"(Python {info['version']})" if info else "(无法查询)"))
     print(f"{len(interpreters)+1}. 手动输入路径")
     print(f"{len(interpreters)+2}. 返回")
     
     try:
-        sel = int(input("选择: "))
-        if 1 <= sel <= len(interpreters):
-            python_exe = interpreters[sel-1]
-        elif sel == len(interpreters) + 1:
-            python_exe = input("请输入 python 可执行文件完整路径: ").strip()
-        else:
+        text = input("选择: ").strip()
+        if text == str(len(interpreters) + 1):
+            targets = [input("请输入 python 可执行文件完整路径: ").strip()]
+        elif text == str(len(interpreters) + 2):
             return
+        else:
+            targets = [interpreters[i] for i in parse_selection(text, len(interpreters))]
     except: return
 
-    if not os.path.exists(python_exe):
-        print("[错误] 路径不存在")
-        return
-
-    # 3. 获取库路径并安装
-    print(f"正在获取库路径 ({python_exe})...")
-    lib_path = get_site_packages(python_exe)
-    if not lib_path:
-        print("[错误] 无法获取 site-packages 路径")
+    targets = [t for t in targets if os.path.exists(t)]
+    if not targets:
+        print("[错误] 未选择有效的 Python 环境")
         return
 
-    target_dir = os.path.join(lib_path, "lumapi")
-    print(f"目标安装路径: {target_dir}")
-    
-    if os.path.exists(target_dir):
-        choice = input("检测到目录已存在，是否覆盖? (y/n): ").lower()
-        if choice != 'y':
-            print("操作已取消")
-            return
-
-    try:
-        if not os.path.exists(target_dir): os.makedirs(target_dir)
-        files = ["__init__.py", "lumapi.py", "config.json"]
-        for f in files:
-            src = os.path.join(LUMAPI_DIR, f)
-            dst = os.path.join(target_dir, f)
-            if os.path.exists(src):
-                shutil.copy2(src, dst)
-            elif f == "__init__.py":
-                 with open(dst, 'w') as f_obj: f_obj.write("from lumapi.lumapi import *\n")
-        
-        print(f"\n[成功] 已安装到 {target_dir}")
-        print("您现在可以在该 Python 环境中使用 'import lumapi'")
-    except Exception as e:
-        print(f"[错误] 安装失败: {e}")
+    # 3. 获取库路径并批量安装
+    infos = probe_interpreters(targets)
+    existing = [t for t in targets if infos.get(t) and os.path.exists(os.path.join(infos[t]['purelib'], "lumapi"))]
+    overwrite = True
+    if existing:
+        print("以下环境中已存在 lumapi 目录:")
+        for t in existing:
+            print(f"  {os.path.join(infos[t]['purelib'], 'lumapi')}")
+        overwrite = input("是否覆盖? (y/n，n 表示跳过这些环境): ").lower() == 'y'
+
+    results = install_to_envs(LUMAPI_DIR, targets, overwrite=overwrite)
+    ok = 0
+    for exe, (success, msg) in results.items():
+        if success:
+            ok += 1
+            print(f"[成功] {exe} -> {msg}")
+        else:
+            print(f"[失败] {exe}: {msg}")
+    if ok:
+        print(f"\n已安装到 {ok} 个环境，您现在可以在这些 Python 环境中使用 'import lumapi'")
 
 # ================= 主流程 =================
 
@@ -0,0 +1,233 @@
+"""
+Python 解释器发现与并发探测（GUI 与 CLI 共用）
+
+发现: PATH、conda 根目录及其 envs/ 子目录、配置的 venv 根目录
+探测: 在有界线程池中并发启动子进程查询 site-packages，带超时；结果按解释器修改时间缓存
+安装: 将 lumapi 库文件并发部署到多个环境
+"""
+import glob
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+CACHE_PATH = os.path.join(os.path.expanduser("~"), ".lumapi", "python_index.json")
+PROBE_TIMEOUT = 10.0
+MAX_WORKERS = 8
+
+# 额外的 venv 根目录，可通过环境变量 LUMAPI_VENV_ROOTS 配置（以 os.pathsep 分隔）
+VENV_ROOTS = [
+    os.path.expanduser("~/.virtualenvs"),
+    os.path.expanduser("~/venvs"),
+    os.path.expanduser("~/.venvs"),
+]
+
+PROBE_SCRIPT = ("import sys, sysconfig, json; "
+                "print(json.dumps({'version': sys.version.split()[0], "
+                "'purelib': sysconfig.get_paths()['purelib'], 'prefix': sys.prefix}))")
+
+_cache_lock = threading.Lock()
+
+def _is_windows():
+    return platform.system() == "Windows"
+
+def _env_python(env_dir):
+    """环境目录下的解释器路径（conda/venv 布局），不存在时返回 None"""
+    if _is_windows():
+        candidates = [os.path.join(env_dir, "python.exe"), os.path.join(env_dir, "Scripts", "python.exe")]
+    else:
+        candidates = [os.path.join(env_dir, "bin", "python3"), os.path.join(env_dir, "bin", "python")]
+    for path in candidates:
+        if os.path.isfile(path):
+            return path
+    return None
+
+def conda_roots():
+    """可能的 conda 安装根目录"""
+    roots = []
+    for var in ("CONDA_ROOT", "CONDA_PREFIX"):
+        if os.environ.get(var):
+            roots.append(os.environ[var])
+    if os.environ.get("CONDA_EXE"):
+        # CONDA_EXE = <root>/bin/conda 或 <root>\Scripts\conda.exe
+        roots.append(os.path.dirname(os.path.dirname(os.environ["CONDA_EXE"])))
+    names = ["anaconda3", "miniconda3", "miniforge3", "mambaforge"]
+    if _is_windows():
+        user_profile = os.environ.get("USERPROFILE", "")
+        roots += [os.path.join(user_profile, n) for n in names]
+        roots += ["C:\\ProgramData\\Anaconda3", "C:\\ProgramData\\Miniconda3"]
+    else:
+        roots += [os.path.expanduser(os.path.join("~", n)) for n in names]
+        roots += ["/opt/conda", "/opt/anaconda3", "/opt/miniconda3"]
+    return roots
+
+def discover_interpreters(venv_roots=None, include_conda=True):
+    '''
+    扫描本地 Python 解释器
+    venv_roots: venv 根目录列表（其下每个子目录视为一个环境），默认为 VENV_ROOTS 和 LUMAPI_VENV_ROOTS
+    return: 按路径排序的解释器列表（按所在目录去重）
+    '''
+    found = []
+
+    # 1. PATH
+    exes = ["python.exe"] if _is_windows() else ["python3", "python"]
+    for p in os.environ.get("PATH", "").split(os.pathsep):
+        for exe in exes:
+            full = os.path.join(p, exe)
+            if os.path.isfile(full) and os.access(full, os.X_OK):
+                found.append(full)
+
+    # 2. conda 根环境及 envs/ 下的所有环境
+    if include_conda:
+        for root in conda_roots():
+            # CONDA_PREFIX 可能本身就是 envs/ 下的某个环境
+            if os.path.basename(os.path.dirname(root)) == "envs":
+                root = os.path.dirname(os.path.dirname(root))
+            py = _env_python(root)
+            if py: found.append(py)
+            for env_dir in sorted(glob.glob(os.path.join(root, "envs", "*"))):
+                py = _env_python(env_dir)
+                if py: found.append(py)
+
+    # 3. venv 根目录
+    if venv_roots is None:
+        venv_roots = VENV_ROOTS + [p for p in os.environ.get("LUMAPI_VENV_ROOTS", "").split(os.pathsep) if p]
+    for root in venv_roots:
+        for env_dir in sorted(glob.glob(os.path.join(root, "*"))):
+            py = _env_python(env_dir)
+            if py: found.append(py)
+
+    # 4. Windows 常见安装目录
+    if _is_windows():
+        for root in ["C:\\Python39", "C:\\Python310", "C:\\Python311", "C:\\Python312", "C:\\Python313"]:
+            if os.path.exists(os.path.join(root, "python.exe")):
+                found.append(os.path.join(root, "python.exe"))
+
+    found.append(sys.executable)
+
+    # 同一目录下的 python/python3 视为同一环境；venv 中指向同一解释器的符号链接仍视为不同环境
+    unique = {}
+    for path in found:
+        unique.setdefault(os.path.realpath(os.path.dirname(os.path.abspath(path))), path)
+    return sorted(unique.values())
+
+def query_interpreter(python_exe, timeout=PROBE_TIMEOUT):
+    """启动解释器查询版本和 site-packages，失败返回 None"""
+    cmd = [python_exe, "-c", PROBE_SCRIPT]
+    kwargs = {}
+    if _is_windows():
+        startupinfo = subprocess.STARTUPINFO()
+        startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
+        kwargs['startupinfo'] = startupinfo
+    try:
+        result = subprocess.run(cmd, capture_output=True, encoding='utf-8', timeout=timeout, **kwargs)
+        if result.returncode != 0:
+            return None
+        return json.loads(result.stdout.strip().splitlines()[-1])
+    except Exception:
+        return None
+
+def _mtime(path):
+    # 同时记录链接本身和目标解释器的修改时间，重建 venv 或升级解释器都会使缓存失效
+    try:
+        return [os.lstat(path).st_mtime, os.stat(path).st_mtime]
+    except OSError:
+        return None
+
+def load_index(cache_path=CACHE_PATH):
+    try:
+        with open(cache_path, 'r') as f:
+            return json.load(f)
+    except Exception:
+        return {}
+
+def save_index(index, cache_path=CACHE_PATH):
+    try:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(index, f, indent=4)
+        os.replace(tmp_path, cache_path)
+    except Exception:
+        pass
+
+def probe_interpreters(interpreters, timeout=PROBE_TIMEOUT, max_workers=MAX_WORKERS, cache_path=CACHE_PATH):
+    '''
+    并发查询多个解释器
+    interpreters: 解释器路径列表
+    timeout: 单个解释器的超时(秒)
+    max_workers: 同时运行的子进程数上限
+    cache_path: 缓存文件，解释器修改时间未变时直接使用缓存；None 表示不使用缓存
+    return: {python_exe: {'version', 'purelib', 'prefix'} 或 None}
+    '''
+    index = load_index(cache_path) if cache_path else {}
+    results, pending = {}, []
+    for exe in interpreters:
+        entry = index.get(exe)
+        if entry and entry.get('mtime') == _mtime(exe) and entry.get('info'):
+            results[exe] = entry['info']
+        else:
+            pending.append(exe)
+
+    if pending:
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(pending)))) as pool:
+            infos = pool.map(lambda exe: query_interpreter(exe, timeout), pending)
+            for exe, info in zip(pending, infos):
+                results[exe] = info
+                if info:
+                    index[exe] = {'mtime': _mtime(exe), 'info': info}
+        if cache_path:
+            with _cache_lock:
+                # 与其他进程/线程写入的条目合并
+                merged = load_index(cache_path)
+                merged.update({exe: index[exe] for exe in pending if exe in index})
+                save_index(merged, cache_path)
+    return {exe: results.get(exe) for exe in interpreters}
+
+def get_site_packages(python_exe, timeout=PROBE_TIMEOUT, cache_path=CACHE_PATH):
+    info = probe_interpreters([python_exe], timeout=timeout, cache_path=cache_path)[python_exe]
+    return info['purelib'] if info else None
+
+def copy_lumapi(lumapi_dir, target_dir):
+    """将 lumapi 库文件复制到 target_dir"""
+    os.makedirs(target_dir, exist_ok=True)
+    files = ["__init__.py", "lumapi.py", "config.json"]
+    files += [f for f in sorted(os.listdir(lumapi_dir)) if f.endswith(".py") and f not in files]
+    for f in files:
+        src = os.path.join(lumapi_dir, f)
+        dst = os.path.join(target_dir, f)
+        if os.path.exists(src):
+            shutil.copy2(src, dst)
+        elif f == "config.json":
+            raise FileNotFoundError("config.json 未找到，请先生成配置")
+        elif f == "__init__.py":
+            with open(dst, 'w') as f_obj: f_obj.write("from lumapi.lumapi import *\n")
+
+def install_to_envs(lumapi_dir, interpreters, timeout=PROBE_TIMEOUT, max_workers=MAX_WORKERS,
+                    cache_path=CACHE_PATH, overwrite=True):
+    '''
+    将 lumapi 并发安装到多个 Python 环境
+    overwrite: False 时跳过已存在 lumapi 目录的环境
+    return: {python_exe: (是否成功, 目标目录或错误信息)}
+    '''
+    infos = probe_interpreters(interpreters, timeout, max_workers, cache_path)
+
+    def install(exe):
+        info = infos.get(exe)
+        if not info or not info.get('purelib'):
+            return False, "无法获取 site-packages 路径"
+        target_dir = os.path.join(info['purelib'], "lumapi")
+        if os.path.exists(target_dir) and not overwrite:
+            return False, f"已存在，跳过: {target_dir}"
+        try:
+            copy_lumapi(lumapi_dir, target_dir)
+            return True, target_dir
+        except Exception as e:
+            return False, str(e)
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(interpreters) or 1))) as pool:
+        return dict(zip(interpreters, pool.map(install, interpreters)))